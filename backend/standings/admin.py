@@ -0,0 +1,129 @@
+""" Admin operations on the storage of the standings service. Run from the standings directory, e.g.
+
+    python admin.py flush-cache
+    python admin.py migrate-mongo
+    python admin.py backfill --dry-run
+"""
+import argparse
+import sys
+
+from backend.standings.common import app_config
+from backend.standings.common import configure_logger
+from backend.standings.common import logger_factory
+from backend.standings.domain.backfill import FIRST_SEASON
+from backend.standings.domain.backfill import Backfill
+from backend.standings.domain.backfill import BackfillCheckpoint
+from backend.standings.domain.backfill import backfill_keys
+from backend.standings.domain.config import ConfigProvider
+from backend.standings.domain.leagues import Leagues
+from backend.standings.domain.response.parser import parse_standings
+from backend.standings.domain.storage.codec import codec_provider
+from backend.standings.domain.storage.storage import MongoDB
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import database_provider
+from backend.standings.domain.upstream.client import RapidApiClient
+from backend.standings.domain.upstream.quota import UpstreamQuota
+
+logger = logger_factory(__name__)
+
+
+def _redis_cache(config, local):
+    redis_config = config['storage']['redis']
+    return RedisCache(host="localhost" if local else redis_config['host'], port=redis_config['port'],
+                      time_to_live_hours=redis_config['timeToLive'],
+                      codec=codec_provider(config['storage'].get('codec', {})))
+
+
+def _mongo_db(config, local, bootstrap_indexes=True):
+    mongo_config = config['storage']['mongo']
+    return MongoDB(host="localhost" if local else mongo_config['host'], port=mongo_config['port'],
+                   username=mongo_config['username'], password=mongo_config['password'],
+                   bootstrap_indexes=bootstrap_indexes, codec=codec_provider(config['storage'].get('codec', {})))
+
+
+def _upstream_client(config, quota):
+    rapid_api_config = config['rapidapi']
+    return RapidApiClient(rapid_api_config['host'], rapid_api_config['version'], rapid_api_config['key'],
+                          connect_timeout=rapid_api_config.get('connectTimeoutSeconds', 3.05),
+                          read_timeout=rapid_api_config.get('readTimeoutSeconds', 10),
+                          max_retries=rapid_api_config.get('maxRetries', 2), quota=quota)
+
+
+def flush_cache(config, args):
+    """ Removes all the standings from Redis. The workers fill it up again from MongoDB on their next requests """
+    _redis_cache(config, args.local).flush()
+
+
+def migrate_mongo(config, args):
+    """ Drops the per key indexes, removes duplicate documents per key and creates the unique key index """
+    summary = _mongo_db(config, args.local, bootstrap_indexes=False).migrate()
+    print("Dropped {dropped_indexes} index(es), removed {removed_duplicates} duplicate(s) and updated "
+          "{updated_documents} document(s)".format(**summary))
+
+
+def backfill(config, args):
+    """ Fetches the standings of every finished season of every league that are not in the checkpoint yet, and stores
+    them in MongoDB and Redis. The calls to RapidAPI are taken from the quota that the service uses, as calls that are
+    not critical. Live seasons asked for with --last-season are stored as the service stores them, telling the workers
+    """
+    leagues = Leagues.get_instance(ConfigProvider(config['standings_config']))
+    aliases = args.leagues if args.leagues else leagues.get_aliases()
+    keys = backfill_keys(aliases, first_season=args.first_season, last_season=args.last_season)
+    checkpoint = BackfillCheckpoint(args.checkpoint)
+    quota_config = config['rapidapi'].get('quota', {})
+
+    if args.dry_run:
+        report = Backfill(fetcher=None, database=None, checkpoint=checkpoint).run(keys, dry_run=True)
+        print(report)
+        print("Would make {} call(s) to RapidAPI, taking at least {:.0f} second(s) at the rate limit".format(
+            report.planned, report.planned / quota_config.get('requestsPerSecond', 1.0)))
+        return
+
+    redis_cache = _redis_cache(config, args.local)
+    client = _upstream_client(config, UpstreamQuota.from_config(quota_config, store=redis_cache))
+
+    def fetch(key):
+        response = client.get_standings(leagues.get_league(key.alias).get_league_id(), key.season, critical=False)
+        return parse_standings(response.content)
+
+    report = Backfill(fetch, database_provider(False, redis_cache=redis_cache, mongo_db=_mongo_db(config, args.local)),
+                      checkpoint=checkpoint, concurrency=args.concurrency, batch_size=args.batch_size,
+                      invalidation_publisher=redis_cache).run(keys)
+    print(report)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="Admin operations on the standings service storage")
+    parser.add_argument("--config", default="../app_config.yaml", help="Path to the app config file")
+    parser.add_argument("--local", action="store_true", help="Connect to the storage on localhost")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    flush = commands.add_parser("flush-cache", help="Remove all the standings from Redis")
+    flush.set_defaults(operation=flush_cache)
+
+    migrate = commands.add_parser("migrate-mongo", help="Migrate MongoDB to one document per key")
+    migrate.set_defaults(operation=migrate_mongo)
+
+    backfill_command = commands.add_parser("backfill", help="Fetch and store the standings of past seasons")
+    backfill_command.add_argument("--leagues", nargs="*", help="Aliases of the leagues to backfill, all if not given")
+    backfill_command.add_argument("--first-season", type=int, default=FIRST_SEASON, help="First season to backfill")
+    backfill_command.add_argument("--last-season", type=int, help="Last season to backfill, the latest finished one "
+                                                                  "if not given")
+    backfill_command.add_argument("--concurrency", type=int, default=4, help="Number of fetches made at once")
+    backfill_command.add_argument("--batch-size", type=int, default=20, help="Number of tables stored at once")
+    backfill_command.add_argument("--checkpoint", default="backfill_checkpoint.json",
+                                  help="File that records the backfilled keys, to resume from")
+    backfill_command.add_argument("--dry-run", action="store_true", help="Only report what would be backfilled")
+    backfill_command.set_defaults(operation=backfill)
+
+    return parser
+
+
+def main(argv):
+    configure_logger("../log_config.yaml")
+    args = _parser().parse_args(argv)
+    args.operation(app_config(args.config), args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,11 +1,31 @@
 """This file holds common functionality required in other files and classes """
 
+import atexit
+import datetime
 import json
+import os
+import queue
+import random
 import yaml
 import logging
 import logging.config
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
 from os import path
 
+# Marks a log line that is written for every request, e.g. logger.info("...", extra=SAMPLED). Profiles that sample
+# only write a share of these lines
+SAMPLED = {"sampled": True}
+
+# Environment variable with the log config file to use instead of the one the caller asks for, e.g. a production profile
+LOG_CONFIG_VARIABLE = "STANDINGS_LOG_CONFIG"
+
+# Attributes every log record has, as opposed to the ones passed in `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_configured_file = None
+_listener = None
+
 
 def config(config_file):
     if not path.exists(config_file):
@@ -28,14 +48,101 @@ def logger_factory(name):
 
 
 def configure_logger(config_file):
+    """ Configures logging from a YAML file in the format of :func:`logging.config.dictConfig`, with two extra settings:
+
+        queue: true         Handlers write the log lines on a background thread, so that callers only put records on
+                            a queue. Messages are formatted on that thread too
+        sampling:
+          rate: 0.1         Share of the log lines marked with :data:`SAMPLED` that are written
+
+    The file can be swapped for another one with the STANDINGS_LOG_CONFIG environment variable. Configuring from the
+    same file again does nothing
+    """
+    global _configured_file, _listener
+    config_file = os.environ.get(LOG_CONFIG_VARIABLE, config_file)
+    if config_file == _configured_file:
+        return
     with open(config_file, 'r') as f:
         logger_config = yaml.safe_load(f.read())
-        logging.config.dictConfig(logger_config)
+
+    _stop_listener()
+    use_queue = logger_config.pop('queue', False)
+    sampling = logger_config.pop('sampling', None)
+    logging.config.dictConfig(logger_config)
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            root.removeHandler(handler)
+        handlers = [_DeferredQueueHandler(log_queue)]
+        root.addHandler(handlers[0])
+        _listener.start()
+    if sampling is not None:
+        for handler in handlers:
+            handler.addFilter(SamplingFilter(sampling.get('rate', 1.0)))
+    _configured_file = config_file
+
+
+@atexit.register
+def _stop_listener():
+    """ Writes the records left on the queue and stops the background thread """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """ Puts records on the queue as they are, so that their messages are formatted by the handlers on the listener
+    thread rather than by the caller. This is safe because the queue is in process and log arguments are not changed
+    after they are logged """
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """ Lets through a share of the records marked with :data:`SAMPLED`, and all the others """
+
+    def __init__(self, rate=1.0):
+        super(SamplingFilter, self).__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return not getattr(record, "sampled", False) or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats a record as a single line JSON object, with the attributes passed in `extra` as fields of their own """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "file": record.filename,
+            "function": record.funcName,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
 
 def equality_tester(self_, clazz, other):
     if isinstance(other, clazz):
-        for var in vars(self_):
+        # Classes with slots have no dictionary of variables
+        variables = self_.__slots__ if hasattr(clazz, '__slots__') else vars(self_)
+        for var in variables:
             var_of_self = getattr(self_, var)
             var_of_other = getattr(other, var)
 
@@ -0,0 +1,229 @@
+"""This module fetches the standings of past seasons of every league ahead of the requests for them """
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+from backend.standings.common import logger_factory
+from backend.standings.domain.response.parser import NoStandingsException
+from backend.standings.domain.storage.freshness import is_live_season
+from backend.standings.domain.storage.freshness import live_seasons
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.upstream.quota import QuotaExceededException
+from backend.standings.domain.upstream.quota import RateLimitedException
+
+FIRST_SEASON = 2010
+
+
+def backfill_keys(aliases, first_season=FIRST_SEASON, last_season=None):
+    """ Returns the keys of every season of every league, the latest seasons first, as those are the most asked for
+
+        :param last_season Last season to include, the latest finished season if not given. Live seasons are kept up
+        to date by the service
+    """
+    last_season = live_seasons()[0] - 1 if last_season is None else last_season
+    return [Key(alias, str(season)) for season in range(last_season, first_season - 1, -1) for alias in aliases]
+
+
+class BackfillCheckpoint:
+    """ Remembers the keys that were backfilled, and the ones the source has no standings for, in a JSON file of the
+    form {"done": ["epl_2020", ...], "empty": ["epl_2010", ...]}, so that a backfill that was stopped picks up where it
+    left off. The file is replaced as a whole, so that a backfill stopped while saving does not leave it half written
+    """
+
+    def __init__(self, path=None):
+        """
+            :param path Path of the checkpoint file. Nothing is saved if None
+        """
+        self.path = path
+        self.done = set()
+        self.empty = set()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                checkpoint = json.load(f)
+            self.done = set(checkpoint.get('done', []))
+            self.empty = set(checkpoint.get('empty', []))
+
+    def is_done(self, key: Key):
+        return key.__str__() in self.done or key.__str__() in self.empty
+
+    def mark(self, done=(), empty=()):
+        """ Records keys that were backfilled, and keys there are no standings for, and saves the checkpoint """
+        self.done.update(key.__str__() for key in done)
+        self.empty.update(key.__str__() for key in empty)
+        if self.path is None:
+            return
+        saving = "{}.saving".format(self.path)
+        with open(saving, "w") as f:
+            json.dump({"done": sorted(self.done), "empty": sorted(self.empty)}, f)
+        os.replace(saving, self.path)
+
+
+class BackfillReport:
+    """ What a backfill did, and how fast """
+
+    def __init__(self, planned=0, skipped=0, dry_run=False):
+        self.planned = planned
+        self.skipped = skipped
+        self.dry_run = dry_run
+        self.stored = 0
+        self.empty = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.batches = 0
+        self.fetch_seconds = 0.0
+        self.write_seconds = 0.0
+        self.seconds = 0.0
+        self.stopped_reason = None
+
+    def tables_per_second(self):
+        return self.stored / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        lines = ["Planned {} key(s), skipped {} already in the checkpoint".format(self.planned, self.skipped)]
+        if self.dry_run:
+            return lines[0]
+        lines += ["Stored {} table(s) in {} batch(es), {} without standings, {} failed".format(
+                      self.stored, self.batches, self.empty, self.failed),
+                  "Took {:.1f} second(s): {:.2f} table(s) per second, {:.3f} second(s) per fetch, {:.3f} second(s) "
+                  "per batch write, waited {} time(s) for the rate limit".format(
+                      self.seconds, self.tables_per_second(),
+                      self.fetch_seconds / max(1, self.stored + self.empty + self.failed),
+                      self.write_seconds / max(1, self.batches), self.rate_limited)]
+        if self.stopped_reason is not None:
+            lines.append("Stopped early: {}".format(self.stopped_reason))
+        return "\n".join(lines)
+
+
+class Backfill:
+    """ Fetches the standings for many keys from the source, `concurrency` at a time, and stores them in batches of
+    `batch_size` with one bulk write per batch. Every batch that is stored is recorded in the checkpoint. The standings
+    of live seasons, which the workers may be serving from their local caches, are stored one at a time as the service
+    stores them instead: they are added to the change log if they changed, and the workers are told through the
+    invalidation publisher.
+
+    The fetcher is expected to take its calls from the quota shared with the service, as calls that are not critical:
+    calls refused by the rate limit are made again after `rate_limit_wait_seconds`, and the backfill stops once the
+    quota is down to what is kept for the service. Keys that could not be fetched for any other reason, responses that
+    could not be parsed included, are left out of the checkpoint, so that the next backfill tries them again.
+    """
+
+    def __init__(self, fetcher, database, checkpoint=None, concurrency=4, batch_size=20, rate_limit_wait_seconds=1.0,
+                 clock=time.monotonic, sleep=time.sleep, invalidation_publisher=None):
+        """
+            :param fetcher Function that returns the standings for a key from the source
+            :param database :func:`Database` to store the standings in, e.g. MongoDB with Redis in front
+            :param invalidation_publisher Publisher to tell the workers that the standings of a live season changed
+        """
+        self.fetcher = fetcher
+        self.database = database
+        self.invalidation_publisher = invalidation_publisher
+        self.checkpoint = checkpoint if checkpoint is not None else BackfillCheckpoint()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.rate_limit_wait_seconds = rate_limit_wait_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.logger = logger_factory(Backfill.__name__)
+
+    def plan(self, keys):
+        """ Returns the keys that are still to be backfilled """
+        return [key for key in keys if not self.checkpoint.is_done(key)]
+
+    def run(self, keys, dry_run=False):
+        """ Backfills the keys that are not in the checkpoint yet
+
+            :param dry_run Whether to only plan the backfill, without fetching or storing anything
+            :returns :func:`BackfillReport`
+        """
+        planned = self.plan(keys)
+        report = BackfillReport(planned=len(planned), skipped=len(keys) - len(planned), dry_run=dry_run)
+        if dry_run or len(planned) == 0:
+            return report
+
+        self.logger.info("Backfilling %s key(s), %s at a time", len(planned), self.concurrency)
+        self._stop.clear()
+        start = self.clock()
+        batch, empty = {}, []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="standings-backfill") as executor:
+            futures = {executor.submit(self._fetch, key, report): key for key in planned}
+            try:
+                for future in as_completed(futures):
+                    key = futures[future]
+                    if future.cancelled():
+                        continue
+                    try:
+                        standings = future.result()
+                    except QuotaExceededException as e:
+                        self._stop_early(report, e.__str__(), futures)
+                        continue
+                    except Exception as e:
+                        with self._lock:
+                            report.failed += 1
+                        self.logger.error("Could not backfill standings for key %s. Error message: %s", key,
+                                          e.__str__())
+                        continue
+                    if standings is None or standings.is_empty():
+                        empty.append(key)
+                    else:
+                        batch[key] = standings
+                    if len(batch) + len(empty) >= self.batch_size:
+                        self._store(batch, empty, report)
+                        batch, empty = {}, []
+                self._store(batch, empty, report)
+            finally:
+                # Keys not fetched yet are left to the next backfill if this one is stopped by an error
+                self._stop.set()
+                for future in futures:
+                    future.cancel()
+                report.seconds = self.clock() - start
+        self.logger.info("Backfilled %s table(s) in %.1f second(s)", report.stored, report.seconds)
+        return report
+
+    def _fetch(self, key: Key, report: BackfillReport):
+        """ Returns the standings for a key, or None if the source has none """
+        while not self._stop.is_set():
+            start = self.clock()
+            try:
+                return self.fetcher(key)
+            except RateLimitedException:
+                with self._lock:
+                    report.rate_limited += 1
+            except NoStandingsException as e:
+                self.logger.info("No standings for key %s. %s", key, e.__str__())
+                return None
+            finally:
+                with self._lock:
+                    report.fetch_seconds += self.clock() - start
+            self.sleep(self.rate_limit_wait_seconds)
+        raise QuotaExceededException("Backfill stopped before standings for key {} were fetched".format(key))
+
+    def _store(self, batch: dict, empty: list, report: BackfillReport):
+        if len(batch) == 0 and len(empty) == 0:
+            return
+        start = self.clock()
+        finished = {key: standings for key, standings in batch.items() if not is_live_season(key.season)}
+        if len(finished) > 0:
+            self.database.store_many(finished)
+        for key, standings in batch.items():
+            if key not in finished:
+                self.database.store(key, standings, invalidation_publisher=self.invalidation_publisher)
+        if len(batch) > 0:
+            report.batches += 1
+        self.checkpoint.mark(done=batch.keys(), empty=empty)
+        report.write_seconds += self.clock() - start
+        report.stored += len(batch)
+        report.empty += len(empty)
+        self.logger.info("Backfilled %s table(s) so far, %s without standings", report.stored, report.empty)
+
+    def _stop_early(self, report: BackfillReport, reason: str, futures: dict):
+        if report.stopped_reason is None:
+            report.stopped_reason = reason
+            self.logger.warning("Stopping backfill. %s", reason)
+        self._stop.set()
+        for future in futures:
+            future.cancel()
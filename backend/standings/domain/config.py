@@ -8,6 +8,7 @@ class ConfigProvider:
     """This class loads the config and makes it available to the callers"""
     def __init__(self, config_file: str):
         self.logger = logger_factory(ConfigProvider.__name__)
+        self.config_file = config_file
         try:
             self.config = config(config_file)
         except FileNotFoundError as e:
@@ -1,5 +1,7 @@
 """This module is responsible for supplying config to the caller """
-import logging
+import os
+import threading
+from types import MappingProxyType
 
 from backend.standings.common import logger_factory
 from backend.standings.domain.config import ConfigProvider
@@ -24,21 +26,48 @@ class League:
         return self.name
 
 
+class LeagueIndex:
+    """ Immutable lookup tables of the leagues: by alias, by league id and by country. An index is built once per load
+    of the config and replaced as a whole when the config changes, so readers never see a half loaded index """
+
+    def __init__(self, leagues_per_alias: dict):
+        by_id = {}
+        by_country = {}
+        for league in leagues_per_alias.values():
+            by_id[league.get_league_id()] = league
+            by_country.setdefault(league.country, []).append(league)
+        self.by_alias = MappingProxyType(dict(leagues_per_alias))
+        self.by_id = MappingProxyType(by_id)
+        self.by_country = MappingProxyType({country: tuple(leagues) for country, leagues in by_country.items()})
+
+
 class Leagues:
     """This holds a dictionary/map of :func:`League` objects. Loaded from config file, a :func:`League` object can
         retrieved by passing the league alias to the :func:`League.get_league` method.
+
+        The config file is read once, into a :func:`LeagueIndex`. Lookups never touch the file system: a change to the
+        file is picked up by :func:`Leagues.reload_if_changed`, which :func:`Leagues.watch` calls in the background,
+        and the new index is swapped in at once.
     """
     __instance = None
+    __instance_lock = threading.Lock()
 
     @staticmethod
     def get_instance(config_provider: ConfigProvider):
         if Leagues.__instance is None:
-            Leagues(config_provider)
+            # Worker threads can ask for the instance at the same time, only one of them creates it
+            with Leagues.__instance_lock:
+                if Leagues.__instance is None:
+                    Leagues(config_provider)
         return Leagues.__instance
 
     def __init__(self, config_provider: ConfigProvider):
         self.logger = logger_factory(Leagues.__name__)
-        self.leagues = _load_leagues_from_config(config_provider, self.logger)
+        self.config_file = config_provider.config_file
+        self._file_version = _file_version(self.config_file)
+        self._index = LeagueIndex(_load_leagues_from_config(config_provider, self.logger))
+        self._reload_lock = threading.Lock()
+        self._stop_watching = threading.Event()
 
         if Leagues.__instance is not None:
             raise Exception("Instance of this class cannot be created again! Singleton violation!")
@@ -53,18 +82,81 @@ class Leagues:
             :raises LeagueNotFoundError if no League with alias exists
         """
         assert alias is not None, "Alias cannot be None"
-        league = self.leagues.get(alias)
+        league = self._index.by_alias.get(alias)
         if league is None:
             self.logger.error("No league with alias: %s", alias)
             raise LeagueException("No league with alias: {}".format(alias))
         return league
 
+    def get_league_by_id(self, league_id):
+        """ Get :func:`League` object with an id
+
+            :param league_id Id of the league at the source, e.g. 39 for the Premier League
+            :returns :func:`League` object
+            :raises LeagueException if no League with the id exists
+        """
+        league = self._index.by_id.get(league_id)
+        if league is None:
+            self.logger.error("No league with id: %s", league_id)
+            raise LeagueException("No league with id: {}".format(league_id))
+        return league
+
+    def get_leagues_in_country(self, country):
+        """ Returns the :func:`League` objects of a country, or an empty tuple if there are none """
+        return self._index.by_country.get(country, ())
+
+    def get_aliases(self):
+        """ Returns the aliases of all the leagues """
+        return list(self._index.by_alias.keys())
+
+    def swap(self, index: LeagueIndex):
+        """ Replaces the index that lookups are made on. Lookups in progress finish on the index they started with """
+        self._index = index
+
+    def reload_if_changed(self):
+        """ Loads the config file again if it changed since it was last loaded. If the new config cannot be loaded,
+        the leagues loaded before are kept
+
+            :returns True if the leagues were reloaded, otherwise False
+        """
+        with self._reload_lock:
+            try:
+                file_version = _file_version(self.config_file)
+                if file_version == self._file_version:
+                    return False
+                index = LeagueIndex(_load_leagues_from_config(ConfigProvider(self.config_file), self.logger))
+            except Exception as e:
+                self.logger.error("Could not reload leagues from %s. Error message: %s", self.config_file, e.__str__())
+                return False
+            self._file_version = file_version
+            self.swap(index)
+            self.logger.info("Reloaded %s league(s) from %s", len(index.by_alias), self.config_file)
+            return True
+
+    def watch(self, interval_seconds=10):
+        """ Checks the config file for changes every `interval_seconds`, in a background thread """
+        def watch_config_file():
+            while not self._stop_watching.wait(interval_seconds):
+                self.reload_if_changed()
+
+        self._stop_watching.clear()
+        watcher = threading.Thread(target=watch_config_file, name="leagues-watcher", daemon=True)
+        watcher.start()
+        return watcher
+
+    def stop_watching(self):
+        self._stop_watching.set()
+
+
+def _file_version(config_file):
+    stat = os.stat(config_file)
+    return stat.st_mtime_ns, stat.st_size
+
 
 def _load_leagues_from_config(config_provider: ConfigProvider, logger, config_type="leagues"):
     leagues = config_provider.get_config_per_type(config_type)
     countries = leagues.keys()
     loaded_leagues = {}
-    logger.setLevel(logging.DEBUG)
     for country in countries:
         country_leagues = dict(leagues[country])
         aliases = country_leagues.keys()
@@ -0,0 +1,141 @@
+"""This module holds the Prometheus metrics of the standings service.
+
+Gunicorn workers are separate processes, each with its own metrics. When the PROMETHEUS_MULTIPROC_DIR environment
+variable is set (see gunicorn.conf.py), every worker writes its metrics to files in that directory and the worker that
+serves /metrics adds them up for all the workers. Without it, e.g. in tests, the metrics are those of this process.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from prometheus_client import REGISTRY
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Stages of serving standings, from the fastest to the slowest tier
+LOCAL_CACHE_LOOKUP = "local_cache_lookup"
+REDIS_LOOKUP = "redis_lookup"
+MONGO_READ = "mongo_read"
+UPSTREAM_FETCH = "upstream_fetch"
+PARSE = "parse"
+SERIALIZE = "serialize"
+STORAGE_WRITE = "storage_write"
+
+# Tiers standings are looked up in
+LOCAL_CACHE = "local_cache"
+REDIS = "redis"
+MONGO = "mongo"
+
+STAGE_SECONDS = Histogram("standings_stage_duration_seconds", "Time spent per stage of serving standings", ["stage"],
+                          buckets=(.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+CACHE_LOOKUPS = Counter("standings_cache_lookups_total", "Lookups of standings per storage tier, hit or miss",
+                        ["tier", "result"])
+LEAGUE_REQUESTS = Counter("standings_league_requests_total", "Standings requested per league", ["league"])
+HTTP_REQUESTS = Counter("standings_http_requests_total", "Requests served per endpoint and status code",
+                        ["endpoint", "status_code"])
+REQUESTS_IN_FLIGHT = Gauge("standings_http_requests_in_flight", "Requests being served", ["endpoint"],
+                           multiprocess_mode="livesum")
+UPSTREAM_RESPONSES = Counter("standings_upstream_responses_total",
+                             "Responses from RapidAPI per status code, 'error' if there was no response",
+                             ["status_code"])
+UPSTREAM_QUOTA_DECISIONS = Counter("standings_upstream_quota_decisions_total",
+                                   "Calls to RapidAPI held back by the quota: throttled, deferred or refused",
+                                   ["decision"])
+STORAGE_ROUND_TRIPS = Counter("standings_storage_round_trips_total", "Round trips made to a storage tier", ["tier"])
+REQUEST_ROUND_TRIPS = Histogram("standings_request_storage_round_trips", "Round trips made to storage per request",
+                                ["endpoint"], buckets=(0, 1, 2, 3, 4, 6, 8, 12, 20))
+
+# Round trips counted for the request being served by the current thread
+_round_trips = threading.local()
+
+
+class RoundTrips:
+    """ Round trips made to storage, per tier """
+
+    def __init__(self):
+        self.per_tier = {}
+
+    def add(self, tier: str):
+        self.per_tier[tier] = self.per_tier.get(tier, 0) + 1
+
+    @property
+    def count(self):
+        return sum(self.per_tier.values())
+
+
+def stage_timer(stage: str):
+    """ Times the code in a `with` block as the given stage """
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+
+def record_round_trip(tier: str):
+    """ Counts a round trip to a storage tier, for the process and for the round trips being counted by this thread """
+    STORAGE_ROUND_TRIPS.labels(tier=tier).inc()
+    round_trips = getattr(_round_trips, "current", None)
+    if round_trips is not None:
+        round_trips.add(tier)
+
+
+@contextmanager
+def counting_round_trips():
+    """ Counts the round trips to storage made by this thread in a `with` block, e.g. while serving a request
+
+        :returns :func:`RoundTrips` that holds the count once the block is done
+    """
+    outer = getattr(_round_trips, "current", None)
+    round_trips = RoundTrips()
+    _round_trips.current = round_trips
+    try:
+        yield round_trips
+    finally:
+        _round_trips.current = outer
+        if outer is not None:
+            for tier, count in round_trips.per_tier.items():
+                outer.per_tier[tier] = outer.per_tier.get(tier, 0) + count
+
+
+def record_lookups(tier: str, hits: int, misses: int):
+    if hits:
+        CACHE_LOOKUPS.labels(tier=tier, result="hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(tier=tier, result="miss").inc(misses)
+
+
+class QuotaCollector:
+    """ Reports the upstream calls made and the quota left when metrics are collected. The quota is shared by the
+    workers through Redis, so it is read from there rather than added up over the workers """
+
+    def __init__(self, upstream_quota):
+        self.upstream_quota = upstream_quota
+
+    def describe(self):
+        # Keeps the registry from collecting, and so reading the quota, when the collector is registered
+        return []
+
+    def collect(self):
+        stats = self.upstream_quota.stats()
+        for name, documentation, value in (
+                ("standings_upstream_calls_today", "Calls made to RapidAPI today (UTC)", stats["calls_today"]),
+                ("standings_upstream_calls_this_month", "Calls made to RapidAPI this month (UTC)",
+                 stats["calls_this_month"]),
+                ("standings_upstream_quota_remaining", "Calls left in the RapidAPI quota", stats["remaining"]),
+                ("standings_upstream_quota_limit", "RapidAPI quota as reported by RapidAPI", stats["limit"])):
+            if value is not None:
+                yield GaugeMetricFamily(name, documentation, value=float(value))
+
+
+def metrics_registry(*collectors):
+    """ Builds the registry that /metrics is served from, with the metrics of all the workers and the given collectors
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ or 'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    for collector in collectors:
+        registry.register(collector)
+    return registry
@@ -0,0 +1,170 @@
+"""This module refreshes the standings of live seasons ahead of the requests for them """
+import datetime
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from backend.standings.common import logger_factory
+from backend.standings.domain.storage.freshness import is_live_season
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class MatchWindow:
+    """ Hours of some days of the week in which matches are played, e.g. weekends from 11:00 to 23:00. Days are numbered
+    from Monday (0) to Sunday (6) and hours are in UTC, the end hour excluded """
+
+    def __init__(self, days, start_hour, end_hour):
+        self.days = frozenset(days)
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+
+    def contains(self, moment: datetime.datetime):
+        return moment.weekday() in self.days and self.start_hour <= moment.hour < self.end_hour
+
+    @staticmethod
+    def from_config(window_config: dict):
+        return MatchWindow(window_config['days'], window_config['startHour'], window_config['endHour'])
+
+
+DEFAULT_MATCH_WINDOWS = (MatchWindow(days=[5, 6], start_hour=11, end_hour=23),
+                         MatchWindow(days=[1, 2], start_hour=17, end_hour=23))
+
+
+class RefreshCadence:
+    """ Decides how often the standings for a key are refreshed: often while matches are played, less often during the
+    day and rarely overnight. Finished seasons do not change anymore, so they are never refreshed """
+
+    def __init__(self, match_window_seconds=300, daytime_seconds=1800, overnight_seconds=7200,
+                 match_windows=DEFAULT_MATCH_WINDOWS, overnight_hours=(0, 8)):
+        self.match_window_seconds = match_window_seconds
+        self.daytime_seconds = daytime_seconds
+        self.overnight_seconds = overnight_seconds
+        self.match_windows = match_windows
+        self.overnight_hours = overnight_hours
+
+    def interval_seconds(self, key, now=None):
+        """ Returns the number of seconds until the next refresh of the key, or None if it is not to be refreshed """
+        now = time.time() if now is None else now
+        moment = datetime.datetime.utcfromtimestamp(now)
+        if not is_live_season(key.season, moment.date()):
+            return None
+        if any(window.contains(moment) for window in self.match_windows):
+            return self.match_window_seconds
+        start, end = self.overnight_hours
+        if start <= moment.hour < end:
+            return self.overnight_seconds
+        return self.daytime_seconds
+
+    @staticmethod
+    def from_config(cadence_config: dict):
+        """ Builds the cadence from config of the form
+            {"matchWindowSeconds": 300, "daytimeSeconds": 1800, "overnightSeconds": 7200, "overnightHours": [0, 8],
+             "matchWindows": [{"days": [5, 6], "startHour": 11, "endHour": 23}]}
+        """
+        match_windows = cadence_config.get('matchWindows')
+        return RefreshCadence(match_window_seconds=cadence_config.get('matchWindowSeconds', 300),
+                              daytime_seconds=cadence_config.get('daytimeSeconds', 1800),
+                              overnight_seconds=cadence_config.get('overnightSeconds', 7200),
+                              match_windows=DEFAULT_MATCH_WINDOWS if match_windows is None else tuple(
+                                  MatchWindow.from_config(window) for window in match_windows),
+                              overnight_hours=tuple(cadence_config.get('overnightHours', (0, 8))))
+
+
+class RefreshScheduler:
+    """ Refreshes the standings of the keys given by `keys_provider` on the :func:`RefreshCadence`, one key at a time.
+
+    Refreshes are spread out evenly so that the calls to the source stay within `calls_per_day`: two refreshes are at
+    least a day divided by `calls_per_day` apart. When more keys are due than the quota allows, the ones that have been
+    due the longest go first. The keys are asked for again every `rescan_seconds`, to pick up new leagues and seasons.
+    """
+
+    def __init__(self, keys_provider, refresher, cadence=None, calls_per_day=100, rescan_seconds=3600, jitter=0.1,
+                 clock=time.time, sleep=None):
+        """
+            :param keys_provider Function that returns the keys to refresh
+            :param refresher Function that fetches the standings for a key from the source and stores them
+            :param jitter Fraction of an interval by which refreshes are moved at random, so they do not line up
+        """
+        self.keys_provider = keys_provider
+        self.refresher = refresher
+        self.cadence = cadence if cadence is not None else RefreshCadence()
+        self.min_spacing_seconds = SECONDS_PER_DAY / calls_per_day
+        self.rescan_seconds = rescan_seconds
+        self.jitter = jitter
+        self.clock = clock
+        self._stop = threading.Event()
+        self.sleep = sleep if sleep is not None else self._stop.wait
+
+        self._schedule = []
+        self._scheduled = set()
+        self._sequence = itertools.count()
+        self._next_rescan = 0.0
+        self._last_call = None
+        self.refreshes = 0
+        self.failures = 0
+        self.logger = logger_factory(RefreshScheduler.__name__)
+
+    def run(self):
+        """ Refreshes keys until :func:`RefreshScheduler.stop` is called """
+        self.logger.info("Refreshing standings at most every %.0f second(s)", self.min_spacing_seconds)
+        while not self._stop.is_set():
+            self.run_once()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        """ Waits for the next key to be due and within quota, then refreshes it
+
+            :returns The key that was refreshed, or None if there was none due
+        """
+        now = self.clock()
+        if now >= self._next_rescan:
+            self._rescan(now)
+        if not self._schedule:
+            self.sleep(max(0.0, self._next_rescan - now))
+            return None
+
+        due_at, _, key = self._schedule[0]
+        start_at = due_at if self._last_call is None else max(due_at, self._last_call + self.min_spacing_seconds)
+        start_at = min(start_at, self._next_rescan)
+        if start_at > now:
+            self.sleep(start_at - now)
+            return None
+
+        heapq.heappop(self._schedule)
+        self._scheduled.discard(key)
+        self._last_call = now
+        try:
+            self.refresher(key)
+            self.refreshes += 1
+        except Exception as e:
+            self.failures += 1
+            self.logger.error("Could not refresh standings for key %s. Error message: %s", key.key, e.__str__())
+        self._reschedule(key, self.clock())
+        return key
+
+    def _rescan(self, now):
+        keys = [key for key in self.keys_provider() if key not in self._scheduled]
+        for index, key in enumerate(keys):
+            interval = self.cadence.interval_seconds(key, now)
+            if interval is not None:
+                # Keys seen for the first time are spread over their first interval instead of all being due at once
+                self._push(now + interval * index / len(keys), key)
+        self._next_rescan = now + self.rescan_seconds
+        self.logger.info("Scheduled %s new key(s) for refresh, %s in total", len(keys), len(self._schedule))
+
+    def _reschedule(self, key, now):
+        interval = self.cadence.interval_seconds(key, now)
+        if interval is None:
+            self.logger.info("Season of key %s is finished. Not refreshing it anymore", key.key)
+            return
+        self._push(now + interval * random.uniform(1 - self.jitter, 1 + self.jitter), key)
+
+    def _push(self, due_at, key):
+        # The sequence number breaks ties between keys due at the same time, since keys are not ordered
+        heapq.heappush(self._schedule, (due_at, next(self._sequence), key))
+        self._scheduled.add(key)
@@ -0,0 +1,94 @@
+"""This module serves the changes to standings since a version a client already has """
+import json
+import threading
+from collections import OrderedDict
+
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.response.standings import standing_document
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import change_version
+
+
+class ChangeFeed:
+    """ Serves the standings of a key that changed since a version, from the change log of the key in Redis.
+
+    A client that has no version yet, or one that is not in the log anymore, gets a snapshot of the standings:
+    {"version": 1621728000000, "snapshot": true, "standings": {"1": {...}, ...}}. A client with a version in the log
+    gets the standings whose values changed since, keyed by their position in the table, and the positions that are not
+    in the table anymore: {"version": 1621728060000, "since": 1621728000000, "snapshot": false, "changes": {"2": {...}},
+    "removed": []}. The version in the response is the one to ask for changes since next time.
+
+    The versions in the log are read with one round trip. The rows of the standings are only read from the log the
+    first time a response is made for a key, version and latest version: the response is kept for the next clients
+    that ask for it, up to `max_encodings` responses, the least recently used going first.
+    """
+
+    def __init__(self, change_log=None, max_encodings=256):
+        """
+            :param change_log :func:`RedisCache` that holds the change logs, or None if there is none, in which case
+            snapshots are always served
+        """
+        self.change_log = change_log
+        self.max_encodings = max_encodings
+        self._encodings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def changes(self, key: Key, since: int, standings: Standings):
+        """ Returns the JSON encoded changes to the standings of a key since a version
+
+            :param since Version the client has, 0 if it has none
+            :param standings Current standings of the key, served as a snapshot when the log cannot tell the changes
+            :returns Tuple of the latest version and the JSON response, as bytes
+        """
+        latest, since_logged = (None, False) if self.change_log is None else \
+            self.change_log.get_change_versions(key, since)
+        if latest is None:
+            # Nothing was logged for the key since the cache was emptied, or ever
+            version = change_version(standings)
+            if self.change_log is not None:
+                self.change_log.record_change(key, standings)
+            return version, _snapshot(version, standings)
+        if since == latest:
+            return latest, _changes(latest, since, {}, [])
+
+        cache_key = (key, latest, since if since_logged else None)
+        with self._lock:
+            encoded = self._encodings.get(cache_key)
+            if encoded is not None:
+                self._encodings.move_to_end(cache_key)
+                return latest, encoded
+
+        rows = self.change_log.get_change_rows(key, [latest, since] if since_logged else [latest])
+        latest_rows, since_rows = rows[0], rows[1] if since_logged else None
+        if latest_rows is None:
+            # The rows of the latest version expired, the current standings are the ones that are served
+            return latest, _snapshot(latest, standings)
+        if since_rows is None:
+            encoded = _snapshot(latest, Standings.from_rows(latest_rows))
+        else:
+            encoded = _changes(latest, since, *_difference(since_rows, latest_rows))
+
+        with self._lock:
+            self._encodings[cache_key] = encoded
+            while len(self._encodings) > self.max_encodings:
+                self._encodings.popitem(last=False)
+        return latest, encoded
+
+
+def _difference(before, after):
+    """ Returns the documents of the rows that changed, keyed by their position in the table starting at 1, and the
+    positions that are not in the table anymore """
+    changed = {position: standing_document(row) for position, row in enumerate(after, start=1)
+               if position > len(before) or before[position - 1] != row}
+    removed = list(range(len(after) + 1, len(before) + 1))
+    return changed, removed
+
+
+def _snapshot(version, standings: Standings):
+    # The compact encoding of the standings is kept with them, so it is reused rather than encoded again
+    return b'{"version":' + str(version).encode() + b',"snapshot":true,' + standings.as_json_bytes()[1:]
+
+
+def _changes(version, since, changed, removed):
+    return json.dumps({"version": version, "since": since, "snapshot": False, "changes": changed, "removed": removed},
+                      separators=(",", ":")).encode()
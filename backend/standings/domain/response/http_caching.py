@@ -0,0 +1,79 @@
+"""This module holds the HTTP caching rules for standings responses """
+from email.utils import formatdate
+
+from backend.standings.domain.storage.freshness import is_live_season
+
+# Live seasons change during match days, finished seasons never change
+LIVE_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300, stale-if-error=86400"
+FINISHED_CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800, stale-if-error=604800"
+
+
+class CachePolicy:
+    """ Gives the Cache-Control header value for the standings of a season """
+
+    def __init__(self, live=LIVE_CACHE_CONTROL, finished=FINISHED_CACHE_CONTROL):
+        self.live = live
+        self.finished = finished
+
+    def cache_control(self, season):
+        return self.live if is_live_season(season) else self.finished
+
+    @staticmethod
+    def from_config(cache_control_config: dict):
+        """ Builds the policy from config of the form {"live": "public, max-age=60", "finished": "public, ..."} """
+        return CachePolicy(live=cache_control_config.get('live', LIVE_CACHE_CONTROL),
+                           finished=cache_control_config.get('finished', FINISHED_CACHE_CONTROL))
+
+
+def etag(digest: str):
+    """ Returns a weak entity tag, since the identity and gzip encodings of a response share the same tag """
+    return 'W/"{}"'.format(digest)
+
+
+def is_not_modified(if_none_match, entity_tag: str):
+    """ Checks whether the entity tags sent by the client in the If-None-Match header match the given one
+
+        :param if_none_match Value of the If-None-Match header, or None if the client didn't send it
+        :param entity_tag Entity tag of the current response
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = _opaque_tag(entity_tag)
+    return any(_opaque_tag(tag.strip()) == opaque_tag for tag in if_none_match.split(","))
+
+
+def _opaque_tag(entity_tag: str):
+    return entity_tag[2:] if entity_tag.startswith("W/") else entity_tag
+
+
+def accepts_gzip(accept_encoding):
+    """ Checks whether the client accepts gzip encoded responses, as told by its Accept-Encoding header, e.g.
+    "gzip, deflate", "*" or "gzip;q=0". A coding named in the header takes precedence over "*"
+
+        :param accept_encoding Value of the Accept-Encoding header, or None if the client didn't send it
+    """
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, _, parameters = coding.partition(";")
+        qualities[name.strip().lower()] = _quality(parameters)
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return quality > 0
+
+
+def _quality(parameters: str):
+    for parameter in parameters.split(";"):
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
@@ -15,14 +15,17 @@ def server_error_response(error_code):
     return _error_response(error_code=error_code)
 
 
-def _error_response(description="Internal server error", error_code=500):
-    if error_code is None:
-        error_code = 500
-
-    payload = json.dumps({
+def error_payload(description="Internal server error", error_code=500):
+    """ Returns the JSON encoded error, as bytes """
+    return json.dumps({
         "service_name": "standings",
         "error_code": error_code,
         "description": description
-    })
+    }).encode()
+
+
+def _error_response(description="Internal server error", error_code=500):
+    if error_code is None:
+        error_code = 500
 
-    return Response(payload, status=error_code, mimetype='application/json')
+    return Response(error_payload(description, error_code), status=error_code, mimetype='application/json')
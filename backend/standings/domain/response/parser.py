@@ -0,0 +1,78 @@
+"""This module parses the standings responses of RapidAPI straight into a table of standings """
+import gzip
+import json
+
+try:
+    # Parses JSON a few times faster than the json module, which is used when it is not installed
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.upstream.client import UpstreamException
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class PayloadException(UpstreamException):
+    def __init__(self, message):
+        super(PayloadException, self).__init__(message)
+
+
+class NoStandingsException(PayloadException):
+    """ The source answered, without errors, that it has no standings, e.g. for a season that was not played """
+
+    def __init__(self, message):
+        super(NoStandingsException, self).__init__(message)
+
+
+def parse_standings(body: bytes, fetched_at=None) -> Standings:
+    """ Parses the body of a standings response into standings built from a table, with a row per standing in the
+    order of :data:`COLUMNS`. Only the fields that are served are read, and no object is built per standing. The
+    standings of every group are read, in the order of the groups, and are keyed by their position in the table
+
+        :param body Body of the response, as JSON, compressed with gzip or not
+        :param fetched_at Time at which the standings were fetched, now if not given
+        :returns :func:`Standings`
+        :raises NoStandingsException if the response holds no standings and no errors
+        :raises PayloadException if the body is not a standings response, or a standing lacks a field or has a field
+        of the wrong type
+    """
+    try:
+        if body[:2] == _GZIP_MAGIC:
+            body = gzip.decompress(body)
+        payload = _loads(body)
+        if payload['response'] == [] and not payload.get('errors'):
+            raise NoStandingsException("Standings response holds no standings")
+        groups = payload['response'][0]['league']['standings']
+    except (OSError, EOFError, ValueError, LookupError, TypeError) as e:
+        raise PayloadException("Could not parse standings response. Error message: {}".format(e.__str__()))
+
+    rows = []
+    try:
+        for group in groups:
+            for standing in group:
+                team = standing['team']
+                record = standing['all']
+                goals = record['goals']
+                row = [standing['rank'], team['id'], team['name'], team['logo'], "", standing['points'],
+                       standing['group'], standing['form'], "all", record['played'], record['win'], record['draw'],
+                       record['lose'], goals['for'], goals['against']]
+                if not _is_valid(row):
+                    raise PayloadException("Standing at rank '{}' has a field of the wrong type".format(row[0]))
+                rows.append(row)
+    except (LookupError, TypeError) as e:
+        raise PayloadException("Could not parse standings response. Error message: missing field {}".format(
+            e.__str__()))
+    return Standings.from_rows(rows, fetched_at)
+
+
+def _is_valid(row):
+    (rank, team_id, team_name, team_logo, _, points, group, form, _, played, wins, draws, loses, goals_for,
+     goals_against) = row
+    # Exact types, as JSON booleans are ints too
+    return (type(rank) is int and type(team_id) is int and type(team_name) is str and type(team_logo) is str and
+            type(points) is int and type(group) is str and (form is None or type(form) is str) and
+            type(played) is int and type(wins) is int and type(draws) is int and type(loses) is int and
+            type(goals_for) is int and type(goals_against) is int)
@@ -0,0 +1,186 @@
+"""This module serves parts of standings: some of their fields, in some order, for some of the ranks """
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from backend.standings.domain.response.standings import FIELDS
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.response.standings import StandingsTable
+
+PROJECTION_PARAMETERS = ("fields", "sort", "top", "ranks")
+
+
+class ProjectionException(ValueError):
+    def __init__(self, message):
+        super(ProjectionException, self).__init__(message)
+
+
+def resolve_field(name: str):
+    """ Returns the paths of the fields that a name stands for: the path of a field, e.g. "team.name", the last part of
+    it, e.g. "name", or the path of a group of fields, e.g. "team"
+
+        :raises ProjectionException if there is no such field
+    """
+    if name in FIELDS:
+        return [name]
+    paths = [path for path in FIELDS if path.startswith(name + ".") or path.rsplit(".", 1)[-1] == name]
+    if len(paths) == 0:
+        raise ProjectionException("Unknown field '{}'. Fields are: {}".format(name, ", ".join(FIELDS)))
+    return paths
+
+
+class Projection:
+    """ A part of standings: the fields to serve, the field to order the standings by, and which standings to serve, by
+    rank and by number. Standings are served as a list, in the order asked for, of documents with the fields asked for
+    nested as they are in the full standings, e.g. {"standings": [{"rank": 1, "team": {"name": "Inter"}}]}
+    """
+
+    def __init__(self, fields=None, sort=None, descending=False, top=None, ranks=None):
+        """
+            :param fields Paths of the fields to serve, all of them if None
+            :param sort Path of the field to order the standings by, their order in the table if None
+            :param descending Whether the standings are ordered from the highest value of the field down
+            :param top Number of standings to serve, from the first in order, all of them if None
+            :param ranks Lowest and highest rank of the standings to serve, as a tuple, any rank if None
+        """
+        self.fields = tuple(fields) if fields is not None else tuple(FIELDS)
+        self.sort = sort
+        self.descending = descending
+        self.top = top
+        self.ranks = ranks
+        self.key = (self.fields, sort, descending, top, ranks)
+        # The fields grouped as they are nested in the documents: (name, path) for top level fields and
+        # (name, [(name, path), ...]) for groups of fields
+        self._layout = []
+        groups = {}
+        for path in self.fields:
+            group, _, name = path.rpartition(".")
+            if group == "":
+                self._layout.append((name, path))
+            elif group in groups:
+                groups[group].append((name, path))
+            else:
+                groups[group] = [(name, path)]
+                self._layout.append((group, groups[group]))
+
+    @staticmethod
+    def from_args(args):
+        """ Builds the projection from query parameters, e.g. ?fields=rank,team.name,points&sort=-goal_diff&top=5 or
+        ?ranks=15-20. The sort field is prefixed with '-' for the highest values first
+
+            :param args Query parameters of the request
+            :returns Projection, or None if no part of the standings is asked for
+            :raises ProjectionException if a parameter is not valid
+        """
+        if not any(parameter in args for parameter in PROJECTION_PARAMETERS):
+            return None
+        fields = None
+        if 'fields' in args:
+            fields = []
+            for name in args['fields'].split(','):
+                if name.strip() == '':
+                    continue
+                fields.extend(path for path in resolve_field(name.strip()) if path not in fields)
+            if len(fields) == 0:
+                raise ProjectionException("Query parameter 'fields' names no field, e.g. fields=rank,team.name")
+
+        sort, descending = None, False
+        if args.get('sort', '').strip() != '':
+            name = args['sort'].strip()
+            descending = name.startswith('-')
+            paths = resolve_field(name.lstrip('-'))
+            if len(paths) != 1:
+                raise ProjectionException("Cannot sort by '{}', it is a group of fields".format(name.lstrip('-')))
+            sort = paths[0]
+
+        top = None
+        if 'top' in args:
+            top = _positive_int(args['top'], 'top')
+
+        ranks = None
+        if 'ranks' in args:
+            lowest, _, highest = args['ranks'].partition('-')
+            ranks = (_positive_int(lowest, 'ranks'), _positive_int(highest if highest else lowest, 'ranks'))
+            if ranks[0] > ranks[1]:
+                raise ProjectionException("Query parameter 'ranks' must go from the lowest rank up, e.g. ranks=15-20")
+        return Projection(fields=fields, sort=sort, descending=descending, top=top, ranks=ranks)
+
+    def positions(self, table: StandingsTable):
+        """ Returns the positions in the table of the standings to serve, in the order to serve them """
+        positions = table.order(self.sort, self.descending) if self.sort is not None else range(table.size)
+        if self.ranks is not None:
+            lowest, highest = self.ranks
+            rank = table.columns["rank"]
+            positions = [position for position in positions if lowest <= rank[position] <= highest]
+        if self.top is not None:
+            positions = positions[:self.top]
+        return positions
+
+    def documents(self, table: StandingsTable):
+        columns = table.columns
+        # Columns of the top level fields, and of the fields of every group
+        layout = [(name, columns[path], None) if isinstance(path, str) else
+                  (name, None, [(field, columns[field_path]) for field, field_path in path])
+                  for name, path in self._layout]
+        documents = []
+        for position in self.positions(table):
+            document = {}
+            for name, column, group in layout:
+                if group is None:
+                    document[name] = column[position]
+                else:
+                    document[name] = {field: values[position] for field, values in group}
+            documents.append(document)
+        return documents
+
+    def as_json(self, table: StandingsTable, pretty=False):
+        return json.dumps({"standings": self.documents(table)}, indent=4 if pretty else None)
+
+    def as_json_bytes(self, table: StandingsTable):
+        """ Returns the compact JSON encoding of the part of the standings """
+        return json.dumps({"standings": self.documents(table)}, separators=(",", ":")).encode()
+
+    def tag(self):
+        """ Returns a short hash of the projection, which tells the parts of the same standings apart """
+        return hashlib.blake2b(repr(self.key).encode(), digest_size=8).hexdigest()
+
+
+def _positive_int(value: str, parameter: str):
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ProjectionException("Query parameter '{}' must be a positive whole number, not '{}'"
+                                  .format(parameter, value))
+    return number
+
+
+class ProjectionEncodings:
+    """ Keeps the compact JSON encodings of the parts of standings that are served, for the next requests for the same
+    parts, up to `max_encodings` of them, the least recently used going first. The encodings are keyed by the digest
+    of the standings and the tag of the projection, so they are not kept with the standings, and the parts that
+    clients ask for don't make the standings in the local cache any bigger
+    """
+
+    def __init__(self, max_encodings=256):
+        self.max_encodings = max_encodings
+        self._encodings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def as_json_bytes(self, standings: Standings, projection: Projection):
+        """ Returns the compact JSON encoding of a part of standings, encoded the first time it is asked for """
+        cache_key = (standings.get_digest(), projection.tag())
+        with self._lock:
+            encoded = self._encodings.get(cache_key)
+            if encoded is not None:
+                self._encodings.move_to_end(cache_key)
+                return encoded
+
+        encoded = projection.as_json_bytes(standings.get_table())
+        with self._lock:
+            self._encodings[cache_key] = encoded
+            while len(self._encodings) > self.max_encodings:
+                self._encodings.popitem(last=False)
+        return encoded
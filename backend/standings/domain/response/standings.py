@@ -7,15 +7,66 @@
 # 'away': {'played': 18, 'win': 11, 'draw': 6, 'lose': 1, 'goals': {'for': 34, 'against': 14}}, 'update':
 # '2021-05-15T00:00:00+00:00'}
 
+import gzip
+import hashlib
 import json
 import random
+import sys
+import threading
+import time
+from collections import OrderedDict
 
 from backend.standings.common import equality_tester
 from backend.standings.common import logger_factory
+from backend.standings.domain import metrics
 
+# The values of a standing, in the order that they are held in a table of standings
+COLUMNS = ("rank", "team_id", "team_name", "team_logo", "team_homepage", "points", "group", "form", "record_type",
+           "played", "wins", "draws", "loses", "goals_for", "goals_against")
+RANK = COLUMNS.index("rank")
 
-class Team:
+
+class _Compact:
+    """ Base of the value classes of standings. Their fields are slots rather than a dictionary per instance, which
+    takes less memory. The fields are encoded to JSON in the order of the slots, and pickled as a tuple in that order
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        # Pickles made before the fields were slots hold the fields as a dictionary
+        if isinstance(state, dict):
+            state = [state[name] for name in self.__slots__]
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+def _deep_size(value):
+    """ Returns about how many bytes a value takes in memory, with the lists, dictionaries and value classes it holds.
+    Values held more than once are counted every time """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(key) + _deep_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(item) for item in value)
+    elif isinstance(value, _Compact):
+        size += sum(_deep_size(getattr(value, name)) for name in value.__slots__)
+    return size
+
+
+def as_dict(value):
+    """ Turns the value classes into dictionaries, as the `default` of :func:`json.dumps` """
+    return value.as_dict()
+
+
+class Team(_Compact):
     """ All the information about a team """
+    __slots__ = ("id_", "name", "logo", "homepage")
 
     def __init__(self, id_: int, name: str, logo: str, homepage=""):
         self.id_ = id_
@@ -42,7 +93,9 @@ class Team:
         return self.name
 
 
-class Goals:
+class Goals(_Compact):
+    __slots__ = ("goals_for", "goals_against")
+
     def __init__(self, goals_for, goals_against):
         self.goals_for = goals_for
         self.goals_against = goals_against
@@ -57,8 +110,9 @@ class Goals:
         return equality_tester(self, Goals, other)
 
 
-class Record:
+class Record(_Compact):
     """ Information about team's record in games """
+    __slots__ = ("type_", "played", "wins", "draws", "loses", "goals_for", "goals_against", "goal_diff")
 
     def __init__(self, type_: str, played: int, wins: int, draws: int, loses: int, goals_for: int, goals_against: int):
         self.type_ = type_
@@ -99,12 +153,16 @@ class Record:
 
 
 class Records:
+    SUPPORTED_TYPES = frozenset(["all", "home", "away"])
+    logger = logger_factory("Records")
+    __slots__ = ("supported_types", "records")
+
     def __init__(self, supported_types=None):
-        if supported_types is None:
-            supported_types = ["all", "home", "away"]
-        self.is_supported = lambda type_: type_ in supported_types
+        self.supported_types = Records.SUPPORTED_TYPES if supported_types is None else frozenset(supported_types)
         self.records = {}
-        self.logger = logger_factory(Records.__name__)
+
+    def is_supported(self, type_):
+        return type_ in self.supported_types
 
     def add_record(self, record: Record):
         type_ = record.get_type()
@@ -130,8 +188,9 @@ class RecordTypeError(KeyError):
         super(RecordTypeError, self).__init__(message)
 
 
-class Standing:
+class Standing(_Compact):
     """ All information about a standing """
+    __slots__ = ("rank", "team", "points", "group", "form", "record")
 
     def __init__(self, rank: int, team: Team, points: int, group: str, form: str, records: Records):
         self.rank = rank
@@ -177,45 +236,222 @@ class Standing:
     def get_form(self):
         return self.form
 
+    @staticmethod
+    def from_row(row):
+        """ Builds a standing from its values, in the order of :data:`COLUMNS` """
+        (rank, team_id, team_name, team_logo, team_homepage, points, group, form, record_type, played, wins, draws,
+         loses, goals_for, goals_against) = row
+        standing = Standing.__new__(Standing)
+        standing.rank = rank
+        standing.team = Team(team_id, team_name, team_logo, team_homepage)
+        standing.points = points
+        standing.group = group
+        standing.form = form
+        standing.record = Record(record_type, played, wins, draws, loses, goals_for, goals_against)
+        return standing
+
+    def as_row(self):
+        """ Returns the values of the standing as a flat list, in the order of :data:`COLUMNS` """
+        team = self.team
+        record = self.record
+        return [self.rank, team.id_, team.name, team.logo, team.homepage, self.points, self.group, self.form,
+                record.type_, record.played, record.wins, record.draws, record.loses, record.goals_for,
+                record.goals_against]
+
     def __str__(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps(self, default=as_dict)
 
     def __eq__(self, other):
         return equality_tester(self, Standing, other)
 
 
 class Standings:
-    """ This is a collection of all standings for a league at a given time"""
+    """ This is a collection of all standings for a league at a given time.
+
+    Standings are either added one by one, or built at once from a table by :func:`Standings.from_rows`, with a row of
+    values per standing in the order of :data:`COLUMNS`. Standings built from a table are encoded, hashed and stored
+    from the table itself, and only build a :func:`Standing` per row the first time they are asked for them
+
+    Encodings and tables are kept with the standings once made, so the standings take more memory as they are served.
+    A cache holding them can listen for that with :func:`Standings.listen_to_growth`
+    """
+
+    # Standings stored before fetch times were tracked are treated as fetched a long time ago
+    fetched_at = 0.0
+    _json_bytes = None
+    _gzip_bytes = None
+    _digest = None
+    _rows = None
+    _table = None
+    _rows_size = None
+    _objects_size = None
+    _growth_listener = None
 
     def __init__(self):
         self.standings = {}
+        self.fetched_at = time.time()
+
+    @staticmethod
+    def from_rows(rows, fetched_at=None):
+        """ Builds standings from a table. The standings are keyed by their position in the table, starting at 1,
+        which is their rank unless the table holds many groups
+
+            :param rows Values of every standing, in the order of :data:`COLUMNS`
+            :param fetched_at Time at which the standings were fetched, now if not given
+        """
+        standings = Standings.__new__(Standings)
+        standings._rows = rows
+        standings.fetched_at = time.time() if fetched_at is None else fetched_at
+        return standings
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set: standings built from a table build their standing objects the
+        # first time they are asked for them
+        if name == 'standings' and self._rows is not None:
+            self.standings = {position: Standing.from_row(row) for position, row in enumerate(self._rows, start=1)}
+            self._grown()
+            return self.standings
+        raise AttributeError("'Standings' object has no attribute '{}'".format(name))
 
     def add(self, standing: Standing):
         assert standing is not None
         rank = standing.get_rank()
         self.standings[rank] = standing
+        self._rows = None
+        self._json_bytes = None
+        self._gzip_bytes = None
+        self._digest = None
+        self._table = None
+        self._objects_size = None
 
         return self
 
     def get_all(self):
         return self.standings
 
+    def get_rows(self):
+        """ Returns the values of every standing, in the order of :data:`COLUMNS`, in the order of the standings """
+        if self._rows is not None:
+            return self._rows
+        return [standing.as_row() for standing in self.standings.values()]
+
     def is_empty(self):
+        if self._rows is not None:
+            return len(self._rows) == 0
         return len(self.standings) == 0
 
-    def as_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+    def get_table(self):
+        """ Returns the standings as a :func:`StandingsTable`, which is built once """
+        if self._table is None:
+            self._table = StandingsTable(self.get_rows(), growth_listener=self._grown)
+            self._grown()
+        return self._table
+
+    def get_fetched_at(self):
+        """ Returns the time, in seconds since the epoch, at which these standings were fetched from the source """
+        return self.fetched_at
+
+    def as_json(self, pretty=False):
+        if pretty:
+            return json.dumps(self._document(), indent=4)
+        return self.as_json_bytes().decode()
+
+    def as_json_bytes(self):
+        """ Returns the compact JSON encoding of the standings. Standings don't change once built, so the encoding is
+        done once and reused for every response """
+        if self._json_bytes is None:
+            with metrics.stage_timer(metrics.SERIALIZE):
+                self._json_bytes = json.dumps(self._document(), separators=(",", ":")).encode()
+            self._grown()
+        return self._json_bytes
+
+    def _document(self):
+        if self._rows is not None:
+            keyed_rows = enumerate(self._rows, start=1)
+        else:
+            keyed_rows = ((key, standing.as_row()) for key, standing in self.standings.items())
+        return {"standings": {key: standing_document(row) for key, row in keyed_rows}}
+
+    def as_gzip_bytes(self):
+        """ Returns the gzip compressed compact JSON encoding of the standings, done once too """
+        if self._gzip_bytes is None:
+            self._gzip_bytes = gzip.compress(self.as_json_bytes(), mtime=0)
+            self._grown()
+        return self._gzip_bytes
+
+    def set_json_bytes(self, json_bytes: bytes):
+        """ Sets the compact JSON encoding of the standings, when it was stored alongside them """
+        self._json_bytes = json_bytes
+        self._gzip_bytes = None
+        self._grown()
+
+    def get_digest(self):
+        """ Returns a hash of the content of the standings, which changes whenever any standing changes. It is worked
+        out once, from the values of the standings in the order of their ranks rather than from their encoding, so
+        that the same standings have the same digest whether they were added one by one or built from a table. It is
+        stored with the standings so that standings read from storage don't work it out again. The fetch time is not
+        part of it
+        """
+        if self._digest is None:
+            # Standings with the same rank, in different groups, keep their order in the table
+            rows = sorted(self.get_rows(), key=lambda row: row[RANK])
+            self._digest = hashlib.blake2b(json.dumps(rows, separators=(",", ":")).encode(),
+                                           digest_size=16).hexdigest()
+        return self._digest
+
+    def memory_size(self):
+        """ Returns about how many bytes the standings take in memory, with everything that is kept with them: the
+        table of values they were built from, the standing objects, the encodings and the :func:`StandingsTable`.
+        The values and the objects are measured once, as they don't change once built
+        """
+        size = sys.getsizeof(self)
+        if self._rows is not None:
+            if self._rows_size is None:
+                self._rows_size = _deep_size(self._rows)
+            size += self._rows_size
+        if 'standings' in self.__dict__:
+            if self._objects_size is None:
+                self._objects_size = _deep_size(self.standings)
+            size += self._objects_size
+        for encoding in (self._json_bytes, self._gzip_bytes):
+            if encoding is not None:
+                size += sys.getsizeof(encoding)
+        if self._table is not None:
+            size += self._table.memory_size()
+        # Measured last, once the sizes kept in it are set
+        return size + sys.getsizeof(self.__dict__)
+
+    def listen_to_growth(self, listener):
+        """ Calls `listener`, without arguments, every time something is kept with the standings that makes them take
+        more memory, e.g. an encoding. Standings have one listener at most """
+        self._growth_listener = listener
+
+    def _grown(self):
+        listener = self._growth_listener
+        if listener is not None:
+            listener()
+
+    def set_digest(self, digest: str):
+        """ Sets the digest of the standings, when it was stored alongside them """
+        self._digest = digest
+
+    def __getstate__(self):
+        # Pickles hold the standing objects, as they always did
+        self.get_all()
+        state = self.__dict__.copy()
+        state.pop('_rows', None)
+        state.pop('_json_bytes', None)
+        state.pop('_gzip_bytes', None)
+        state.pop('_table', None)
+        state.pop('_rows_size', None)
+        state.pop('_objects_size', None)
+        state.pop('_growth_listener', None)
+        return state
 
     def __eq__(self, other):
+        """ Standings are equal when they hold the same standings, no matter when they were fetched """
         if isinstance(other, Standings):
-            other_standings = other.get_all()
-            for rank in self.standings:
-                for_self = self.standings[rank]
-                for_other = other_standings[rank]
-
-                if for_self != for_other:
-                    return False
-            return True
+            return self.get_digest() == other.get_digest()
         return False
 
     def __str__(self):
@@ -226,6 +462,69 @@ class Standings:
         return 'standings'
 
 
+# Fields of a standing, by their path in its JSON document, and the column of a table of standings they are in. The
+# goal difference is worked out from the goals
+FIELDS = OrderedDict((path, COLUMNS.index(column)) for path, column in [
+    ("rank", "rank"), ("team.id_", "team_id"), ("team.name", "team_name"), ("team.logo", "team_logo"),
+    ("team.homepage", "team_homepage"), ("points", "points"), ("group", "group"), ("form", "form"),
+    ("record.type_", "record_type"), ("record.played", "played"), ("record.wins", "wins"), ("record.draws", "draws"),
+    ("record.loses", "loses"), ("record.goals_for", "goals_for"), ("record.goals_against", "goals_against")])
+FIELDS["record.goal_diff"] = None
+
+
+class StandingsTable:
+    """ Standings held as a column of values per field, for serving parts of them: some of the fields, in some order,
+    of some of the standings. The order of the standings by a field is worked out the first time it is asked for, and
+    kept. Standings don't change once built, so neither does their table. The table counts the memory it takes, and
+    calls `growth_listener`, if given, every time an order is kept """
+
+    def __init__(self, rows, growth_listener=None):
+        self.size = len(rows)
+        self.columns = {path: [row[column] for row in rows] for path, column in FIELDS.items() if column is not None}
+        self.columns["record.goal_diff"] = [goals_for - goals_against for goals_for, goals_against in
+                                            zip(self.columns["record.goals_for"], self.columns["record.goals_against"])]
+        self._orders = {}
+        self._lock = threading.Lock()
+        self._growth_listener = growth_listener
+        self._bytes = sys.getsizeof(self) + _deep_size(self.columns)
+
+    def memory_size(self):
+        """ Returns about how many bytes the table takes in memory, with the orders kept with it """
+        return self._bytes
+
+    def order(self, path, descending=False):
+        """ Returns the positions of the standings in the table, ordered by a field. Standings with the same value keep
+        their order in the table, and standings without a value come last """
+        order = self._orders.get((path, descending))
+        if order is None:
+            column = self.columns[path]
+            present = [position for position in range(self.size) if column[position] is not None]
+            missing = [position for position in range(self.size) if column[position] is None]
+            present.sort(key=column.__getitem__, reverse=descending)
+            order = present + missing
+            with self._lock:
+                if (path, descending) not in self._orders:
+                    self._orders[(path, descending)] = order
+                    self._bytes += _deep_size(order)
+            self._grown()
+        return order
+
+    def _grown(self):
+        if self._growth_listener is not None:
+            self._growth_listener()
+
+
+def standing_document(row):
+    """ Returns the JSON document of a standing from its values, with the fields in the order of the classes """
+    (rank, team_id, team_name, team_logo, team_homepage, points, group, form, record_type, played, wins, draws, loses,
+     goals_for, goals_against) = row
+    return {"rank": rank, "team": {"id_": team_id, "name": team_name, "logo": team_logo, "homepage": team_homepage},
+            "points": points, "group": group, "form": form,
+            "record": {"type_": record_type, "played": played, "wins": wins, "draws": draws, "loses": loses,
+                       "goals_for": goals_for, "goals_against": goals_against,
+                       "goal_diff": goals_for - goals_against}}
+
+
 def standing_builder(standing_response):
     """ Builds a standing from json text
 
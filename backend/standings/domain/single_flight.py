@@ -0,0 +1,117 @@
+"""This module makes sure that concurrent cache misses for the same key result in a single upstream fetch """
+import threading
+import time
+import uuid
+
+from backend.standings.common import logger_factory
+
+
+class _Call:
+    """ An in-flight fetch that other callers in this process can wait on """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """ Coalesces concurrent fetches per key. Within a process only one fetch per key is in flight at a time, the other
+    callers wait for its result. When a lease provider (e.g. :func:`RedisCache`) is given, the fetching caller also
+    holds a lease on the key so that the other workers wait for the result to be stored instead of fetching it too.
+    No fetch is made without the lease, so the lease should last at least as long as the slowest fetch. Callers that
+    time out waiting are served the last stored value, or try to take the lease again if there is none.
+    """
+
+    def __init__(self, lease_provider=None, lease_seconds=10, wait_seconds=5, poll_interval_seconds=0.05):
+        self.lease_provider = lease_provider
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.logger = logger_factory(SingleFlight.__name__)
+
+    def do(self, key, fetch, lookup=None, fallback=None):
+        """ Fetches the value for a key, making sure only one fetch for the key is in flight at a time
+
+            :param key Key the value is fetched for
+            :param fetch Callable that fetches (and stores) the value
+            :param lookup Callable that returns the stored value for the key or None. Used by the callers that wait on
+            a fetch made by another worker
+            :param fallback Callable that returns the last stored value for the key however old, or None. Served to the
+            callers that timed out waiting on a fetch
+            :returns The fetched value
+            :raises Whatever the fetch raised, for all the callers waiting on it
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            return self._wait_in_process(key, call, fetch, lookup, fallback)
+
+        try:
+            call.result = self._fetch_across_workers(key, fetch, lookup, fallback)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _wait_in_process(self, key, call, fetch, lookup, fallback):
+        # The leader may itself wait on another worker before fetching, for at most as long as the lease lasts
+        if not call.done.wait(self.wait_seconds + self.lease_seconds):
+            value = fallback() if fallback is not None else None
+            if value is not None:
+                self.logger.warning("Timed out waiting for in-flight fetch for key %s. Serving last stored value", key)
+                return value
+            self.logger.warning("Timed out waiting for in-flight fetch for key %s. Waiting again", key)
+            return self.do(key, fetch, lookup, fallback)
+        if call.error is not None:
+            raise call.error
+        self.logger.debug("Shared in-flight fetch result for key %s", key)
+        return call.result
+
+    def _fetch_across_workers(self, key, fetch, lookup, fallback):
+        if self.lease_provider is None:
+            return fetch()
+
+        lease = _lease_name(key)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            if self.lease_provider.acquire_lease(lease, token, self.lease_seconds):
+                try:
+                    return fetch()
+                finally:
+                    self.lease_provider.release_lease(lease, token)
+
+            if lookup is not None:
+                value = lookup()
+                if value is not None:
+                    self.logger.debug("Key %s was fetched by another worker", key)
+                    return value
+
+            if deadline is not None and time.monotonic() >= deadline:
+                value = fallback() if fallback is not None else None
+                if value is not None:
+                    self.logger.warning("Timed out waiting for another worker to fetch key %s. Serving last stored "
+                                        "value", key)
+                    return value
+                # The lease of the other worker expires at the latest after lease_seconds, then it can be taken
+                self.logger.warning("Timed out waiting for another worker to fetch key %s. Waiting for the lease", key)
+                deadline = None
+            time.sleep(self.poll_interval_seconds)
+
+
+def _lease_name(key):
+    return "lease:{}".format(key)
@@ -0,0 +1,117 @@
+"""This module encodes standings to bytes and back, for storing them in Redis and MongoDB """
+import json
+import pickle
+import struct
+import zlib
+
+from backend.standings.domain.response.standings import Standings
+
+# Every encoding starts with the magic bytes, then the version of the schema and the flags. Pickles start with the
+# PROTO opcode (0x80), so they cannot be mistaken for an encoding
+MAGIC = b"N8"
+VERSION = 3
+HEADER_SIZE = len(MAGIC) + 2
+
+# Length of the JSON response that comes first in version 2 bodies, after the digest in version 3 bodies
+_JSON_LENGTH = struct.Struct(">I")
+DIGEST_SIZE = 16
+
+FLAG_ZLIB = 0x01
+
+_PICKLE_PROTO = 0x80
+
+
+class CodecError(ValueError):
+    def __init__(self, message):
+        super(CodecError, self).__init__(message)
+
+
+class CompactCodec:
+    """ Encodes standings by position rather than by name: every standing is a flat array of its values, in the order
+    of the schema version, so that no field names and no class names end up in the encoding. The body is compact JSON,
+    which is encoded and decoded in C, optionally compressed with zlib.
+
+    The compact JSON response and the digest of the standings are stored alongside them, so that standings read from
+    storage can be served and compared without being encoded or hashed again.
+
+    Layout: MAGIC | version (1 byte) | flags (1 byte) | body
+    Body (version 1): rows
+    Body (version 2): length of response (4 bytes, big endian) | response | rows
+    Body (version 3): digest (16 bytes) | length of response (4 bytes, big endian) | response | rows
+    Rows: [fetched_at, [[rank, team_id, team_name, team_logo, team_homepage, points, group, form, record_type, played,
+          wins, draws, loses, goals_for, goals_against], ...]]
+    """
+
+    def __init__(self, compress=True, compression_level=6, allow_pickle=True):
+        """
+            :param compress Whether to compress the body with zlib
+            :param compression_level zlib compression level, from 1 (fastest) to 9 (smallest)
+            :param allow_pickle Whether standings pickled before this codec was introduced can still be decoded
+        """
+        self.compress = compress
+        self.compression_level = compression_level
+        self.allow_pickle = allow_pickle
+
+    def encode(self, standings: Standings) -> bytes:
+        rows = standings.get_rows()
+        response = standings.as_json_bytes()
+        body = (bytes.fromhex(standings.get_digest()) + _JSON_LENGTH.pack(len(response)) + response +
+                json.dumps([standings.get_fetched_at(), rows], separators=(",", ":")).encode())
+        flags = 0
+        if self.compress:
+            body = zlib.compress(body, self.compression_level)
+            flags |= FLAG_ZLIB
+        return MAGIC + bytes([VERSION, flags]) + body
+
+    def decode(self, data: bytes) -> Standings:
+        """ Decodes standings encoded by any version of this codec, or pickled if allowed
+
+            :raises CodecError if the data is not an encoding of standings that can be decoded
+        """
+        data = bytes(data)
+        if data[:len(MAGIC)] != MAGIC:
+            if self.allow_pickle and data[:1] == bytes([_PICKLE_PROTO]):
+                return pickle.loads(data)
+            raise CodecError("Data is not encoded standings")
+
+        version, flags = data[len(MAGIC)], data[len(MAGIC) + 1]
+        if version not in (1, 2, VERSION):
+            raise CodecError("Unsupported encoding version: {}".format(version))
+        body = data[HEADER_SIZE:]
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+
+        digest = None
+        if version >= 3:
+            digest = body[:DIGEST_SIZE].hex()
+            body = body[DIGEST_SIZE:]
+        response = None
+        if version >= 2:
+            response_length, = _JSON_LENGTH.unpack_from(body)
+            response = body[_JSON_LENGTH.size:_JSON_LENGTH.size + response_length]
+            body = body[_JSON_LENGTH.size + response_length:]
+
+        fetched_at, rows = json.loads(body)
+        standings = Standings.from_rows(rows, fetched_at)
+        if response is not None:
+            standings.set_json_bytes(response)
+        if digest is not None:
+            standings.set_digest(digest)
+        return standings
+
+
+class PickleCodec:
+    """ Pickles the whole standings object graph. This is how standings used to be stored """
+
+    def encode(self, standings: Standings) -> bytes:
+        return pickle.dumps(standings)
+
+    def decode(self, data: bytes) -> Standings:
+        return pickle.loads(data)
+
+
+def codec_provider(codec_config: dict):
+    """ Builds the codec from config of the form {"compress": true, "compressionLevel": 6, "allowPickle": true} """
+    return CompactCodec(compress=codec_config.get('compress', True),
+                        compression_level=codec_config.get('compressionLevel', 6),
+                        allow_pickle=codec_config.get('allowPickle', True))
@@ -0,0 +1,79 @@
+"""This module decides how long stored standings can be served before they have to be refreshed """
+import datetime
+import time
+
+
+class FreshnessPolicy:
+    """ Standings older than `soft_ttl_seconds` are stale: they are still served, but trigger a refresh. Standings older
+    than `hard_ttl_seconds` have expired and are not served anymore. A None ttl means never. """
+
+    def __init__(self, soft_ttl_seconds=None, hard_ttl_seconds=None):
+        self.soft_ttl_seconds = soft_ttl_seconds
+        self.hard_ttl_seconds = hard_ttl_seconds
+
+    def is_stale(self, fetched_at, now=None):
+        return _is_older_than(fetched_at, self.soft_ttl_seconds, now)
+
+    def is_expired(self, fetched_at, now=None):
+        return _is_older_than(fetched_at, self.hard_ttl_seconds, now)
+
+    @staticmethod
+    def from_config(policy_config: dict):
+        return FreshnessPolicy(soft_ttl_seconds=policy_config.get('softSeconds'),
+                               hard_ttl_seconds=policy_config.get('hardSeconds'))
+
+
+def _is_older_than(fetched_at, ttl_seconds, now):
+    if ttl_seconds is None:
+        return False
+    now = time.time() if now is None else now
+    return now - fetched_at > ttl_seconds
+
+
+NEVER_EXPIRES = FreshnessPolicy()
+
+
+class SeasonFreshnessPolicies:
+    """ Picks the :func:`FreshnessPolicy` for a key. Live seasons are refreshed often while finished seasons never
+    change, and every league can override both policies. A season is live until the end of the year after the one it
+    started in, since football seasons run across two calendar years. """
+
+    def __init__(self, live=FreshnessPolicy(soft_ttl_seconds=300, hard_ttl_seconds=86400), finished=NEVER_EXPIRES,
+                 per_league=None):
+        self.live = live
+        self.finished = finished
+        self.per_league = per_league if per_league is not None else {}
+
+    def __call__(self, key):
+        live, finished = self.per_league.get(key.alias, (self.live, self.finished))
+        return live if is_live_season(key.season) else finished
+
+    @staticmethod
+    def from_config(freshness_config: dict):
+        """ Builds the policies from config of the form
+            {"live": {"softSeconds": 300, "hardSeconds": 86400}, "finished": {}, "leagues": {"epl": {"live": {...}}}}
+        """
+        defaults = SeasonFreshnessPolicies()
+        live = _policy_from_config(freshness_config, 'live', defaults.live)
+        finished = _policy_from_config(freshness_config, 'finished', defaults.finished)
+        per_league = {}
+        for alias, league_config in freshness_config.get('leagues', {}).items():
+            per_league[alias] = (_policy_from_config(league_config, 'live', live),
+                                 _policy_from_config(league_config, 'finished', finished))
+        return SeasonFreshnessPolicies(live, finished, per_league)
+
+
+def _policy_from_config(config: dict, policy_type: str, default: FreshnessPolicy):
+    policy_config = config.get(policy_type)
+    return default if policy_config is None else FreshnessPolicy.from_config(policy_config)
+
+
+def is_live_season(season, today=None):
+    today = datetime.date.today() if today is None else today
+    return int(season) >= today.year - 1
+
+
+def live_seasons(today=None):
+    """ Returns the seasons that can still be played, the latest one last """
+    today = datetime.date.today() if today is None else today
+    return [today.year - 1, today.year]
@@ -1,43 +1,131 @@
-import pickle
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from bson import CodecOptions
 from bson.binary import Binary
 from bson.binary import USER_DEFINED_SUBTYPE
 from bson.codec_options import TypeDecoder
 from bson.codec_options import TypeRegistry
 from datetime import timedelta
+from pymongo import ASCENDING
+from pymongo import DESCENDING
 from pymongo import MongoClient
+from pymongo import ReturnDocument
+from pymongo import UpdateOne
+from redis import ConnectionPool
 from redis import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
 
+from backend.standings.common import SAMPLED
 from backend.standings.common import equality_tester
 from backend.standings.common import logger_factory
+from backend.standings.domain import metrics
 from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.storage.codec import CompactCodec
 
 
-def fallback_pickle_encoder(value):
-    return Binary(pickle.dumps(value), USER_DEFINED_SUBTYPE)
+# Deletes the lease only if it's still held by the releasing token, so an expired lease taken over by another worker
+# is not released by mistake
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
 
+# Token bucket for rate limiting, shared by the workers. The bucket refills with time and is empty while blocked.
+# Returns the number of seconds to wait for a token, 0 if one was taken. Numbers are returned as strings, since Redis
+# truncates Lua numbers to integers
+_TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_second = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'updated_at', 'blocked_until')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+local blocked_until = tonumber(bucket[3]) or 0
+if now < blocked_until then
+    return tostring(blocked_until - now)
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_per_second)
+local wait_seconds = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait_seconds = (1 - tokens) / refill_per_second
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('expire', KEYS[1], math.ceil(capacity / refill_per_second) + 3600)
+return tostring(wait_seconds)
+"""
 
-def to_binary(standings: Standings):
-    return Binary(pickle.dumps(standings), USER_DEFINED_SUBTYPE)
 
+DEFAULT_CODEC = CompactCodec()
 
-def from_binary(binary):
-    return pickle.loads(binary)
+# Tells storage that the caller did not read the standings stored for a key before storing new ones
+NOT_READ = object()
 
 
-class PickledBinaryDecoder(TypeDecoder):
+def to_binary(standings: Standings, codec=DEFAULT_CODEC):
+    return Binary(codec.encode(standings), USER_DEFINED_SUBTYPE)
+
+
+def from_binary(binary, codec=DEFAULT_CODEC):
+    return codec.decode(binary)
+
+
+class StandingsBinaryDecoder(TypeDecoder):
+    """ Decodes the standings stored in MongoDB, including the ones pickled before the codec was introduced """
     bson_type = Binary
 
+    def __init__(self, codec=DEFAULT_CODEC):
+        self.codec = codec
+
     def transform_bson(self, value):
         if value.subtype == USER_DEFINED_SUBTYPE:
-            return pickle.loads(value)
+            return self.codec.decode(value)
         return value
 
 
+INVALIDATION_CHANNEL = "standings:invalidations"
+
+# Errors on Redis commands that mean Redis cannot be reached, as opposed to the command itself failing
+_REDIS_UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError)
+
+# Identifies this worker in invalidation messages, so that it can ignore its own
+_WORKER_ID = "{}-{}".format(os.getpid(), uuid.uuid4().hex[:8])
+
+
+def _invalidation_message(key):
+    return "{}:{}".format(_WORKER_ID, key)
+
+
+def change_version(standings: Standings):
+    """ Returns the version that standings get in the change log: the time in milliseconds at which they were fetched.
+    Standings are only logged when they changed, so the version of unchanged standings fetched again is the one of the
+    fetch that changed them """
+    return int(standings.get_fetched_at() * 1000)
+
+
+def _change_versions_name(key):
+    return "changes:{}".format(key)
+
+
+def _change_rows_name(key, version):
+    return "changes:{}:{}".format(key, version)
+
+
 class Key:
     """ Holds storage key """
 
     def __init__(self, alias, season):
+        self.alias = alias
+        self.season = str(season)
         self.key = "{0}_{1}".format(alias, season)
 
     def __eq__(self, other):
@@ -49,27 +137,183 @@ class Key:
     def __str__(self):
         return self.key
 
+    @staticmethod
+    def parse(key: str):
+        """ Builds the key back from its string form, e.g. 'epl_2020' """
+        alias, _, season = key.rpartition("_")
+        return Key(alias, season)
+
+
+class LocalCache:
+    """ This is a per worker, in process cache in front of Redis. Entries are evicted least recently used first once
+    all entries take more than `max_bytes` of memory, and are dropped `ttl_seconds` after being put. An entry counts
+    everything the standings keep, see :func:`Standings.memory_size`, and is counted again every time the standings
+    keep more, e.g. the gzip encoding the first time it's served.
+    Standings keep their JSON encoding, so a hit serves the response without going to Redis or encoding anything.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl_seconds=30):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.logger = logger_factory(LocalCache.__name__)
+
+    def get(self, key: Key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.record_lookups(metrics.LOCAL_CACHE, hits=0, misses=1)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.record_lookups(metrics.LOCAL_CACHE, hits=1, misses=0)
+            return entry[0]
+
+    def put(self, key: Key, standings: Standings):
+        # Listening before counting, so that whatever the standings keep from now on is counted
+        standings.listen_to_growth(lambda: self._count_again(key, standings))
+        with self._lock:
+            size = standings.memory_size()
+            if size > self.max_bytes:
+                self.logger.warning("Standings for key %s are too big for the local cache: %s bytes", key, size)
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (standings, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            self._evict_over_budget()
+
+    def _count_again(self, key: Key, standings: Standings):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not standings:
+                return
+            size = standings.memory_size()
+            self._entries[key] = (standings, size, entry[2])
+            self._bytes += size - entry[1]
+            self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, key: Key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.logger.debug("Invalidated key %s in local cache", key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+class RedisHealth:
+    """ Tracks whether Redis can be reached from the outcome of the commands sent to it, instead of pinging it. After a
+    connection error Redis is skipped for a backoff window, which doubles with every failed attempt up to
+    `max_backoff_seconds`. The first command after the window is the probe that tells whether Redis is back. """
+
+    def __init__(self, backoff_seconds=1, max_backoff_seconds=30):
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        return self._failures == 0 or time.monotonic() >= self._retry_at
+
+    def seconds_until_retry(self):
+        """ Returns the number of seconds left in the backoff window, 0 if Redis is not being bypassed """
+        return 0.0 if self._failures == 0 else max(0.0, self._retry_at - time.monotonic())
+
+    def record_success(self):
+        if self._failures != 0:
+            with self._lock:
+                self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            backoff = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** self._failures))
+            self._failures += 1
+            self._retry_at = time.monotonic() + backoff
+            return backoff
+
 
 class RedisCache:
     """ This class sets up a connection to a Redis server and puts and retrieves data from the cache """
 
-    def __init__(self, host="localhost", port=6379, db=0, time_to_live_hours=24):
-        self.redis_client = Redis(host=host, port=port, db=db)
-        self._flush()
+    def __init__(self, host="localhost", port=6379, db=0, time_to_live_hours=24, max_connections=50,
+                 socket_timeout_seconds=1, redis_client=None, health: RedisHealth = None, codec=DEFAULT_CODEC,
+                 change_log_length=20):
+        """
+            :param change_log_length Number of versions of the standings of a key kept in its change log
+        """
+        if redis_client is None:
+            pool = ConnectionPool(host=host, port=port, db=db, max_connections=max_connections,
+                                  socket_timeout=socket_timeout_seconds,
+                                  socket_connect_timeout=socket_timeout_seconds)
+            redis_client = Redis(connection_pool=pool)
+        self.redis_client = redis_client
+        self.health = health if health is not None else RedisHealth()
+        self.codec = codec
         self.ttl = timedelta(hours=time_to_live_hours)
+        self.change_log_length = change_log_length
         self.logger = logger_factory(RedisCache.__name__)
 
         self.logger.info("Initialised Redis Cache on: %s:%s", host, port)
 
-    def _flush(self):
+    def flush(self):
+        """ Removes everything from the cache, for all the workers sharing it. This is an admin operation """
         self.redis_client.flushdb()
+        self.logger.warning("Flushed Redis Cache")
 
-    def put(self, key: Key, standings: Standings):
+    def put(self, key: Key, standings: Standings, publish_invalidation=False, record_change=False):
+        """ Puts the standings for a key in the cache
+
+            :param publish_invalidation Whether to tell the other workers that the standings changed, in the same
+            pipelined round trip as the write
+            :param record_change Whether to add the standings to the change log of the key, in the same round trip
+        """
         if self._is_available():
             try:
                 key = key.__str__()
-                self.redis_client.set(name=key, value=to_binary(standings), ex=self.ttl)
+                encoded = self.codec.encode(standings)
+                metrics.record_round_trip(metrics.REDIS)
+                if publish_invalidation or record_change:
+                    pipeline = self.redis_client.pipeline(transaction=False)
+                    pipeline.set(name=key, value=encoded, ex=self.ttl)
+                    if record_change:
+                        self._queue_change(pipeline, key, standings)
+                    if publish_invalidation:
+                        pipeline.publish(INVALIDATION_CHANNEL, _invalidation_message(key))
+                    pipeline.execute()
+                else:
+                    self.redis_client.set(name=key, value=encoded, ex=self.ttl)
+                self.health.record_success()
                 self.logger.debug("Inserted %s for key %s", standings, key)
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
             except Exception as e:
                 self.logger.error("Could not insert %s for key %s. Error message: %s", standings, key, e.__str__())
                 raise Exception("Could not insert {} for key {}. Error message: %s".format(standings, key, e.__str__()))
@@ -78,14 +322,21 @@ class RedisCache:
         if self._is_available():
             try:
                 key = key.__str__()
-                standings = self.redis_client.get(key)
+                metrics.record_round_trip(metrics.REDIS)
+                with metrics.stage_timer(metrics.REDIS_LOOKUP):
+                    standings = self.redis_client.get(key)
+                self.health.record_success()
+                metrics.record_lookups(metrics.REDIS, hits=int(standings is not None), misses=int(standings is None))
                 if standings is not None:
-                    from_redis = from_binary(standings)
+                    from_redis = self.codec.decode(standings)
                     self.logger.debug("Retrieved %s for key %s from Redis Cache", from_redis, key)
                     return from_redis
                 else:
                     self.logger.debug("Standings for key %s not in Redis Cache", key)
                     return standings
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+                return None
             except Exception as e:
                 self.logger.error("Could not retrieve standings for key %s from Redis Cache. Error message: %s",
                                   key, e.__str__())
@@ -94,51 +345,441 @@ class RedisCache:
         else:
             return None
 
+    def get_many(self, keys):
+        """ Returns a dictionary of Standings per key, for the keys found in the cache, with a single MGET """
+        if not self._is_available() or len(keys) == 0:
+            return {}
+        try:
+            metrics.record_round_trip(metrics.REDIS)
+            with metrics.stage_timer(metrics.REDIS_LOOKUP):
+                values = self.redis_client.mget([key.__str__() for key in keys])
+            self.health.record_success()
+            found = {key: self.codec.decode(value) for key, value in zip(keys, values) if value is not None}
+            metrics.record_lookups(metrics.REDIS, hits=len(found), misses=len(keys) - len(found))
+            self.logger.debug("Retrieved standings for %s of %s keys from Redis Cache", len(found), len(keys))
+            return found
+        except _REDIS_UNAVAILABLE_ERRORS as e:
+            self._record_failure(e)
+            return {}
+        except Exception as e:
+            self.logger.error("Could not retrieve standings for keys %s from Redis Cache. Error message: %s",
+                              [key.__str__() for key in keys], e.__str__())
+            raise Exception("Could not retrieve standings for keys {} from Redis Cache. Error message: {}"
+                            .format([key.__str__() for key in keys], e.__str__()))
+
+    def put_many(self, standings_per_key: dict):
+        """ Puts the Standings for many keys in the cache, in a single pipelined round trip """
+        if not self._is_available() or len(standings_per_key) == 0:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, standings in standings_per_key.items():
+                pipeline.set(name=key.__str__(), value=self.codec.encode(standings), ex=self.ttl)
+            metrics.record_round_trip(metrics.REDIS)
+            pipeline.execute()
+            self.health.record_success()
+            self.logger.debug("Inserted standings for %s keys", len(standings_per_key))
+        except _REDIS_UNAVAILABLE_ERRORS as e:
+            self._record_failure(e)
+        except Exception as e:
+            keys = [key.__str__() for key in standings_per_key]
+            self.logger.error("Could not insert standings for keys %s. Error message: %s", keys, e.__str__())
+            raise Exception("Could not insert standings for keys {}. Error message: {}".format(keys, e.__str__()))
+
+    def record_change(self, key: Key, standings: Standings):
+        """ Adds the standings to the change log of the key, for keys whose log is empty """
+        if self._is_available():
+            try:
+                pipeline = self.redis_client.pipeline(transaction=False)
+                self._queue_change(pipeline, key.__str__(), standings)
+                metrics.record_round_trip(metrics.REDIS)
+                pipeline.execute()
+                self.health.record_success()
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+            except Exception as e:
+                self.logger.error("Could not record change for key %s. Error message: %s", key, e.__str__())
+
+    def _queue_change(self, pipeline, key: str, standings: Standings):
+        """ Queues the commands that add the standings to the change log of the key. The log is a sorted set of the
+        versions, holding the latest `change_log_length` of them, and the rows of the standings of every version are
+        kept next to it, until they expire """
+        version = change_version(standings)
+        versions_name = _change_versions_name(key)
+        pipeline.set(name=_change_rows_name(key, version), value=json.dumps(standings.get_rows(),
+                                                                            separators=(",", ":")), ex=self.ttl)
+        pipeline.zadd(versions_name, {str(version): version})
+        pipeline.zremrangebyrank(versions_name, 0, -(self.change_log_length + 1))
+        pipeline.expire(versions_name, self.ttl)
+
+    def get_change_versions(self, key: Key, since: int):
+        """ Returns the latest version in the change log of the key, and whether a given version is in it, with one
+        pipelined round trip
+
+            :returns Tuple of the latest version, None if the log is empty or Redis is not available, and a bool
+        """
+        if not self._is_available():
+            return None, False
+        try:
+            versions_name = _change_versions_name(key.__str__())
+            pipeline = self.redis_client.pipeline(transaction=False)
+            pipeline.zrevrange(versions_name, 0, 0)
+            pipeline.zscore(versions_name, str(since))
+            metrics.record_round_trip(metrics.REDIS)
+            latest, since_score = pipeline.execute()
+            self.health.record_success()
+            return (int(latest[0]) if latest else None), since_score is not None
+        except _REDIS_UNAVAILABLE_ERRORS as e:
+            self._record_failure(e)
+            return None, False
+        except Exception as e:
+            self.logger.error("Could not read change log for key %s. Error message: %s", key, e.__str__())
+            raise Exception("Could not read change log for key {}. Error message: {}".format(key, e.__str__()))
+
+    def get_change_rows(self, key: Key, versions):
+        """ Returns the rows of the standings of the given versions in the change log of the key, with a single MGET
+
+            :returns List of the rows of every version, None for the versions whose rows are not kept anymore
+        """
+        if not self._is_available():
+            return [None] * len(versions)
+        try:
+            metrics.record_round_trip(metrics.REDIS)
+            values = self.redis_client.mget([_change_rows_name(key.__str__(), version) for version in versions])
+            self.health.record_success()
+            return [json.loads(value) if value is not None else None for value in values]
+        except _REDIS_UNAVAILABLE_ERRORS as e:
+            self._record_failure(e)
+            return [None] * len(versions)
+        except Exception as e:
+            self.logger.error("Could not read change log for key %s. Error message: %s", key, e.__str__())
+            raise Exception("Could not read change log for key {}. Error message: {}".format(key, e.__str__()))
+
+    def acquire_lease(self, name: str, token: str, lease_seconds: int):
+        """ Tries to take a lease that expires after the given seconds. If Redis is not available the lease is
+        granted, so that the caller can go ahead without coordinating with the other workers.
+
+            :returns True if the lease was taken by the caller, False if someone else holds it
+        """
+        if self._is_available():
+            try:
+                metrics.record_round_trip(metrics.REDIS)
+                acquired = bool(self.redis_client.set(name=name, value=token, nx=True, ex=lease_seconds))
+                self.health.record_success()
+                return acquired
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+            except Exception as e:
+                self.logger.error("Could not acquire lease %s. Error message: %s", name, e.__str__())
+        return True
+
+    def release_lease(self, name: str, token: str):
+        """ Releases a lease, but only if it's still held by the given token """
+        if self._is_available():
+            try:
+                metrics.record_round_trip(metrics.REDIS)
+                self.redis_client.eval(_RELEASE_LEASE_SCRIPT, 1, name, token)
+                self.health.record_success()
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+            except Exception as e:
+                self.logger.error("Could not release lease %s. Error message: %s", name, e.__str__())
+
+    def publish_invalidation(self, key: Key):
+        """ Tells the other workers that the standings for a key changed, so they drop them from their local caches """
+        if self._is_available():
+            try:
+                metrics.record_round_trip(metrics.REDIS)
+                self.redis_client.publish(INVALIDATION_CHANNEL, _invalidation_message(key))
+                self.health.record_success()
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+            except Exception as e:
+                self.logger.error("Could not publish invalidation for key %s. Error message: %s", key, e.__str__())
+
+    def publish_invalidations(self, keys):
+        """ Tells the other workers that the standings for many keys changed, in a single pipelined round trip """
+        if self._is_available() and len(keys) > 0:
+            try:
+                pipeline = self.redis_client.pipeline(transaction=False)
+                for key in keys:
+                    pipeline.publish(INVALIDATION_CHANNEL, _invalidation_message(key))
+                metrics.record_round_trip(metrics.REDIS)
+                pipeline.execute()
+                self.health.record_success()
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+            except Exception as e:
+                keys = [key.__str__() for key in keys]
+                self.logger.error("Could not publish invalidations for keys %s. Error message: %s", keys, e.__str__())
+
+    def take_token(self, name: str, capacity: float, refill_per_second: float, now: float):
+        """ Takes a token from a rate limiting token bucket shared by all the workers
+
+            :returns Number of seconds to wait for a token, 0 if one was taken, or None if Redis is not available
+        """
+        return self._quota_operation("take token from {}".format(name), lambda: float(
+            self.redis_client.eval(_TAKE_TOKEN_SCRIPT, 1, name, capacity, refill_per_second, now)))
+
+    def block_token_bucket(self, name: str, until: float):
+        """ Empties a token bucket until the given time """
+        def block():
+            self.redis_client.hset(name, "blocked_until", until)
+            return True
+        return self._quota_operation("block {}".format(name), block)
+
+    def count_calls(self, counters: dict):
+        """ Increments counters, each kept for the given number of seconds, in a single round trip
+
+            :param counters Number of seconds to keep each counter for, per counter name
+            :returns The counts, or None if Redis is not available
+        """
+        def count():
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for name, ttl_seconds in counters.items():
+                pipeline.incr(name)
+                pipeline.expire(name, ttl_seconds)
+            return pipeline.execute()[::2]
+        return self._quota_operation("count calls", count)
+
+    def get_counts(self, names):
+        """ Returns the counts of the given counters, 0 for those that do not exist, or None if Redis is not available
+        """
+        return self._quota_operation("get counts", lambda: [
+            int(count) if count is not None else 0 for count in self.redis_client.mget(names)])
+
+    def set_quota_state(self, name: str, state: dict, ttl_seconds: int):
+        def set_state():
+            pipeline = self.redis_client.pipeline(transaction=False)
+            pipeline.hset(name, mapping=state)
+            pipeline.expire(name, ttl_seconds)
+            pipeline.execute()
+            return True
+        return self._quota_operation("set {}".format(name), set_state)
+
+    def get_quota_state(self, name: str):
+        return self._quota_operation("get {}".format(name), lambda: {
+            field.decode(): value.decode() for field, value in self.redis_client.hgetall(name).items()})
+
+    def _quota_operation(self, description: str, operation):
+        """ Runs an operation for the upstream quota. Failures are logged rather than raised, since the quota falls
+        back to the accounting of this worker
+
+            :returns The result of the operation, or None if it could not be run
+        """
+        if self._is_available():
+            try:
+                metrics.record_round_trip(metrics.REDIS)
+                result = operation()
+                self.health.record_success()
+                return result
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                self._record_failure(e)
+            except Exception as e:
+                self.logger.error("Could not %s. Error message: %s", description, e.__str__())
+        return None
+
+    def subscribe_to_invalidations(self, local_cache: LocalCache, stop: threading.Event = None):
+        """ Invalidates keys in the local cache when other workers publish that they changed. When Redis cannot be
+        reached, at start up or later on, the subscription is made again once the backoff window of the health is over.
+        Invalidations published in the meantime are lost, so the local cache is emptied when the subscription is back
+
+            :param stop Event that stops listening for invalidations once set
+            :returns The thread that listens for invalidations
+        """
+        stop = stop if stop is not None else threading.Event()
+        listener = threading.Thread(target=self._listen_for_invalidations, args=(local_cache, stop),
+                                    name="standings-invalidations", daemon=True)
+        listener.start()
+        return listener
+
+    def _listen_for_invalidations(self, local_cache: LocalCache, stop: threading.Event):
+        missed = False
+        while not stop.is_set():
+            if not self._is_available():
+                missed = True
+                stop.wait(self.health.seconds_until_retry())
+                continue
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                self.health.record_success()
+                if missed:
+                    local_cache.clear()
+                    missed = False
+                self.logger.info("Subscribed to invalidations on channel %s", INVALIDATION_CHANNEL)
+                while not stop.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None:
+                        self._invalidate(local_cache, message)
+            except _REDIS_UNAVAILABLE_ERRORS as e:
+                missed = True
+                self._record_failure(e)
+            except Exception as e:
+                missed = True
+                self.logger.error("Stopped listening for invalidations. Error message: %s", e.__str__())
+                stop.wait(self.health.max_backoff_seconds)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _invalidate(self, local_cache: LocalCache, message):
+        try:
+            worker_id, _, key = message['data'].decode().partition(":")
+            if worker_id != _WORKER_ID:
+                local_cache.invalidate(Key.parse(key))
+        except Exception as e:
+            self.logger.error("Could not handle invalidation %s. Error message: %s", message, e.__str__())
+
     def _is_available(self):
         """ Checks whether the redis client is available. To avoid connection refused exceptions, this allows to
         bypass redis if it's not available. """
-        try:
-            return self.redis_client.ping()
-        except Exception as e:
-            self.logger.warn("%s", e.__str__())
-            return False
+        return self.health.is_available()
+
+    def _record_failure(self, error):
+        backoff = self.health.record_failure()
+        self.logger.warning("Redis is not available, bypassing it for %s second(s). Error message: %s",
+                            backoff, error.__str__())
 
 
 class MongoDB:
-    """ This class creates a connection to a mongodb server and makes it possible to write and put data to the db"""
+    """ This class creates a connection to a mongodb server and makes it possible to write and put data to the db.
+
+    There is one document per key, of the form {"key": "epl_2020", "league": "epl", "season": "2020", "digest": ...,
+    "standings": ...}
+    """
+
+    KEY_INDEX = "key_unique"
+    LEAGUE_SEASON_INDEX = "league_season"
 
     def __init__(self, host="localhost", port=27017, username="admin", password="pass", admin_db="admin",
-                 database_name="standings", collection_name="static_standings"):
+                 database_name="standings", collection_name="static_standings", collection=None,
+                 bootstrap_indexes=True, codec=DEFAULT_CODEC):
         """ Sets up a connection to mongodb """
+        self.logger = logger_factory(MongoDB.__name__)
+        self.codec = codec
 
-        mongo_client = MongoClient("mongodb://{}:{}@{}:{}/?authSource={}&authMechanism=SCRAM-SHA-1"
-                                   .format(username, password, host, port, admin_db))
+        if collection is None:
+            mongo_client = MongoClient("mongodb://{}:{}@{}:{}/?authSource={}&authMechanism=SCRAM-SHA-1"
+                                       .format(username, password, host, port, admin_db))
 
-        codec_options = CodecOptions(type_registry=TypeRegistry(
-            [PickledBinaryDecoder()], fallback_encoder=fallback_pickle_encoder))
+            codec_options = CodecOptions(type_registry=TypeRegistry([StandingsBinaryDecoder(codec)]))
 
-        database = mongo_client[database_name]
+            database = mongo_client[database_name]
 
-        self.collection = database.get_collection(collection_name, codec_options=codec_options)
+            collection = database.get_collection(collection_name, codec_options=codec_options)
+        self.collection = collection
+        if bootstrap_indexes:
+            self._bootstrap_indexes()
 
-        self.logger = logger_factory(MongoDB.__name__)
         self.logger.info("Initialised MongoDB connection on: %s:%s", host, port)
 
-    def write(self, key: Key, standings: Standings):
+    def _bootstrap_indexes(self):
+        """ Creates the indexes if they don't exist yet. Creating an index that exists is a no-op """
         try:
-            entry = {"key": key.__str__(), "standings": standings}
-            self.collection.create_index(key.__str__())
-            result = self.collection.insert_one(entry)
-            self.logger.debug("ID - %s: Inserted %s for key %s", result.inserted_id, standings, key)
+            self.collection.create_index("key", name=MongoDB.KEY_INDEX, unique=True)
+            self.collection.create_index([("league", ASCENDING), ("season", ASCENDING)],
+                                         name=MongoDB.LEAGUE_SEASON_INDEX)
+        except Exception as e:
+            self.logger.error("Could not create indexes. Duplicate keys might have to be removed with "
+                              "'python admin.py migrate-mongo'. Error message: %s", e.__str__())
+
+    def write(self, key: Key, standings: Standings, return_previous_digest=False):
+        """ Inserts the standings for a key, or replaces them if the key is already stored, in a single round trip
+
+            :param return_previous_digest Whether to return the digest of the standings that were replaced, which
+            comes back with the upsert
+            :returns The digest of the replaced standings if asked for, or None if there were none or it was not
+            stored with them
+        """
+        try:
+            entry = {"key": key.__str__(), "league": key.alias, "season": key.season,
+                     "digest": standings.get_digest(), "standings": to_binary(standings, self.codec)}
+            metrics.record_round_trip(metrics.MONGO)
+            if not return_previous_digest:
+                result = self.collection.update_one({"key": key.__str__()}, {"$set": entry}, upsert=True)
+                self.logger.debug("ID - %s: Upserted %s for key %s", result.upserted_id, standings, key)
+                return None
+            previous = self.collection.find_one_and_update({"key": key.__str__()}, {"$set": entry},
+                                                           projection={"digest": True, "_id": False}, upsert=True,
+                                                           return_document=ReturnDocument.BEFORE)
+            self.logger.debug("Upserted %s for key %s", standings, key)
+            return previous.get("digest") if previous is not None else None
         except Exception as e:
             self.logger.error("Could not insert %s for key %s. Error message: %s", standings, key, e.__str__())
             raise Exception("Could not insert {} for key {}. Error message: {}".format(standings, key, e.__str__()))
 
+    def write_many(self, standings_per_key: dict):
+        """ Inserts the standings for many keys, or replaces them for the keys already stored, with a single unordered
+        bulk write of upserts """
+        if len(standings_per_key) == 0:
+            return
+        try:
+            operations = [UpdateOne({"key": key.__str__()},
+                                    {"$set": {"key": key.__str__(), "league": key.alias, "season": key.season,
+                                              "digest": standings.get_digest(),
+                                              "standings": to_binary(standings, self.codec)}}, upsert=True)
+                          for key, standings in standings_per_key.items()]
+            metrics.record_round_trip(metrics.MONGO)
+            result = self.collection.bulk_write(operations, ordered=False)
+            self.logger.debug("Upserted standings for %s keys: %s inserted, %s replaced", len(operations),
+                              result.upserted_count, result.modified_count)
+        except Exception as e:
+            keys = [key.__str__() for key in standings_per_key]
+            self.logger.error("Could not insert standings for keys %s. Error message: %s", keys, e.__str__())
+            raise Exception("Could not insert standings for keys {}. Error message: {}".format(keys, e.__str__()))
+
+    def migrate(self):
+        """ Migrates the collection from the schema that had one index per key name and possibly many documents per
+        key: drops the per key indexes, keeps only the latest document of every key and adds the league and season
+        fields to documents that don't have them. The indexes are created once the keys are unique.
+
+            :returns Dictionary with the number of indexes dropped, duplicates removed and documents updated
+        """
+        kept_indexes = {"_id_", MongoDB.KEY_INDEX, MongoDB.LEAGUE_SEASON_INDEX}
+        dropped_indexes = 0
+        for name in list(self.collection.index_information()):
+            if name not in kept_indexes:
+                self.collection.drop_index(name)
+                dropped_indexes += 1
+                self.logger.info("Dropped index %s", name)
+
+        removed_duplicates = 0
+        duplicates = self.collection.aggregate([
+            {"$sort": {"_id": DESCENDING}},
+            {"$group": {"_id": "$key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ])
+        for duplicate in duplicates:
+            # The ids are sorted latest first, the latest document is kept
+            result = self.collection.delete_many({"_id": {"$in": duplicate["ids"][1:]}})
+            removed_duplicates += result.deleted_count
+            self.logger.info("Removed %s duplicate(s) for key %s", result.deleted_count, duplicate["_id"])
+
+        updated_documents = 0
+        for entry in self.collection.find({"league": {"$exists": False}}, {"key": 1}):
+            key = Key.parse(entry["key"])
+            self.collection.update_one({"_id": entry["_id"]}, {"$set": {"league": key.alias, "season": key.season}})
+            updated_documents += 1
+
+        self._bootstrap_indexes()
+        summary = {"dropped_indexes": dropped_indexes, "removed_duplicates": removed_duplicates,
+                   "updated_documents": updated_documents}
+        self.logger.info("Migrated MongoDB collection: %s", summary)
+        return summary
+
     def read(self, key: Key):
         """ Returns Standings if found in database for key, else None"""
         try:
             query = {"key": key.__str__()}
-            standings = self.collection.find_one(query)
+            metrics.record_round_trip(metrics.MONGO)
+            with metrics.stage_timer(metrics.MONGO_READ):
+                standings = self.collection.find_one(query)
+            metrics.record_lookups(metrics.MONGO, hits=int(standings is not None), misses=int(standings is None))
             if standings is not None:
                 standings = standings[Standings.mongo_key()]
                 self.logger.debug("Retrieved %s for key %s from MongoDB", standings, key)
@@ -151,17 +792,37 @@ class MongoDB:
             raise Exception("Could not retrieve standings for key {} from MongoDB. Error message: {}"
                             .format(key, e.__str__()))
 
+    def read_many(self, keys):
+        """ Returns a dictionary of Standings per key, for the keys found in the database, with a single query """
+        try:
+            keys_by_name = {key.__str__(): key for key in keys}
+            metrics.record_round_trip(metrics.MONGO)
+            with metrics.stage_timer(metrics.MONGO_READ):
+                entries = list(self.collection.find({"key": {"$in": list(keys_by_name)}}))
+            found = {keys_by_name[entry["key"]]: entry[Standings.mongo_key()] for entry in entries}
+            metrics.record_lookups(metrics.MONGO, hits=len(found), misses=len(keys_by_name) - len(found))
+            self.logger.debug("Retrieved standings for %s of %s keys from MongoDB", len(found), len(keys_by_name))
+            return found
+        except Exception as e:
+            self.logger.error("Could not retrieve standings for keys %s from MongoDB. Error message: %s",
+                              [key.__str__() for key in keys], e.__str__())
+            raise Exception("Could not retrieve standings for keys {} from MongoDB. Error message: {}"
+                            .format([key.__str__() for key in keys], e.__str__()))
+
 
 class Database:
     def __init__(self):
         self.logger = logger_factory(Database.__name__)
         self.logger.info("Using %s database", self.__str__())
 
-    def store(self, key: Key, standings: Standings):
+    def store(self, key: Key, standings: Standings, previous=NOT_READ, invalidation_publisher=None):
         """ Stores value for key to database
 
             :param key Key for value
             :param standings Standings value to store
+            :param previous Value the caller read for the key before, None if it found none, or NOT_READ
+            :param invalidation_publisher Publisher to tell the other workers that the value for the key changed
+            :returns True if the value is new or differs from the one stored before, otherwise false
         """
         self._raise_not_implemented()
 
@@ -173,6 +834,40 @@ class Database:
         """
         self._raise_not_implemented()
 
+    def check_and_get_many(self, keys):
+        """ Checks which of the given keys have values and returns them
+
+            :param keys Keys for values
+            :returns Dictionary of Standings per key, for the keys that have values
+        """
+        found = {}
+        for key in keys:
+            exists, standings = self.check_and_get(key)
+            if exists:
+                found[key] = standings
+        return found
+
+    def store_many(self, standings_per_key: dict):
+        """ Stores the values of many keys to the database
+
+            :param standings_per_key Dictionary of Standings per key
+        """
+        for key, standings in standings_per_key.items():
+            self.store(key, standings)
+
+    def warm_up(self, keys):
+        """ Loads the values for the given keys into the fastest tier of the database
+
+            :param keys Keys to load
+            :returns Dictionary of Standings per key, for the keys that have values
+        """
+        loaded = {}
+        for key in keys:
+            exists, standings = self.check_and_get(key)
+            if exists:
+                loaded[key] = standings
+        return loaded
+
     def __str__(self):
         self._raise_not_implemented()
 
@@ -194,15 +889,18 @@ class _InMemoryDatabase(Database):
         super().__init__()
         self.database = {}
 
-    def store(self, key: Key, standings: Standings):
-        self.logger.info("Storing standings %s for %s in memory database", standings, key)
+    def store(self, key: Key, standings: Standings, previous=NOT_READ, invalidation_publisher=None):
+        self.logger.info("Storing standings for %s in memory database", key)
+        stored = self.database.get(key)
         self.database[key] = standings
+        if invalidation_publisher is not None:
+            invalidation_publisher.publish_invalidation(key)
+        return stored is None or stored != standings
 
     def check_and_get(self, key: Key):
         from_in_mem = self.database.get(key)
         exists = from_in_mem is not None
-        message = "Standings for key {} exist".format(key if exists else key.__str__() + " does not ")
-        self.logger.info(message)
+        self.logger.info("Standings for key %s %s", key, "exist" if exists else "do not exist", extra=SAMPLED)
 
         return exists, from_in_mem
 
@@ -219,24 +917,36 @@ class _RealDatabase(Database):
         self.redis_cache = redis_cache
         self.mongo_db = mongo_db
 
-    def store(self, key: Key, standings: Standings):
-        is_new_entry = self.redis_cache.get(key) is None and self.mongo_db.read(key) is None
-        if is_new_entry:
-            self.logger.info("Storing standings for %s in database and cache", key)
-            self.mongo_db.write(key, standings)
-            self.redis_cache.put(key, standings)
+    def store(self, key: Key, standings: Standings, previous=NOT_READ, invalidation_publisher=None):
+        """ Writes the standings through to the database and the cache, without reading either first: one upsert,
+        then one pipelined round trip that sets the standings in the cache and, if the publisher is the cache, tells
+        the other workers they changed.
+
+        The standings are written even when they did not change, so that both tiers hold the latest fetch time.
+        Whether they changed is told by the previous standings the caller read, or else by the digest of the replaced
+        standings that the upsert returns. Standings that changed are added to the change log of the key in the same
+        round trip as the cache """
+        if previous is NOT_READ:
+            previous_digest = self.mongo_db.write(key, standings, return_previous_digest=True)
         else:
-            from_db = self.mongo_db.read(key)
-            if from_db is not None and from_db == standings:
-                self.logger.info("Storing standings for %s in cache", key)
-                self.redis_cache.put(key, standings)
+            self.mongo_db.write(key, standings)
+            previous_digest = previous.get_digest() if previous is not None else None
+        changed = previous_digest != standings.get_digest()
+        publish_with_put = invalidation_publisher is not None and invalidation_publisher is self.redis_cache
+        self.redis_cache.put(key, standings, publish_invalidation=publish_with_put, record_change=changed)
+        if invalidation_publisher is not None and not publish_with_put:
+            invalidation_publisher.publish_invalidation(key)
+
+        self.logger.info("Stored %s standings for %s in database and cache", "changed" if changed else "unchanged",
+                         key)
+        return changed
 
     def check_and_get(self, key: Key):
         try:
             from_cache = self.redis_cache.get(key)
             in_cache = from_cache is not None
             if not in_cache:
-                self.logger.info("Standings for %s not found in cache. Checking in database", key.__str__())
+                self.logger.info("Standings for %s not found in cache. Checking in database", key, extra=SAMPLED)
                 from_db = self.mongo_db.read(key)
                 if from_db is not None:
                     self.redis_cache.put(key, from_db)
@@ -248,6 +958,37 @@ class _RealDatabase(Database):
             raise Exception("Error reading from storage for key: {}. Error message: {}"
                             .format(key.__str__(), e.__str__()))
 
+    def check_and_get_many(self, keys):
+        """ Gets the standings for all the keys from the cache with a single MGET, then the ones missing from the
+        cache from the database with a single query, which are put back in the cache with a single pipeline """
+        try:
+            found = self.redis_cache.get_many(keys)
+            missing = [key for key in keys if key not in found]
+            if len(missing) != 0:
+                self.logger.info("Standings for %s keys not found in cache. Checking in database", len(missing),
+                                 extra=SAMPLED)
+                from_db = self.mongo_db.read_many(missing)
+                self.redis_cache.put_many(from_db)
+                found.update(from_db)
+            return found
+        except Exception as e:
+            keys = [key.__str__() for key in keys]
+            self.logger.error("Error reading from storage for keys: %s. Error message: %s", keys, e.__str__())
+            raise Exception("Error reading from storage for keys: {}. Error message: {}".format(keys, e.__str__()))
+
+    def store_many(self, standings_per_key: dict):
+        """ Writes the standings for many keys through to the database and the cache, with one bulk write and one
+        pipelined round trip """
+        self.mongo_db.write_many(standings_per_key)
+        self.redis_cache.put_many(standings_per_key)
+        self.logger.info("Stored standings for %s keys in database and cache", len(standings_per_key))
+
+    def warm_up(self, keys):
+        """ Loads the standings for the given keys from the database into the cache, reading them all at once """
+        loaded = self.mongo_db.read_many(keys)
+        self.redis_cache.put_many(loaded)
+        return loaded
+
     def __str__(self):
         return "real"
 
@@ -260,13 +1001,144 @@ def database_provider(in_memory: bool, redis_cache=None, mongo_db=None) -> Datab
 
 
 class Storage:
-    """ Interface that makes it known to the caller whether the required standings are in the storage or not """
+    """ Interface that makes it known to the caller whether the required standings are in the storage or not.
+
+    When given a :func:`LocalCache`, it is checked before the database and kept up to date on store. Other workers are
+    told to drop changed standings from their local caches through the invalidation publisher (e.g. :func:`RedisCache`).
+
+    When given a freshness policy, which maps a :func:`Key` to a :func:`FreshnessPolicy`, stored standings are served
+    stale-while-revalidate: stale standings are returned straight away and refreshed in the background through the
+    refresher, while expired standings are reported as not in the storage. The refresher is given the key and the
+    stale standings, which it can pass on to :func:`Storage.store` as the previous standings.
+    """
 
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, freshness_policy=None, refresher=None, max_refresh_workers=4,
+                 local_cache: LocalCache = None, invalidation_publisher=None):
         self.database = database
+        self.local_cache = local_cache
+        self.invalidation_publisher = invalidation_publisher
+        self.freshness_policy = freshness_policy
+        self.refresher = refresher
+        self.logger = logger_factory(Storage.__name__)
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=max_refresh_workers,
+                                                    thread_name_prefix="standings-refresh")
 
-    def store(self, key: Key, standings: Standings):
-        self.database.store(key, standings)
+    def store(self, key: Key, standings: Standings, previous=NOT_READ):
+        """ Stores the standings for a key in the database and the local cache, and tells the other workers
+
+            :param previous Standings the caller read for the key before, None if it found none, or NOT_READ. Saves
+            the database from telling whether the standings changed
+            :returns True if the standings are new or differ from the ones stored before, as told by their digests
+        """
+        with metrics.stage_timer(metrics.STORAGE_WRITE):
+            changed = self.database.store(key, standings, previous=previous,
+                                          invalidation_publisher=self.invalidation_publisher)
+            if self.local_cache is not None:
+                self.local_cache.put(key, standings)
+        return changed
 
     def check_and_get(self, key: Key):
-        return self.database.check_and_get(key)
+        standings = None
+        if self.local_cache is not None:
+            with metrics.stage_timer(metrics.LOCAL_CACHE_LOOKUP):
+                standings = self.local_cache.get(key)
+        if standings is None:
+            in_storage, standings = self.database.check_and_get(key)
+            if not in_storage:
+                return in_storage, standings
+            if self.local_cache is not None:
+                self.local_cache.put(key, standings)
+        if self.freshness_policy is None or self._is_servable(key, standings):
+            return True, standings
+        return False, None
+
+    def _is_servable(self, key: Key, standings: Standings):
+        """ Checks that standings have not expired, and refreshes them in the background if they are stale """
+        policy = self.freshness_policy(key)
+        fetched_at = standings.get_fetched_at()
+        if policy.is_expired(fetched_at):
+            self.logger.info("Standings for %s have expired", key, extra=SAMPLED)
+            return False
+        if policy.is_stale(fetched_at):
+            self.logger.info("Standings for %s are stale. Serving them while refreshing", key, extra=SAMPLED)
+            self._refresh_in_background(key, standings)
+        return True
+
+    def warm_up(self, keys):
+        """ Loads the standings for the given keys into the caches, so that the first requests for them are hits. The
+        database loads them all at once, so only the start and the end of the warm up are reported
+
+            :param keys Keys to load, e.g. the most requested ones
+            :returns Number of keys that were loaded
+        """
+        start = time.monotonic()
+        self.logger.info("Warming up storage with %s keys", len(keys))
+        loaded = self.database.warm_up(keys)
+        if self.local_cache is not None:
+            for key, standings in loaded.items():
+                self.local_cache.put(key, standings)
+        self.logger.info("Warmed up storage with %s of %s keys in %.3f seconds", len(loaded), len(keys),
+                         time.monotonic() - start)
+        return len(loaded)
+
+    def store_many(self, standings_per_key: dict):
+        with metrics.stage_timer(metrics.STORAGE_WRITE):
+            self.database.store_many(standings_per_key)
+            if self.local_cache is not None:
+                for key, standings in standings_per_key.items():
+                    self.local_cache.put(key, standings)
+            if self.invalidation_publisher is not None:
+                self.invalidation_publisher.publish_invalidations(list(standings_per_key))
+
+    def check_and_get_many(self, keys):
+        """ Gets the standings for many keys at once, following the same rules as :func:`check_and_get`
+
+            :returns Dictionary of Standings per key, for the keys that are in the storage
+        """
+        found = {}
+        missing = []
+        for key in keys:
+            standings = self.local_cache.get(key) if self.local_cache is not None else None
+            if standings is None:
+                missing.append(key)
+            else:
+                found[key] = standings
+        if len(missing) != 0:
+            from_database = self.database.check_and_get_many(missing)
+            if self.local_cache is not None:
+                for key, standings in from_database.items():
+                    self.local_cache.put(key, standings)
+            found.update(from_database)
+        if self.freshness_policy is None:
+            return found
+
+        fresh_enough = {}
+        for key, standings in found.items():
+            if self._is_servable(key, standings):
+                fresh_enough[key] = standings
+        return fresh_enough
+
+    def get_last_stored(self, key: Key):
+        """ Returns the last stored standings for a key regardless of how old they are, or None """
+        return self.database.check_and_get(key)[1]
+
+    def _refresh_in_background(self, key: Key, stale: Standings):
+        if self.refresher is None:
+            return
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresh_executor.submit(self._refresh, key, stale)
+
+    def _refresh(self, key: Key, stale: Standings):
+        try:
+            self.refresher(key, stale)
+            self.logger.info("Refreshed standings for %s", key)
+        except Exception as e:
+            self.logger.error("Could not refresh standings for %s. Error message: %s", key, e.__str__())
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(key)
@@ -0,0 +1,197 @@
+"""This module is responsible for making calls to RapidAPI, the upstream source of the standings data """
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.standings.common import logger_factory
+from backend.standings.domain import metrics
+
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class UpstreamException(Exception):
+    def __init__(self, message):
+        super(UpstreamException, self).__init__(message)
+
+
+class CircuitOpenException(UpstreamException):
+    def __init__(self, message):
+        super(CircuitOpenException, self).__init__(message)
+
+
+class RetryBudget:
+    """ Limits retries to a ratio of the requests made, so that retries cannot multiply the load on an upstream that is
+    already struggling. Every request deposits `ratio` tokens and every retry withdraws one. """
+
+    def __init__(self, ratio=0.2, min_tokens=3, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """ Takes a token for a retry
+
+            :returns True if the retry is within budget, otherwise False
+        """
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """ Fails fast once the upstream has failed a number of times in a row. After `reset_seconds` a single trial call
+    is let through, which closes the circuit again if it succeeds. """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.logger = logger_factory(CircuitBreaker.__name__)
+
+    def allow(self):
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = CircuitBreaker.HALF_OPEN
+                self.logger.info("Letting a trial call through to the upstream")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CircuitBreaker.CLOSED:
+                self.logger.info("Upstream recovered. Closing circuit")
+            self._state = CircuitBreaker.CLOSED
+            self._failures = 0
+
+    def release_trial(self):
+        """ Gives back the trial call of a half open circuit that was not made, e.g. because the quota refused it, so
+        that the next call is let through as the trial instead """
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                self._state = CircuitBreaker.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitBreaker.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != CircuitBreaker.OPEN:
+                    self.logger.warning("Upstream failed %s time(s) in a row. Opening circuit", self._failures)
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+
+    def state(self):
+        with self._lock:
+            return self._state
+
+
+class RapidApiClient:
+    """ Makes calls to RapidAPI through a pooled keep-alive session, with timeouts, jittered retries under a retry
+    budget and a circuit breaker. Every call, retries included, is accounted for by the quota if one is given """
+
+    def __init__(self, host: str, version: str, key: str, scheme="https", connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_seconds=0.2, pool_size=10, retry_budget=None, circuit_breaker=None, quota=None):
+        self.host = host
+        self.base_url = "{}://{}/{}".format(scheme, host, version)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.quota = quota
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("{}://".format(scheme), adapter)
+        self.session.headers.update({
+            'x-rapidapi-key': key,
+            'x-rapidapi-host': host
+        })
+        self.logger = logger_factory(RapidApiClient.__name__)
+
+    def get(self, path: str, params: dict, critical=True):
+        """ Makes a GET request to the upstream
+
+            :param path Path of the resource, relative to the API version, e.g. "standings"
+            :param params Query string parameters
+            :param critical Whether there is nothing to serve without this call, as opposed to a refresh of data that
+            can still be served. Calls that are not critical give way to critical ones when quota is low
+            :returns :func:`requests.Response` with a 200 status code
+            :raises CircuitOpenException if the upstream is known to be unhealthy
+            :raises QuotaExceededException, RateLimitedException if the quota does not allow the call
+            :raises UpstreamException if the upstream could not give a successful response
+        """
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenException("Circuit to {} is open. Not calling upstream".format(self.host))
+
+        url = "{}/{}".format(self.base_url, path)
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            if self.quota is not None:
+                try:
+                    self.quota.acquire(critical)
+                except Exception:
+                    # No call is made, so the circuit learns nothing about the upstream
+                    self.circuit_breaker.release_trial()
+                    raise
+            try:
+                try:
+                    with metrics.stage_timer(metrics.UPSTREAM_FETCH):
+                        response = self.session.get(url, params=params, timeout=self.timeout)
+                except requests.RequestException:
+                    metrics.UPSTREAM_RESPONSES.labels(status_code="error").inc()
+                    raise
+                metrics.UPSTREAM_RESPONSES.labels(status_code=str(response.status_code)).inc()
+                if self.quota is not None:
+                    self.quota.record_response(response)
+                if response.status_code == 200:
+                    self.circuit_breaker.record_success()
+                    return response
+                error = "Error reading from RapidApi. Status code: {}".format(response.status_code)
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+            except requests.RequestException as e:
+                error = "Error reading from RapidApi. Error message: {}".format(e.__str__())
+                retryable = True
+
+            if not retryable:
+                # The upstream is healthy, it's the request that is not right
+                self.circuit_breaker.record_success()
+                raise UpstreamException(error)
+
+            self.circuit_breaker.record_failure()
+            if attempt >= self.max_retries or not self.circuit_breaker.allow() or not self.retry_budget.withdraw():
+                raise UpstreamException(error)
+            attempt += 1
+            self.logger.warning("%s. Retrying (attempt %s of %s)", error, attempt, self.max_retries)
+            time.sleep(random.uniform(0, self.backoff_seconds * (2 ** attempt)))
+
+    def worst_case_seconds(self):
+        """ Returns how long a call can take at most: every attempt timing out and waiting as long as the quota lets it
+        for a token, plus the longest backoffs between the attempts """
+        attempt_seconds = sum(self.timeout)
+        if self.quota is not None:
+            attempt_seconds += self.quota.max_wait_seconds
+        backoff_seconds = sum(self.backoff_seconds * (2 ** attempt) for attempt in range(1, self.max_retries + 1))
+        return (self.max_retries + 1) * attempt_seconds + backoff_seconds
+
+    def get_standings(self, league, season, critical=True):
+        return self.get("standings", {'season': season, 'league': league}, critical=critical)
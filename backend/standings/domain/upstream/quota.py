@@ -0,0 +1,248 @@
+"""This module keeps the calls to RapidAPI within its rate limits and within the quota of the plan that is paid for """
+import datetime
+import threading
+import time
+
+from backend.standings.common import logger_factory
+from backend.standings.domain import metrics
+from backend.standings.domain.upstream.client import UpstreamException
+
+# Quota of the RapidAPI plan, per day
+REQUESTS_LIMIT_HEADER = "x-ratelimit-requests-limit"
+REQUESTS_REMAINING_HEADER = "x-ratelimit-requests-remaining"
+REQUESTS_RESET_HEADER = "x-ratelimit-requests-reset"
+# Rate limit of the API, per minute
+RATE_REMAINING_HEADER = "x-ratelimit-remaining"
+RETRY_AFTER_HEADER = "retry-after"
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class QuotaExceededException(UpstreamException):
+    def __init__(self, message):
+        super(QuotaExceededException, self).__init__(message)
+
+
+class RateLimitedException(UpstreamException):
+    def __init__(self, message):
+        super(RateLimitedException, self).__init__(message)
+
+
+class LocalQuotaStore:
+    """ Keeps the token bucket, the call counters and the quota state in memory, for this worker only. Used when there
+    is no Redis to share them through, or while it is not available. Implements the same operations as
+    :func:`RedisCache` does for the quota, which return None when Redis is not available """
+
+    def __init__(self):
+        self._buckets = {}
+        self._counters = {}
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take_token(self, name: str, capacity: float, refill_per_second: float, now: float):
+        with self._lock:
+            tokens, updated_at, blocked_until = self._buckets.get(name, (None, now, 0.0))
+            if now < blocked_until:
+                return blocked_until - now
+            tokens = capacity if tokens is None else min(capacity,
+                                                         tokens + max(0.0, now - updated_at) * refill_per_second)
+            wait_seconds = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait_seconds = (1 - tokens) / refill_per_second
+            self._buckets[name] = (tokens, now, blocked_until)
+            return wait_seconds
+
+    def block_token_bucket(self, name: str, until: float):
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(name, (None, until, 0.0))
+            self._buckets[name] = (tokens, updated_at, until)
+
+    def count_calls(self, counters: dict):
+        with self._lock:
+            counts = []
+            for name in counters:
+                self._counters[name] = self._counters.get(name, 0) + 1
+                counts.append(self._counters[name])
+            return counts
+
+    def get_counts(self, names):
+        with self._lock:
+            return [self._counters.get(name, 0) for name in names]
+
+    def set_quota_state(self, name: str, state: dict, ttl_seconds: int):
+        with self._lock:
+            self._state[name] = (dict(state), time.monotonic() + ttl_seconds)
+
+    def get_quota_state(self, name: str):
+        with self._lock:
+            state, expires_at = self._state.get(name, ({}, None))
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._state[name]
+                return {}
+            return dict(state)
+
+
+class UpstreamQuota:
+    """ Accounts for every call made to the upstream, shared by all the workers through the store, e.g.
+    :func:`RedisCache`.
+
+    Calls are let through a token bucket that refills at `requests_per_second`, up to `burst` calls at once. The calls
+    are counted per day and per month. The remaining quota is the lowest of what the upstream reports in its rate limit
+    headers and what is left of the configured daily and monthly limits. Once the remaining quota is down to the
+    reserve, calls that are not critical (refreshes of standings that can still be served) are refused, so that the
+    quota that is left goes to requests that have nothing to serve. When the upstream says its rate limit is used up,
+    the bucket is blocked until it resets.
+    """
+
+    def __init__(self, store=None, name="rapidapi", requests_per_second=1.0, burst=5, daily_limit=None,
+                 monthly_limit=None, reserve=10, max_wait_seconds=2.0, clock=time.time, sleep=time.sleep):
+        """
+            :param store Shares the quota between workers. Falls back to this worker's own accounting if None, or while
+            the store is not available
+            :param reserve Remaining quota below which only critical calls are let through
+            :param max_wait_seconds How long a critical call waits for a token before it is refused
+        """
+        self.store = store
+        self.local_store = LocalQuotaStore()
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.daily_limit = daily_limit
+        self.monthly_limit = monthly_limit
+        self.reserve = reserve
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket_name = "ratelimit:{}".format(name)
+        self.state_name = "quota:{}:state".format(name)
+
+        self._metrics_lock = threading.Lock()
+        self.throttled = 0
+        self.deferred = 0
+        self.refused = 0
+        self.logger = logger_factory(UpstreamQuota.__name__)
+
+    def acquire(self, critical=True):
+        """ Takes the right to make one call to the upstream
+
+            :param critical Whether the call serves a request that has nothing else to serve. Calls that are not
+            critical are refused when quota is low, and do not wait for the rate limit
+            :raises QuotaExceededException if the quota is used up, or is low and the call is not critical
+            :raises RateLimitedException if no call can be made within the rate limit in time
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            self._count('refused')
+            raise QuotaExceededException("Quota for {} is used up".format(self.name))
+        if not critical and remaining is not None and remaining <= self.reserve:
+            self._count('deferred')
+            raise QuotaExceededException("Quota for {} is low ({} left). Keeping it for critical calls"
+                                         .format(self.name, remaining))
+
+        waited = 0.0
+        while True:
+            wait_seconds = self._store('take_token', self.bucket_name, self.burst, self.requests_per_second,
+                                       self.clock())
+            if wait_seconds <= 0:
+                return
+            if not critical or waited + wait_seconds > self.max_wait_seconds:
+                self._count('throttled')
+                raise RateLimitedException("Rate limit for {} reached. Next call possible in {:.2f} seconds"
+                                           .format(self.name, wait_seconds))
+            self.sleep(wait_seconds)
+            waited += wait_seconds
+
+    def record_response(self, response):
+        """ Counts a call that was made to the upstream, and adapts to the rate limit headers of its response """
+        now = self.clock()
+        self._store('count_calls', self._counter_names(now))
+
+        headers = response.headers
+        state = {}
+        for header, field in ((REQUESTS_LIMIT_HEADER, 'limit'), (REQUESTS_REMAINING_HEADER, 'remaining')):
+            value = _int_header(headers, header)
+            if value is not None:
+                state[field] = value
+        if state:
+            reset_seconds = _int_header(headers, REQUESTS_RESET_HEADER)
+            ttl_seconds = reset_seconds if reset_seconds is not None and reset_seconds > 0 else SECONDS_PER_DAY
+            self._store('set_quota_state', self.state_name, state, ttl_seconds)
+
+        retry_after = _int_header(headers, RETRY_AFTER_HEADER)
+        if response.status_code == 429 or _int_header(headers, RATE_REMAINING_HEADER) == 0:
+            block_seconds = retry_after if retry_after is not None else 60
+            self._store('block_token_bucket', self.bucket_name, now + block_seconds)
+            self.logger.warning("Rate limit for %s used up. No calls for %s seconds", self.name, block_seconds)
+
+    def remaining(self):
+        """ Returns the number of calls left in the quota, or None if it is not known """
+        now = self.clock()
+        candidates = []
+        reported = self._store('get_quota_state', self.state_name).get('remaining')
+        if reported is not None:
+            candidates.append(int(reported))
+        calls_today, calls_this_month = self._store('get_counts', list(self._counter_names(now)))
+        if self.daily_limit is not None:
+            candidates.append(self.daily_limit - calls_today)
+        if self.monthly_limit is not None:
+            candidates.append(self.monthly_limit - calls_this_month)
+        return min(candidates) if candidates else None
+
+    def stats(self):
+        """ Returns the upstream calls made and the quota left, for metrics """
+        calls_today, calls_this_month = self._store('get_counts', list(self._counter_names(self.clock())))
+        stats = {
+            "calls_today": calls_today,
+            "calls_this_month": calls_this_month,
+            "remaining": self.remaining(),
+            "limit": self._store('get_quota_state', self.state_name).get('limit'),
+        }
+        with self._metrics_lock:
+            stats.update(throttled=self.throttled, deferred=self.deferred, refused=self.refused)
+        return stats
+
+    def _counter_names(self, now):
+        """ Names of the per day and per month call counters, with how long they are kept """
+        moment = datetime.datetime.utcfromtimestamp(now)
+        return {
+            "quota:{}:calls:{:%Y-%m-%d}".format(self.name, moment): 2 * SECONDS_PER_DAY,
+            "quota:{}:calls:{:%Y-%m}".format(self.name, moment): 32 * SECONDS_PER_DAY,
+        }
+
+    def _store(self, operation, *args):
+        """ Runs an operation on the shared store, or on this worker's own store if the shared one is not available """
+        result = None
+        if self.store is not None:
+            result = getattr(self.store, operation)(*args)
+        if result is None:
+            result = getattr(self.local_store, operation)(*args)
+        return result
+
+    def _count(self, metric):
+        with self._metrics_lock:
+            setattr(self, metric, getattr(self, metric) + 1)
+        metrics.UPSTREAM_QUOTA_DECISIONS.labels(decision=metric).inc()
+
+    @staticmethod
+    def from_config(quota_config: dict, store=None):
+        """ Builds the quota from config of the form
+            {"requestsPerSecond": 1, "burst": 5, "dailyLimit": 100, "monthlyLimit": 3000, "reserve": 10,
+             "maxWaitSeconds": 2}
+        """
+        return UpstreamQuota(store=store,
+                             requests_per_second=quota_config.get('requestsPerSecond', 1.0),
+                             burst=quota_config.get('burst', 5),
+                             daily_limit=quota_config.get('dailyLimit'),
+                             monthly_limit=quota_config.get('monthlyLimit'),
+                             reserve=quota_config.get('reserve', 10),
+                             max_wait_seconds=quota_config.get('maxWaitSeconds', 2.0))
+
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,45 @@
+""" Gunicorn settings for the standings service. Workers are threaded, so that a request waiting on RapidAPI, Redis or
+MongoDB only holds one of the worker threads instead of the whole worker. All the settings can be overridden with
+environment variables, e.g. STANDINGS_WORKER_CLASS=sync to go back to single threaded workers. """
+import os
+
+bind = ":5000"
+# One worker process, as with the sync workers before: the threads add concurrency, not memory
+workers = int(os.environ.get("STANDINGS_WORKERS", 1))
+worker_class = os.environ.get("STANDINGS_WORKER_CLASS", "gthread")
+# Load tested on one core with tests/benchmarks/stand_in_app.py and load_test.py: 32 clients, 20 seconds, 1 worker.
+#
+#                     cached hits                      upstream bound (200 ms RapidAPI calls)
+#   sync              236-410 req/s, p99 118-351 ms    4.5-4.8 req/s, p50 6.7-7.0 s
+#   gthread, 2        268 req/s, p99 223 ms            9.2 req/s, p50 3.5 s
+#   gthread, 4        322 req/s, p99 272 ms            17.6 req/s, p50 1.8 s
+#   gthread, 8        276-376 req/s, p99 238-351 ms    34-37 req/s, p50 0.87-0.93 s
+#   gthread, 16       329-340 req/s, p99 266-301 ms    64-71 req/s, p50 0.44-0.49 s
+#
+# The longer tail of cached hits comes with the threaded worker, not with the number of threads: it is there with 2
+# threads too, while fewer threads cut the throughput of requests waiting on RapidAPI in proportion. 16 threads trade
+# up to about 150 ms of p99 on cached hits against the best sync runs, on a single core, for 15 times the throughput
+# when RapidAPI is slow, in about 5 MB more memory than the sync worker
+threads = int(os.environ.get("STANDINGS_THREADS", 16))
+# Upper bound for a request, above the RapidAPI read timeout plus retries
+timeout = int(os.environ.get("STANDINGS_TIMEOUT_SECONDS", 60))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+# Every worker writes its metrics to files in this directory, so that /metrics adds them up for all the workers. It has
+# to be set before the app, and so the metrics, are loaded in the workers
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/standings_metrics")
+
+
+def on_starting(server):
+    # Metrics of the workers of a previous run are not carried over
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -4,15 +4,22 @@ from flask import Flask
 from backend.standings.common import configure_logger
 from backend.standings.common import logger_factory
 from backend.standings.views import LazyView
+from backend.standings.views import warm_up
 
 app = Flask(__name__)
 
 configure_logger("../log_config.yaml")
 logger = logger_factory(__name__)
 
+warm_up()
 logger.info("Started Standings service")
 
-app.add_url_rule('/standings/<league>/<season>', view_func=LazyView('views.get_league_standings'))
+app.add_url_rule('/standings/<league>/<season>',
+                 view_func=LazyView('backend.standings.views.get_league_standings'))
+app.add_url_rule('/standings/<league>/<season>/changes',
+                 view_func=LazyView('backend.standings.views.get_league_standings_changes'))
+app.add_url_rule('/standings', view_func=LazyView('backend.standings.views.get_many_league_standings'))
+app.add_url_rule('/metrics', view_func=LazyView('backend.standings.views.get_metrics'))
 
 if __name__ == '__main__':
     args = sys.argv[1:]
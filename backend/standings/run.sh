@@ -7,8 +7,12 @@ export PYTHONPATH="${PYTHONPATH}:/app/backend/standings/"
 working_dir="/app/backend/standings"
 if cd $working_dir;
 then
+  if [ "$1" = "scheduler" ];
+  then
+    exec python scheduler.py
+  fi
   export FLASK_APP=main.py
-  exec gunicorn -b :5000 --access-logfile - --error-logfile - main:app
+  exec gunicorn -c gunicorn.conf.py main:app
 else
   echo "$working_dir does not exist"
   return 1
@@ -0,0 +1,35 @@
+""" Refreshes the standings of the live seasons of every league in the background, so that requests find them fresh in
+storage instead of waiting on RapidAPI. Runs as its own process next to the web workers, from the standings
+directory, e.g.
+
+    python scheduler.py not_container
+"""
+from backend.standings.common import configure_logger
+from backend.standings.common import logger_factory
+from backend.standings.domain.refresh_scheduler import RefreshCadence
+from backend.standings.domain.refresh_scheduler import RefreshScheduler
+from backend.standings.views import CONFIG
+from backend.standings.views import live_keys
+from backend.standings.views import refresh
+
+configure_logger("../log_config.yaml")
+logger = logger_factory(__name__)
+
+
+def main():
+    scheduler_config = CONFIG.get('scheduler', {})
+    scheduler = RefreshScheduler(live_keys, refresh,
+                                 cadence=RefreshCadence.from_config(scheduler_config.get('cadence', {})),
+                                 calls_per_day=scheduler_config.get('callsPerDay', 100),
+                                 rescan_seconds=scheduler_config.get('rescanSeconds', 3600))
+    logger.info("Started Standings refresh scheduler")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    logger.info("Stopped Standings refresh scheduler after %s refresh(es) and %s failure(s)", scheduler.refreshes,
+                scheduler.failures)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+""" Compares the payload size and the encode/decode times of the storage codecs for 20 and 24 team tables.
+
+Run from the root of the repository with:
+    python -m backend.standings.tests.benchmarks.codec
+"""
+import timeit
+
+from backend.standings.domain.response.standings import Record
+from backend.standings.domain.response.standings import Records
+from backend.standings.domain.response.standings import Standing
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.response.standings import Team
+from backend.standings.domain.storage.codec import CompactCodec
+from backend.standings.domain.storage.codec import PickleCodec
+
+RUNS = 2000
+
+
+def _table(teams):
+    games = (teams - 1) * 2
+    table = Standings()
+    for rank in range(1, teams + 1):
+        wins, draws = teams - rank + 5, 5
+        records = Records()
+        records.add_record(Record("all", games, wins, draws, games - wins - draws, wins * 2, rank * 2))
+        team = Team(rank * 10, "Team {}".format(rank), "https://media.api-sports.io/football/teams/{}.png".format(rank))
+        table.add(Standing(rank=rank, team=team, points=wins * 3 + draws, group="League", form="WWDLW",
+                           records=records))
+    return table
+
+
+def _micros(function):
+    return min(timeit.repeat(function, number=RUNS, repeat=3)) / RUNS * 1e6
+
+
+def main():
+    codecs = [("pickle", PickleCodec()),
+              ("compact", CompactCodec(compress=False)),
+              ("compact + zlib", CompactCodec(compress=True))]
+    print("{:<8}{:<18}{:>10}{:>14}{:>14}".format("Teams", "Codec", "Bytes", "Encode (us)", "Decode (us)"))
+    for teams in [20, 24]:
+        table = _table(teams)
+        for name, codec in codecs:
+            encoded = codec.encode(table)
+            print("{:<8}{:<18}{:>10}{:>14.1f}{:>14.1f}".format(teams, name, len(encoded),
+                                                              _micros(lambda: codec.encode(table)),
+                                                              _micros(lambda: codec.decode(encoded))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+""" Load tests a running standings service: a number of concurrent clients request the given paths in a loop for a
+while, then the throughput and latency percentiles are printed.
+
+To compare worker classes at equal memory, run the service with the same number of worker processes, once with
+STANDINGS_WORKER_CLASS=sync and once with the default threaded workers, and load test both the same way, e.g.
+
+    python -m backend.standings.tests.benchmarks.load_test http://localhost:5000 --concurrency 64 --seconds 30 \
+        /standings/epl/2020 /standings/seriea/2024
+
+Requests for seasons that are not cached show how the service copes with slow upstream calls. Without Redis, MongoDB
+or RapidAPI at hand, :mod:`stand_in_app` serves the service on the stand-ins with simulated latencies.
+"""
+import argparse
+import itertools
+import threading
+import time
+
+import requests
+
+
+def _client(base_url, paths, deadline, latencies, errors, lock, headers):
+    session = requests.Session()
+    session.headers.update(headers)
+    for path in itertools.cycle(paths):
+        if time.monotonic() >= deadline:
+            return
+        start = time.monotonic()
+        try:
+            status_code = session.get(base_url + path, timeout=60).status_code
+        except requests.RequestException:
+            status_code = None
+        elapsed = time.monotonic() - start
+        with lock:
+            if status_code in (200, 304):
+                latencies.append(elapsed)
+            else:
+                errors.append(status_code)
+
+
+def _percentile(sorted_values, percentile):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def load_test(base_url, paths, concurrency, seconds, headers=None):
+    """ Runs the load test
+
+        :param headers Headers sent with every request
+
+        :returns Dictionary with the number of requests and errors, the throughput and the latency percentiles in ms
+    """
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.monotonic() + seconds
+    headers = headers if headers is not None else {}
+    clients = [threading.Thread(target=_client, args=(base_url, paths, deadline, latencies, errors, lock, headers))
+               for _ in range(concurrency)]
+    start = time.monotonic()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed,
+        "p50": _percentile(latencies, 50) * 1000,
+        "p95": _percentile(latencies, 95) * 1000,
+        "p99": _percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running standings service")
+    parser.add_argument("base_url", help="e.g. http://localhost:5000")
+    parser.add_argument("paths", nargs="+", help="e.g. /standings/epl/2020")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--header", action="append", default=[], help="header sent with every request, e.g. "
+                                                                       "'Accept-Encoding: gzip'")
+    args = parser.parse_args()
+
+    headers = dict((name.strip(), value.strip())
+                   for name, _, value in (header.partition(":") for header in args.header))
+    result = load_test(args.base_url, args.paths, args.concurrency, args.seconds, headers)
+    print("{requests} requests, {errors} errors, {throughput:.1f} requests/s, p50 {p50:.1f} ms, p95 {p95:.1f} ms, "
+          "p99 {p99:.1f} ms".format(**result))
+
+
+if __name__ == '__main__':
+    main()
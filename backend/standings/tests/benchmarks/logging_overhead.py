@@ -0,0 +1,94 @@
+""" Measures the CPU time that logging adds to a request served from Redis, with the development log profile
+(log_config.yaml) and with the production one (log_config.production.yaml). The log lines are written to /dev/null,
+and the CPU time of the background logging thread is included.
+
+Run from the root of the repository with:
+    python -m backend.standings.tests.benchmarks.logging_overhead
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+from backend.standings import common
+from backend.standings.common import SAMPLED
+from backend.standings.common import configure_logger
+from backend.standings.common import logger_factory
+from backend.standings.domain.response.standings import MockStandingsSource
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import Storage
+from backend.standings.domain.storage.storage import database_provider
+from backend.standings.tests.stand_ins import StandInMongoDB
+from backend.standings.tests.stand_ins import StandInRedis
+
+REQUESTS = 2000
+RUNS = 5
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.."))
+
+logger = logger_factory(__name__)
+
+
+def _profile(config_file, directory):
+    """ Copies a log profile, with its log files moved to the given directory """
+    with open(os.path.join(BACKEND_DIR, config_file)) as f:
+        profile = yaml.safe_load(f.read())
+    profile['disable_existing_loggers'] = False
+    for handler in profile['handlers'].values():
+        if 'filename' in handler:
+            handler['filename'] = os.path.join(directory, os.path.basename(handler['filename']))
+    copy = os.path.join(directory, config_file)
+    with open(copy, "w") as f:
+        yaml.safe_dump(profile, f)
+    return copy
+
+
+def _cpu_seconds_per_request(storage, key, config_file=None):
+    """ Returns the lowest CPU time per request over a number of runs """
+    best = None
+    for _ in range(RUNS):
+        if config_file is not None:
+            common._configured_file = None
+            configure_logger(config_file)
+        start = time.process_time()
+        for _ in range(REQUESTS):
+            storage.check_and_get(key)
+            logger.info("Retrieving '%s' season standings for '%s' league from database", key.season, key.alias,
+                        extra=SAMPLED)
+        # Waits for the background thread to write what is left on the queue
+        common._stop_listener()
+        seconds = (time.process_time() - start) / REQUESTS
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    redis = StandInRedis()
+    storage = Storage(database_provider(False, redis_cache=RedisCache(redis_client=redis), mongo_db=StandInMongoDB()))
+    key = Key("epl", "2020")
+    storage.store(key, MockStandingsSource().get_standings(key))
+
+    stdout = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            logging.disable(logging.CRITICAL)
+            results.append(("no logging", _cpu_seconds_per_request(storage, key)))
+            logging.disable(logging.NOTSET)
+            for name, config_file in [("development", "log_config.yaml"),
+                                      ("production", "log_config.production.yaml")]:
+                results.append((name, _cpu_seconds_per_request(storage, key, _profile(config_file, directory))))
+        finally:
+            sys.stdout = stdout
+
+    print("{:<20}{:>25}".format("Log profile", "CPU per request (us)"))
+    for name, seconds in results:
+        print("{:<20}{:>25.1f}".format(name, seconds * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+""" Measures the memory taken by the standings that a worker caches in process: 500 tables of 20 standings each, as the
+local cache holds them, that is with their JSON encoding. The size of a pickled table is printed too.
+
+Run from the root of the repository with:
+    python -m backend.standings.tests.benchmarks.memory
+"""
+import gc
+import pickle
+import tracemalloc
+
+from backend.standings.domain.response.standings import Record
+from backend.standings.domain.response.standings import Records
+from backend.standings.domain.response.standings import Standing
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.response.standings import Team
+
+TABLES = 500
+TEAMS = 20
+
+
+def _table(table):
+    standings = Standings()
+    for rank in range(1, TEAMS + 1):
+        team_id = table * TEAMS + rank
+        records = Records()
+        records.add_record(Record("all", 38, 38 - rank, rank // 2, rank - rank // 2, 90 - rank, 20 + rank))
+        standings.add(Standing(rank=rank, team=Team(team_id, "Team_{}".format(team_id),
+                                                    "https://media.api-sports.io/football/teams/{}.png".format(team_id),
+                                                    "https://www.team{}.com".format(team_id)),
+                               points=3 * (38 - rank) + rank // 2, group="League", form="WWDLW", records=records))
+    return standings
+
+
+def _allocated_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    built = build()
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, end - start
+
+
+def main():
+    tables, objects = _allocated_bytes(lambda: [_table(table) for table in range(TABLES)])
+    _, encodings = _allocated_bytes(lambda: [standings.as_json_bytes() for standings in tables])
+
+    print("{} tables of {} standings".format(TABLES, TEAMS))
+    print("{:<30}{:>15.1f} MB".format("Objects", objects / 1024 / 1024))
+    print("{:<30}{:>15.1f} MB".format("JSON encodings", encodings / 1024 / 1024))
+    print("{:<30}{:>15.1f} MB".format("Total", (objects + encodings) / 1024 / 1024))
+    print("{:<30}{:>15} B".format("Pickled table", len(pickle.dumps(tables[0]))))
+
+
+if __name__ == '__main__':
+    main()
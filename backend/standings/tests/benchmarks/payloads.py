@@ -0,0 +1,48 @@
+""" Builds RapidAPI standings payloads for benchmarks, in the shape and with the fields that RapidAPI sends, including
+the ones the service ignores. The payloads are the same on every run """
+import json
+
+FORMS = ["WWWWD", "WDWLW", "LWWDW", "DDWLW", "WLLDW", "LDLWW", "LLDWL", "DLLLW"]
+
+
+def _record(played, wins, draws, goals_for, goals_against):
+    return {"played": played, "win": wins, "draw": draws, "lose": played - wins - draws,
+            "goals": {"for": goals_for, "against": goals_against}}
+
+
+def _standing(rank, teams, group, team_id):
+    games = (teams - 1) * 2
+    wins = max(games - rank - 6, 0)
+    draws = min(rank % 7 + 2, games - wins)
+    goals_for, goals_against = 30 + wins * 2, 20 + rank * 2
+    home_wins, home_draws = (wins + 1) // 2, draws // 2
+    return {"rank": rank,
+            "team": {"id": team_id, "name": "Team {}".format(team_id),
+                     "logo": "https://media.api-sports.io/football/teams/{}.png".format(team_id)},
+            "points": wins * 3 + draws, "goalsDiff": goals_for - goals_against, "group": group,
+            "form": FORMS[rank % len(FORMS)], "status": "same",
+            "description": "Promotion - Champions League (Group Stage)" if rank <= 4 else None,
+            "all": _record(games, wins, draws, goals_for, goals_against),
+            "home": _record(games // 2, home_wins, home_draws, goals_for // 2 + 3, goals_against // 2 - 2),
+            "away": _record(games - games // 2, wins - home_wins, draws - home_draws, goals_for - goals_for // 2 - 3,
+                            goals_against - goals_against // 2 + 2),
+            "update": "2021-05-23T00:00:00+00:00"}
+
+
+def rapidapi_payload(teams=20, groups=1, league_id=39, season=2020):
+    """ Returns the payload of a standings response, with a table of `teams` teams per group """
+    tables = []
+    for group in range(groups):
+        name = "Premier League" if groups == 1 else "Group {}".format(chr(ord("A") + group))
+        tables.append([_standing(rank, teams, name, 100 * group + rank) for rank in range(1, teams + 1)])
+    return {"get": "standings", "parameters": {"league": str(league_id), "season": str(season)}, "errors": [],
+            "results": 1, "paging": {"current": 1, "total": 1},
+            "response": [{"league": {"id": league_id, "name": "Premier League", "country": "England",
+                                     "logo": "https://media.api-sports.io/football/leagues/{}.png".format(league_id),
+                                     "flag": "https://media.api-sports.io/flags/gb.svg", "season": season,
+                                     "standings": tables}}]}
+
+
+def rapidapi_payload_bytes(teams=20, groups=1, league_id=39, season=2020):
+    """ Returns the payload of a standings response as RapidAPI sends it, encoded in JSON """
+    return json.dumps(rapidapi_payload(teams, groups, league_id, season)).encode()
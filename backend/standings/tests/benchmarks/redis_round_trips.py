@@ -0,0 +1,55 @@
+""" Counts the Redis round trips made per request by the storage layer, with Redis availability checked by pinging
+before every command (as it used to be) and tracked passively from the commands themselves. The MongoDB round trips of
+a miss are counted too.
+
+Run from the root of the repository with:
+    python -m backend.standings.tests.benchmarks.redis_round_trips
+"""
+from backend.standings.domain.response.standings import MockStandingsSource
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import Storage
+from backend.standings.domain.storage.storage import database_provider
+from backend.standings.tests.stand_ins import StandInMongoDB
+from backend.standings.tests.stand_ins import StandInRedis
+
+REQUESTS = 1000
+
+
+class _PingingRedisCache(RedisCache):
+    """ Checks availability the way it used to be done, by pinging Redis before every command """
+
+    def _is_available(self):
+        return self.redis_client.ping()
+
+
+def _round_trips_per_request(redis_cache_type):
+    redis, mongodb = StandInRedis(), StandInMongoDB()
+    storage = Storage(database_provider(False, redis_cache=redis_cache_type(redis_client=redis), mongo_db=mongodb))
+    key = Key("epl", "2020")
+    standings = MockStandingsSource().get_standings(key)
+
+    redis.round_trips = 0
+    storage.check_and_get(key)
+    storage.store(key, standings)
+    miss = redis.round_trips
+    mongo_miss = mongodb.round_trips
+
+    redis.round_trips = 0
+    for _ in range(REQUESTS):
+        storage.check_and_get(key)
+    hit = redis.round_trips / REQUESTS
+
+    return miss, hit, mongo_miss
+
+
+def main():
+    print("{:<30}{:>15}{:>15}{:>20}".format("Availability check", "Miss + store", "Hit", "Mongo miss + store"))
+    for name, redis_cache_type in [("ping before every command", _PingingRedisCache),
+                                   ("passive", RedisCache)]:
+        miss, hit, mongo_miss = _round_trips_per_request(redis_cache_type)
+        print("{:<30}{:>15}{:>15}{:>20}".format(name, miss, hit, mongo_miss))
+
+
+if __name__ == '__main__':
+    main()
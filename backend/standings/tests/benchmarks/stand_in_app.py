@@ -0,0 +1,53 @@
+""" Serves the standings service on the in-process stand-ins, for load tests on a machine without Redis, MongoDB or
+RapidAPI. Every round trip to the stand-ins and every call to RapidAPI waits for a simulated latency, in milliseconds,
+set with STANDINGS_STAND_IN_REDIS_MS, STANDINGS_STAND_IN_MONGO_MS and STANDINGS_STAND_IN_RAPIDAPI_MS. Requests with
+the X-Stand-In-Miss header find nothing stored for their key, so they are served from RapidAPI. Run from the standings
+directory, e.g.
+
+    STANDINGS_WORKER_CLASS=sync gunicorn -c gunicorn.conf.py backend.standings.tests.benchmarks.stand_in_app:app
+
+and load test it with :mod:`load_test`.
+"""
+import os
+import time
+
+from backend.standings.domain import metrics
+from backend.standings.domain.storage.storage import Key
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload_bytes
+from backend.standings.tests.stand_ins import StandInRapidApi
+from backend.standings.tests.stand_ins import stand_in_service
+
+LATENCY_SECONDS = {
+    metrics.REDIS: float(os.environ.get("STANDINGS_STAND_IN_REDIS_MS", 1)) / 1000,
+    metrics.MONGO: float(os.environ.get("STANDINGS_STAND_IN_MONGO_MS", 2)) / 1000,
+}
+RAPIDAPI_LATENCY_SECONDS = float(os.environ.get("STANDINGS_STAND_IN_RAPIDAPI_MS", 200)) / 1000
+
+
+class _SlowRapidApi(StandInRapidApi):
+    def get_standings(self, league, season, critical=True):
+        time.sleep(RAPIDAPI_LATENCY_SECONDS)
+        return super(_SlowRapidApi, self).get_standings(league, season, critical)
+
+
+def _slow_round_trip(record_round_trip):
+    def slow_round_trip(tier):
+        record_round_trip(tier)
+        time.sleep(LATENCY_SECONDS.get(tier, 0))
+    return slow_round_trip
+
+
+service, redis, mongodb, rapid_api, local_cache = stand_in_service(rapidapi_payload_bytes())
+metrics.record_round_trip = _slow_round_trip(metrics.record_round_trip)
+from backend.standings import views
+views.upstream_client = _SlowRapidApi(rapid_api.payload_bytes)
+
+
+def app(environ, start_response):
+    parts = environ.get("PATH_INFO", "").strip("/").split("/")
+    if "HTTP_X_STAND_IN_MISS" in environ and len(parts) >= 3 and parts[0] == "standings":
+        key = Key(parts[1], parts[2])
+        redis.data.pop(key.__str__(), None)
+        mongodb.data.pop(key.__str__(), None)
+        local_cache.invalidate(key)
+    return service(environ, start_response)
@@ -0,0 +1,330 @@
+""" Benchmarks the hot paths of the standings service and compares them with saved baselines: parsing RapidAPI
+payloads, encoding standings to JSON, the storage codec, storage against the in-process Redis and MongoDB stand-ins,
+league lookups, and the Flask routes through the test client, for hits and misses and for clients polling for
+changes.
+
+Run from the root of the repository with:
+    python -m backend.standings.tests.benchmarks.suite                  compares with the saved baselines
+    python -m backend.standings.tests.benchmarks.suite --save           saves the results as the baselines
+    python -m backend.standings.tests.benchmarks.suite --filter route   runs the benchmarks whose name has 'route'
+
+Every benchmark is warmed up, then timed a number of times with garbage collection off, and the fastest time is kept,
+which is the one least disturbed by the rest of the machine. The timings alternate with timings of a reference workload,
+and benchmarks are compared by their time relative to the reference, which cancels out how fast the machine is at the
+time, and so lets baselines saved on one machine be compared on another. With --runs, the whole suite is run that many
+times and the best result of every benchmark is kept. A comparison fails, with exit status 1, when a benchmark is slower
+than its baseline by more than the tolerance. Baselines are best saved with as many runs as comparisons are made with.
+"""
+import argparse
+import gc
+import gzip
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+from backend.standings.domain.config import ConfigProvider
+from backend.standings.domain.leagues import Leagues
+from backend.standings.domain.response.parser import parse_standings
+from backend.standings.domain.response.projection import Projection
+from backend.standings.domain.response.projection import ProjectionEncodings
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.response.standings import standing_builder
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import LocalCache
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import Storage
+from backend.standings.domain.storage.storage import database_provider
+from backend.standings.domain.storage.storage import from_binary
+from backend.standings.domain.storage.storage import to_binary
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload_bytes
+from backend.standings.tests.stand_ins import StandInMongoDB
+from backend.standings.tests.stand_ins import StandInRedis
+from backend.standings.tests.stand_ins import stand_in_service
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+STANDINGS_DIR = os.path.abspath(os.path.join(BENCHMARKS_DIR, "../.."))
+BASELINES_FILE = os.path.join(BENCHMARKS_DIR, "baselines.json")
+STANDINGS_CONFIG = os.path.join(STANDINGS_DIR, "config", "standings_config.json")
+
+REPEATS = 10
+MIN_SECONDS = 0.05
+RUNS = 3
+TOLERANCE = 0.25
+
+KEY = Key("epl", "2020")
+# Leagues with many groups, like the group stage of a cup
+GROUPS = 12
+
+
+def _table_response(payload):
+    return payload["response"][0]["league"]["standings"][0]
+
+
+def _build(standings_response):
+    standings = Standings()
+    for standing_response in standings_response:
+        standings.add(standing_builder(standing_response))
+    return standings
+
+
+def _build_groups(payload):
+    """ Builds standings the way they were built before the parser, for every group """
+    standings = Standings()
+    for group in payload["response"][0]["league"]["standings"]:
+        for standing_response in group:
+            standings.add(standing_builder(standing_response))
+    return standings
+
+
+def _reference():
+    """ Pure Python work of the kinds the service does: building, sorting and encoding small dictionaries """
+    rows = [{"rank": rank, "name": "Team {}".format(rank), "points": (rank * 7919) % 97} for rank in range(50)]
+    rows.sort(key=lambda row: (-row["points"], row["name"]))
+    return json.dumps(rows)
+
+
+def _time(run, prepare=None, repeats=REPEATS):
+    """ Times calls to `run` interleaved with calls to the reference workload, so that both are timed under the same
+    conditions. When given, `prepare` is called before every call to `run`, without being timed
+
+        :returns The lowest number of seconds a call to `run` took, and the lowest a call to the reference took
+    """
+    if prepare is not None:
+        prepare()
+    run()
+    if prepare is None:
+        measure = timeit.Timer(run).timeit
+    else:
+        def measure(number):
+            return _time_prepared(run, prepare, number)
+    measure_reference = timeit.Timer(_reference).timeit
+
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number, reference_number = _calibrate(measure), _calibrate(measure_reference)
+        seconds, reference_seconds = [], []
+        for _ in range(repeats):
+            seconds.append(measure(number) / number)
+            reference_seconds.append(measure_reference(reference_number) / reference_number)
+        return min(seconds), min(reference_seconds)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _calibrate(measure):
+    """ Returns the number of calls that take at least MIN_SECONDS. Many short timings are made rather than a few long
+    ones, so that the fastest of them is likely to be undisturbed by the rest of the machine """
+    number = 1
+    while True:
+        total = measure(number)
+        if total >= MIN_SECONDS:
+            return number
+        number *= 2 if total == 0 else max(2, min(10, int(MIN_SECONDS / total) + 1))
+
+
+def _time_prepared(run, prepare, number):
+    total = 0.0
+    for _ in range(number):
+        prepare()
+        start = time.perf_counter()
+        run()
+        total += time.perf_counter() - start
+    return total
+
+
+def _parsing_benchmarks():
+    payload = rapidapi_payload()
+    payload_bytes = rapidapi_payload_bytes()
+    yield "parse: standing_builder, 20 teams", lambda: [standing_builder(s) for s in _table_response(payload)], None
+    yield "parse: RapidAPI payload to standings, 20 teams", \
+        lambda: _build(_table_response(json.loads(payload_bytes))), None
+    yield "parse: parse_standings, 20 teams", lambda: parse_standings(payload_bytes), None
+    gzip_bytes = gzip.compress(payload_bytes)
+    yield "parse: parse_standings, gzip, 20 teams", lambda: parse_standings(gzip_bytes), None
+
+    groups_bytes = rapidapi_payload_bytes(groups=GROUPS)
+    yield "parse: RapidAPI payload to standings, {} groups".format(GROUPS), \
+        lambda: _build_groups(json.loads(groups_bytes)), None
+    yield "parse: parse_standings, {} groups".format(GROUPS), lambda: parse_standings(groups_bytes), None
+
+
+def _encoding_benchmarks():
+    standings = _build(_table_response(rapidapi_payload()))
+    binary = to_binary(standings)
+    yield "encode: Standings.as_json", standings.as_json, lambda: standings.set_json_bytes(None)
+    yield "encode: Standings.as_json, encoded before", standings.as_json, None
+    yield "codec: to_binary", lambda: to_binary(standings), None
+    yield "codec: from_binary", lambda: from_binary(binary), None
+
+
+def _projection_benchmarks():
+    standings = _build(_table_response(rapidapi_payload()))
+    mobile = Projection.from_args({"fields": "rank,team.name,team.logo,points,form"})
+    sorted_top = Projection.from_args({"fields": "rank,team.name,goal_diff", "sort": "-goal_diff", "top": "5"})
+
+    encodings = ProjectionEncodings()
+
+    def drop_table():
+        standings._table = None
+
+    yield "projection: mobile fields", lambda: mobile.as_json_bytes(standings.get_table()), drop_table
+    yield "projection: mobile fields, encoded before", lambda: encodings.as_json_bytes(standings, mobile), None
+    yield "projection: sort and top 5", lambda: sorted_top.as_json_bytes(standings.get_table()), drop_table
+
+
+def _storage_benchmarks():
+    standings = _build(_table_response(rapidapi_payload()))
+    redis, mongodb = StandInRedis(), StandInMongoDB()
+    redis_cache = RedisCache(redis_client=redis)
+    local_cache = LocalCache()
+    storage = Storage(database_provider(False, redis_cache=redis_cache, mongo_db=mongodb))
+    storage_with_local_cache = Storage(database_provider(False, redis_cache=redis_cache, mongo_db=mongodb),
+                                       local_cache=local_cache, invalidation_publisher=redis_cache)
+    storage.store(KEY, standings)
+
+    yield "storage: check_and_get, local cache hit", lambda: storage_with_local_cache.check_and_get(KEY), None
+    yield "storage: check_and_get, Redis hit", lambda: storage.check_and_get(KEY), None
+    yield "storage: check_and_get, MongoDB hit", lambda: storage.check_and_get(KEY), lambda: redis.data.clear()
+    yield "storage: store", lambda: storage_with_local_cache.store(KEY, standings), None
+
+
+def _leagues_benchmarks():
+    leagues = Leagues.get_instance(ConfigProvider(STANDINGS_CONFIG))
+    yield "leagues: get_league", lambda: leagues.get_league("epl"), None
+
+
+def _service():
+    app, redis, mongodb, rapid_api, local_cache = stand_in_service(rapidapi_payload_bytes())
+    return app, redis, mongodb, local_cache
+
+
+def _route_benchmarks():
+    app, redis, mongodb, local_cache = _service()
+    client = app.test_client()
+    path = "/standings/{}/{}".format(KEY.alias, KEY.season)
+    entity_tag = client.get(path).headers["ETag"]
+
+    def miss():
+        redis.data.clear()
+        mongodb.data.clear()
+        local_cache.invalidate(KEY)
+
+    yield "route: hit, local cache", lambda: client.get(path), None
+    yield "route: hit, not modified", lambda: client.get(path, headers={"If-None-Match": entity_tag}), None
+    yield "route: hit, Redis", lambda: client.get(path), lambda: local_cache.invalidate(KEY)
+    yield "route: miss, fetched from RapidAPI", lambda: client.get(path), miss
+    mobile_path = path + "?fields=rank,team.name,team.logo,points,form"
+    yield "route: hit, local cache, mobile fields", lambda: client.get(mobile_path), None
+
+
+def _changes_benchmarks():
+    app, redis, mongodb, local_cache = _service()
+    from backend.standings import views
+    client = app.test_client()
+    path = "/standings/{}/{}/changes".format(KEY.alias, KEY.season)
+    since = client.get(path).headers["X-Standings-Version"]
+    yield "changes: up to date", lambda: client.get(path, query_string={"since": since}), None
+
+    payload = rapidapi_payload()
+    table = payload["response"][0]["league"]["standings"][0]
+    table[5]["points"] += 3
+    table[9]["all"]["win"] += 1
+    views.storage.store(KEY, parse_standings(json.dumps(payload).encode(), fetched_at=time.time() + 60))
+    yield "changes: two standings changed", lambda: client.get(path, query_string={"since": since}), None
+
+
+BENCHMARKS = [_parsing_benchmarks, _encoding_benchmarks, _projection_benchmarks, _storage_benchmarks,
+              _leagues_benchmarks, _route_benchmarks, _changes_benchmarks]
+
+
+def run(name_filter="", runs=RUNS):
+    """ Runs the benchmarks whose name holds the filter
+
+        :returns Dictionary of the seconds per call and the time relative to the reference workload, per benchmark
+    """
+    results = {}
+    for _ in range(runs):
+        for benchmarks in BENCHMARKS:
+            for name, benchmark, prepare in benchmarks():
+                if name_filter in name:
+                    seconds, reference_seconds = _time(benchmark, prepare)
+                    result = {"seconds": seconds, "relative": seconds / reference_seconds}
+                    if name not in results or result["relative"] < results[name]["relative"]:
+                        results[name] = result
+    return results
+
+
+def save(results, baselines_file=BASELINES_FILE):
+    """ Saves the results as the baselines, keeping the baselines of the benchmarks that were not run """
+    baselines = _load(baselines_file)
+    baselines["benchmarks"].update(results)
+    baselines["python"] = platform.python_version()
+    with open(baselines_file, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baselines_file=BASELINES_FILE, tolerance=TOLERANCE):
+    """ Compares the results with the baselines, relative to the reference workload
+
+        :returns Rows of benchmark name, seconds, change relative to the baseline or None if there is no baseline, and
+        status
+    """
+    baselines = _load(baselines_file)["benchmarks"]
+    rows = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            rows.append((name, result["seconds"], None, "new"))
+            continue
+        change = result["relative"] / baseline["relative"] - 1
+        rows.append((name, result["seconds"], change, "slower" if change > tolerance else "ok"))
+    return rows
+
+
+def _load(baselines_file):
+    if not os.path.exists(baselines_file):
+        return {"benchmarks": {}}
+    with open(baselines_file) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the hot paths of the standings service")
+    parser.add_argument("--save", action="store_true", help="save the results as the baselines")
+    parser.add_argument("--filter", default="", help="run only the benchmarks whose name holds this text")
+    parser.add_argument("--runs", type=int, default=RUNS, help="number of times to run the suite, default %(default)s")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="share by which a benchmark can be slower than its baseline, default %(default)s")
+    parser.add_argument("--baselines", default=BASELINES_FILE, help="baselines file")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.runs)
+    if args.save:
+        save(results, args.baselines)
+        for name, result in results.items():
+            print("{:<50}{:>12.1f} us".format(name, result["seconds"] * 1000000))
+        print("Saved baselines of {} benchmarks to {}".format(len(results), args.baselines))
+        return 0
+
+    rows = compare(results, args.baselines, args.tolerance)
+    print("{:<50}{:>12}{:>10}  {}".format("Benchmark", "us", "Change", "Status"))
+    for name, seconds, change, status in rows:
+        print("{:<50}{:>12.1f}{:>10}  {}".format(name, seconds * 1000000,
+                                                 "-" if change is None else "{:+.0%}".format(change), status))
+    slower = [name for name, _, _, status in rows if status == "slower"]
+    if slower:
+        print("{} benchmark(s) slower than their baseline by more than {:.0%}".format(len(slower), args.tolerance))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
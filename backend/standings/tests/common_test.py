@@ -1,6 +1,13 @@
 from unittest import TestCase
+from unittest import mock
+import json
+import logging
+import os
 
+from backend.standings import common
+from backend.standings.common import SAMPLED
 from backend.standings.common import config
+from backend.standings.common import configure_logger
 from backend.standings.domain.storage.storage import Key
 
 
@@ -22,3 +29,81 @@ class CommonTestCases(TestCase):
 
         self.assertEqual(key, same_key)
         self.assertNotEqual(key, diff_key)
+
+
+class LoggingTestCases(TestCase):
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.directory.name, "standings.log")
+        self.config_file = os.path.join(self.directory.name, "log_config.yaml")
+        root = logging.getLogger()
+        self.root_state = (root.level, list(root.handlers))
+
+    def tearDown(self):
+        common._stop_listener()
+        common._configured_file = None
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.level, handlers = self.root_state
+        for handler in handlers:
+            root.addHandler(handler)
+        self.directory.cleanup()
+
+    def _configure(self, rate):
+        with open(self.config_file, "w") as f:
+            f.write("\n".join([
+                "version: 1",
+                "disable_existing_loggers: false",
+                "formatters:",
+                "  json:",
+                "    (): backend.standings.common.JsonFormatter",
+                "handlers:",
+                "  file:",
+                "    class: logging.FileHandler",
+                "    formatter: json",
+                "    filename: '{}'".format(self.log_file),
+                "root:",
+                "  level: INFO",
+                "  handlers: [file]",
+                "queue: true",
+                "sampling:",
+                "  rate: {}".format(rate),
+            ]))
+        configure_logger(self.config_file)
+
+    def _lines(self):
+        common._stop_listener()
+        with open(self.log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_should_write_structured_lines_on_a_background_thread(self):
+        self._configure(rate=1.0)
+
+        logging.getLogger("standings.test").info("Served %s", "epl_2020", extra={"key": "epl_2020"})
+        lines = self._lines()
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual("Served epl_2020", lines[0]["message"])
+        self.assertEqual("INFO", lines[0]["level"])
+        self.assertEqual("epl_2020", lines[0]["key"])
+
+    def test_should_only_write_a_share_of_sampled_lines(self):
+        self._configure(rate=0.0)
+
+        logger = logging.getLogger("standings.test")
+        logger.info("Per request", extra=SAMPLED)
+        logger.info("Once")
+
+        self.assertEqual(["Once"], [line["message"] for line in self._lines()])
+
+    def test_should_not_format_arguments_of_disabled_levels(self):
+        self._configure(rate=1.0)
+        argument = mock.MagicMock()
+
+        logging.getLogger("standings.test").debug("Standings: %s", argument)
+
+        self.assertEqual([], self._lines())
+        argument.__str__.assert_not_called()
@@ -0,0 +1,146 @@
+from unittest import TestCase
+import datetime
+import json
+import os
+import tempfile
+
+from backend.standings.domain.backfill import Backfill
+from backend.standings.domain.backfill import BackfillCheckpoint
+from backend.standings.domain.backfill import backfill_keys
+from backend.standings.domain.response.parser import NoStandingsException
+from backend.standings.domain.response.parser import PayloadException
+from backend.standings.domain.response.standings import MockStandingsSource
+from backend.standings.domain.storage.freshness import is_live_season
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import database_provider
+from backend.standings.domain.upstream.client import UpstreamException
+from backend.standings.domain.upstream.quota import QuotaExceededException
+from backend.standings.domain.upstream.quota import RateLimitedException
+from backend.standings.tests.stand_ins import StandInMongoDB
+from backend.standings.tests.stand_ins import StandInRedis
+
+
+class StandInSource:
+    """ Answers with mock standings, or raises the error given for a key, once for every error given """
+
+    def __init__(self, errors=None):
+        self.errors = errors if errors is not None else {}
+        self.fetched = []
+
+    def __call__(self, key):
+        self.fetched.append(key)
+        errors = self.errors.get(key, [])
+        if errors:
+            raise errors.pop(0)
+        return MockStandingsSource().get_standings(key)
+
+
+class BackfillTestCases(TestCase):
+    def setUp(self):
+        self.redis, self.mongodb = StandInRedis(), StandInMongoDB()
+        self.database = database_provider(False, redis_cache=RedisCache(redis_client=self.redis),
+                                          mongo_db=self.mongodb)
+        self.keys = backfill_keys(["epl", "seriea"], first_season=2018, last_season=2020)
+        handle, self.checkpoint_file = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        os.remove(self.checkpoint_file)
+
+    def tearDown(self):
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def _backfill(self, source, batch_size=4):
+        return Backfill(source, self.database, checkpoint=BackfillCheckpoint(self.checkpoint_file), concurrency=2,
+                        batch_size=batch_size, sleep=lambda seconds: None)
+
+    def test_should_list_every_season_of_every_league_latest_first(self):
+        self.assertEqual([Key("epl", "2020"), Key("seriea", "2020"), Key("epl", "2019"), Key("seriea", "2019"),
+                          Key("epl", "2018"), Key("seriea", "2018")], self.keys)
+
+    def test_should_store_in_batches_with_one_round_trip_per_tier(self):
+        report = self._backfill(StandInSource()).run(self.keys)
+
+        self.assertEqual(6, report.stored)
+        self.assertEqual(2, report.batches)
+        self.assertEqual(2, self.mongodb.round_trips)
+        self.assertEqual(2, self.redis.round_trips)
+        self.assertEqual({str(key) for key in self.keys}, set(self.mongodb.data))
+        self.assertEqual({str(key) for key in self.keys}, set(self.redis.data))
+
+    def test_should_resume_from_checkpoint(self):
+        source = StandInSource(errors={Key("epl", "2019"): [UpstreamException("Error reading from RapidApi")]})
+
+        first = self._backfill(source).run(self.keys)
+        resumed_source = StandInSource()
+        resumed = self._backfill(resumed_source).run(self.keys)
+
+        self.assertEqual((5, 1), (first.stored, first.failed))
+        self.assertEqual((1, 5), (resumed.stored, resumed.skipped))
+        self.assertEqual([Key("epl", "2019")], resumed_source.fetched)
+
+    def test_should_list_finished_seasons_by_default(self):
+        latest = backfill_keys(["epl"])[0]
+
+        self.assertFalse(is_live_season(latest.season))
+        self.assertTrue(is_live_season(int(latest.season) + 1))
+
+    def test_should_store_live_seasons_as_the_service_does(self):
+        live = Key("epl", str(datetime.date.today().year))
+        redis_cache = self.database.redis_cache
+        backfill = Backfill(StandInSource(), self.database, concurrency=1, batch_size=4,
+                            invalidation_publisher=redis_cache)
+
+        report = backfill.run([live, Key("epl", "2018")])
+
+        self.assertEqual((2, 1), (report.stored, report.batches))
+        self.assertEqual({str(live), "epl_2018"}, set(self.mongodb.data))
+        self.assertEqual(1, len(self.redis.published))
+        self.assertIsNotNone(redis_cache.get_change_versions(live, 0)[0])
+        self.assertIsNone(redis_cache.get_change_versions(Key("epl", "2018"), 0)[0])
+
+    def test_should_remember_keys_without_standings(self):
+        source = StandInSource(errors={Key("seriea", "2018"): [NoStandingsException("No standings")]})
+
+        report = self._backfill(source).run(self.keys)
+
+        self.assertEqual((5, 1), (report.stored, report.empty))
+        with open(self.checkpoint_file) as f:
+            self.assertEqual(["seriea_2018"], json.load(f)["empty"])
+        self.assertEqual([], self._backfill(StandInSource()).plan(self.keys))
+
+    def test_should_fetch_again_responses_that_could_not_be_parsed(self):
+        source = StandInSource(errors={Key("seriea", "2018"): [PayloadException("Truncated response")]})
+
+        report = self._backfill(source).run(self.keys)
+
+        self.assertEqual((5, 0, 1), (report.stored, report.empty, report.failed))
+        self.assertEqual([Key("seriea", "2018")], self._backfill(StandInSource()).plan(self.keys))
+
+    def test_should_fetch_again_when_rate_limited(self):
+        source = StandInSource(errors={Key("epl", "2020"): [RateLimitedException("Rate limit reached")] * 2})
+
+        report = self._backfill(source).run(self.keys)
+
+        self.assertEqual(6, report.stored)
+        self.assertEqual(2, report.rate_limited)
+
+    def test_should_stop_when_quota_is_low(self):
+        errors = {key: [QuotaExceededException("Quota is low")] for key in self.keys[1:]}
+
+        report = self._backfill(StandInSource(errors=errors), batch_size=1).run(self.keys)
+
+        self.assertEqual("Quota is low", report.stopped_reason)
+        self.assertEqual(0, report.failed)
+        self.assertEqual(1, report.stored)
+        self.assertEqual(5, len(self._backfill(StandInSource()).plan(self.keys)))
+
+    def test_dry_run_should_neither_fetch_nor_store(self):
+        source = StandInSource()
+        BackfillCheckpoint(self.checkpoint_file).mark(done=[Key("epl", "2020")])
+
+        report = self._backfill(source).run(self.keys, dry_run=True)
+
+        self.assertEqual((5, 1), (report.planned, report.skipped))
+        self.assertEqual([], source.fetched)
+        self.assertEqual({}, self.mongodb.data)
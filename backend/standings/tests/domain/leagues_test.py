@@ -1,8 +1,12 @@
 from unittest import TestCase
+from unittest import mock
+import json
 import os
+import tempfile
 
 from backend.standings.domain.config import ConfigProvider
 from backend.standings.domain.leagues import League, Leagues
+from backend.standings.domain.leagues import LeagueIndex
 from backend.standings.domain.leagues import LeagueException
 
 
@@ -35,4 +39,83 @@ class LeaguesTestCases(TestCase):
     def test_should_raise_value_error_when_alias_league_does_not_exist(self):
         self.assertRaises(LeagueException, self.leagues.get_league, "rubbish")
 
+    def test_should_return_league_by_id(self):
+        self.assertEqual("Premier League", self.leagues.get_league_by_id(39).__str__())
+        self.assertRaises(LeagueException, self.leagues.get_league_by_id, 0)
 
+    def test_should_return_leagues_in_country(self):
+        self.assertEqual(["Premier League"], [league.__str__() for league in self.leagues.get_leagues_in_country(
+            "England")])
+        self.assertEqual((), self.leagues.get_leagues_in_country("Nowhere"))
+
+    def test_should_not_read_config_file_on_lookup(self):
+        with mock.patch("backend.standings.domain.leagues.ConfigProvider") as config_provider, \
+                mock.patch("os.stat") as stat:
+            self.leagues.get_league("epl")
+            self.leagues.get_aliases()
+
+        config_provider.assert_not_called()
+        stat.assert_not_called()
+
+
+class LeagueIndexTestCases(TestCase):
+    def test_should_index_leagues_by_alias_id_and_country(self):
+        epl = League("England", "Premier League", 39)
+        championship = League("England", "Championship", 40)
+        seriea = League("Italy", "Serie A", 135)
+        index = LeagueIndex({"epl": epl, "championship": championship, "seriea": seriea})
+
+        self.assertIs(epl, index.by_alias["epl"])
+        self.assertIs(seriea, index.by_id[135])
+        self.assertEqual((epl, championship), index.by_country["England"])
+
+    def test_should_not_be_modifiable(self):
+        index = LeagueIndex({"epl": League("England", "Premier League", 39)})
+
+        with self.assertRaises(TypeError):
+            index.by_alias["seriea"] = League("Italy", "Serie A", 135)
+
+
+class LeaguesReloadTestCases(TestCase):
+    """ The leagues are a singleton, so the reload is tested on the instance with its config file swapped for a
+    temporary one, which is restored afterwards """
+
+    def setUp(self):
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        test_config = os.path.abspath(os.path.join(test_dir, '../test_files/test_config.json'))
+        self.leagues = Leagues.get_instance(ConfigProvider(test_config))
+        self.original = (self.leagues.config_file, self.leagues._file_version, self.leagues._index)
+
+        handle, self.config_file = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self._write_config({"England": {"epl": {"id": 39, "name": "Premier League", "type": "league"}}})
+        self.leagues.config_file = self.config_file
+        self.leagues.reload_if_changed()
+
+    def tearDown(self):
+        self.leagues.config_file, self.leagues._file_version, self.leagues._index = self.original
+        os.remove(self.config_file)
+
+    def _write_config(self, leagues_config, mtime_ns=None):
+        with open(self.config_file, "w") as f:
+            json.dump({"leagues": leagues_config}, f)
+        if mtime_ns is not None:
+            os.utime(self.config_file, ns=(mtime_ns, mtime_ns))
+
+    def test_should_not_reload_when_config_file_is_unchanged(self):
+        self.assertFalse(self.leagues.reload_if_changed())
+
+    def test_should_swap_in_leagues_when_config_file_changes(self):
+        self._write_config({"Italy": {"seriea": {"id": 135, "name": "Serie A", "type": "league"}}},
+                           mtime_ns=os.stat(self.config_file).st_mtime_ns + 1000000000)
+
+        self.assertTrue(self.leagues.reload_if_changed())
+        self.assertEqual(["seriea"], self.leagues.get_aliases())
+        self.assertRaises(LeagueException, self.leagues.get_league, "epl")
+
+    def test_should_keep_leagues_when_changed_config_file_is_invalid(self):
+        with open(self.config_file, "w") as f:
+            f.write("{not json")
+
+        self.assertFalse(self.leagues.reload_if_changed())
+        self.assertEqual(["epl"], self.leagues.get_aliases())
@@ -0,0 +1,85 @@
+from unittest import TestCase
+from unittest import mock
+import os
+import subprocess
+import sys
+import tempfile
+
+from prometheus_client import CollectorRegistry
+from prometheus_client import REGISTRY
+from prometheus_client import multiprocess
+
+from backend.standings.domain import metrics
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import LocalCache
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.."))
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTestCases(TestCase):
+    def test_should_time_stages(self):
+        before = _sample("standings_stage_duration_seconds_count", stage=metrics.PARSE)
+
+        with metrics.stage_timer(metrics.PARSE):
+            pass
+
+        self.assertEqual(before + 1, _sample("standings_stage_duration_seconds_count", stage=metrics.PARSE))
+
+    def test_should_count_local_cache_hits_and_misses(self):
+        hits = _sample("standings_cache_lookups_total", tier=metrics.LOCAL_CACHE, result="hit")
+        misses = _sample("standings_cache_lookups_total", tier=metrics.LOCAL_CACHE, result="miss")
+        local_cache = LocalCache()
+        standings = mock.Mock()
+        standings.memory_size.return_value = 2
+
+        local_cache.get(Key("epl", "2020"))
+        local_cache.put(Key("epl", "2020"), standings)
+        local_cache.get(Key("epl", "2020"))
+        local_cache.get(Key("epl", "2020"))
+
+        self.assertEqual(hits + 2, _sample("standings_cache_lookups_total", tier=metrics.LOCAL_CACHE, result="hit"))
+        self.assertEqual(misses + 1, _sample("standings_cache_lookups_total", tier=metrics.LOCAL_CACHE,
+                                             result="miss"))
+
+    def test_should_count_round_trips_of_this_thread(self):
+        with metrics.counting_round_trips() as request:
+            metrics.record_round_trip(metrics.REDIS)
+            with metrics.counting_round_trips() as store:
+                metrics.record_round_trip(metrics.MONGO)
+                metrics.record_round_trip(metrics.REDIS)
+        metrics.record_round_trip(metrics.REDIS)
+
+        self.assertEqual({metrics.MONGO: 1, metrics.REDIS: 1}, store.per_tier)
+        self.assertEqual(3, request.count)
+
+    def test_should_report_quota_when_collected(self):
+        quota = mock.Mock()
+        quota.stats.return_value = {"calls_today": 7, "calls_this_month": 70, "remaining": 30, "limit": None}
+        registry = CollectorRegistry()
+        registry.register(metrics.QuotaCollector(quota))
+        quota.stats.assert_not_called()
+
+        self.assertEqual(7, registry.get_sample_value("standings_upstream_calls_today"))
+        self.assertEqual(30, registry.get_sample_value("standings_upstream_quota_remaining"))
+        self.assertIsNone(registry.get_sample_value("standings_upstream_quota_limit"))
+
+    def test_should_add_up_metrics_of_all_workers(self):
+        worker = ("from backend.standings.domain import metrics\n"
+                  "metrics.LEAGUE_REQUESTS.labels(league='epl').inc(2)\n"
+                  "with metrics.stage_timer(metrics.REDIS_LOOKUP):\n"
+                  "    pass\n")
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            environment = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=metrics_dir, PYTHONPATH=REPO_ROOT)
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", worker], env=environment, check=True)
+
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=metrics_dir)
+
+            self.assertEqual(4, registry.get_sample_value("standings_league_requests_total", {"league": "epl"}))
+            self.assertEqual(2, registry.get_sample_value("standings_stage_duration_seconds_count",
+                                                          {"stage": metrics.REDIS_LOOKUP}))
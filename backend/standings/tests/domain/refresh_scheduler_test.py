@@ -0,0 +1,111 @@
+from unittest import TestCase
+import datetime
+
+from backend.standings.domain.refresh_scheduler import MatchWindow
+from backend.standings.domain.refresh_scheduler import RefreshCadence
+from backend.standings.domain.refresh_scheduler import RefreshScheduler
+from backend.standings.domain.storage.storage import Key
+
+
+def _timestamp(year, month, day, hour):
+    return datetime.datetime(year, month, day, hour, tzinfo=datetime.timezone.utc).timestamp()
+
+
+# A Saturday afternoon in the 2021 season
+SATURDAY_AFTERNOON = _timestamp(2021, 10, 16, 15)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RefreshCadenceTestCases(TestCase):
+    def setUp(self):
+        self.cadence = RefreshCadence(match_window_seconds=300, daytime_seconds=1800, overnight_seconds=7200,
+                                      match_windows=(MatchWindow(days=[5, 6], start_hour=11, end_hour=23),),
+                                      overnight_hours=(0, 8))
+        self.key = Key("epl", "2021")
+
+    def test_should_refresh_often_during_match_windows(self):
+        self.assertEqual(300, self.cadence.interval_seconds(self.key, SATURDAY_AFTERNOON))
+
+    def test_should_refresh_less_often_outside_match_windows(self):
+        self.assertEqual(1800, self.cadence.interval_seconds(self.key, _timestamp(2021, 10, 18, 15)))
+
+    def test_should_refresh_rarely_overnight(self):
+        self.assertEqual(7200, self.cadence.interval_seconds(self.key, _timestamp(2021, 10, 16, 3)))
+
+    def test_should_never_refresh_finished_seasons(self):
+        self.assertIsNone(self.cadence.interval_seconds(Key("epl", "2018"), SATURDAY_AFTERNOON))
+
+    def test_should_build_from_config(self):
+        cadence = RefreshCadence.from_config({"matchWindowSeconds": 60,
+                                              "matchWindows": [{"days": [0], "startHour": 12, "endHour": 20}]})
+
+        self.assertEqual(60, cadence.interval_seconds(self.key, _timestamp(2021, 10, 18, 15)))
+        self.assertEqual(1800, cadence.interval_seconds(self.key, SATURDAY_AFTERNOON))
+
+
+class RefreshSchedulerTestCases(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(SATURDAY_AFTERNOON)
+        self.keys = [Key("epl", "2020"), Key("epl", "2021"), Key("seriea", "2021")]
+        self.refreshed = []
+
+    def _scheduler(self, calls_per_day, refresher=None):
+        return RefreshScheduler(lambda: self.keys, refresher if refresher is not None else self._refresh,
+                                cadence=RefreshCadence(match_window_seconds=300), calls_per_day=calls_per_day,
+                                jitter=0, clock=self.clock, sleep=self.clock.sleep)
+
+    def _refresh(self, key):
+        self.refreshed.append((self.clock(), key))
+
+    def _run_for(self, scheduler, seconds):
+        end = self.clock() + seconds
+        while self.clock() <= end:
+            scheduler.run_once()
+
+    def test_should_spread_first_refreshes_over_the_interval(self):
+        self._run_for(self._scheduler(calls_per_day=24 * 60 * 60), 299)
+
+        self.assertEqual([0, 100, 200], [when - SATURDAY_AFTERNOON for when, _ in self.refreshed])
+
+    def test_should_refresh_every_key_on_the_cadence(self):
+        self._run_for(self._scheduler(calls_per_day=24 * 60 * 60), 900)
+
+        epl_refreshes = [when - SATURDAY_AFTERNOON for when, key in self.refreshed if key == Key("epl", "2020")]
+        self.assertEqual([0, 300, 600, 900], epl_refreshes)
+
+    def test_should_stay_within_quota(self):
+        # 288 calls a day is one call every 5 minutes, for 3 keys that want one every 5 minutes each
+        self._run_for(self._scheduler(calls_per_day=288), 3600)
+
+        times = [when for when, _ in self.refreshed]
+        self.assertTrue(all(later - earlier >= 300 for earlier, later in zip(times, times[1:])), "No bursts")
+        self.assertEqual(13, len(times))
+        self.assertEqual(set(self.keys), set(key for _, key in self.refreshed), "Every key gets its turn")
+
+    def test_should_not_refresh_finished_seasons(self):
+        self.keys.append(Key("epl", "2015"))
+
+        self._run_for(self._scheduler(calls_per_day=24 * 60 * 60), 900)
+
+        self.assertNotIn(Key("epl", "2015"), [key for _, key in self.refreshed])
+
+    def test_should_keep_refreshing_when_a_refresh_fails(self):
+        def refresh(key):
+            self._refresh(key)
+            raise Exception("Upstream is down")
+
+        scheduler = self._scheduler(calls_per_day=24 * 60 * 60, refresher=refresh)
+        self._run_for(scheduler, 600)
+
+        self.assertEqual(len(self.refreshed), scheduler.failures)
+        self.assertEqual(7, scheduler.failures)
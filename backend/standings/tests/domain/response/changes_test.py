@@ -0,0 +1,174 @@
+from unittest import TestCase
+import json
+import time
+
+from backend.standings.domain.response.changes import ChangeFeed
+from backend.standings.domain.response.parser import parse_standings
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload_bytes
+from backend.standings.tests.stand_ins import StandInRedis
+from backend.standings.tests.stand_ins import stand_in_service
+
+
+def _row(rank, name, points):
+    return [rank, rank, name, "{}.png".format(name.lower()), "", points, "Serie A", "WWDLW", "all", 30, 20, 5, 5,
+            60, 20]
+
+
+def _standings(fetched_at, *rows):
+    return Standings.from_rows([_row(*row) for row in rows], fetched_at=fetched_at)
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.key = Key("seriea", "2020")
+        self.redis = StandInRedis()
+        self.change_log = RedisCache(redis_client=self.redis, change_log_length=3)
+        self.feed = ChangeFeed(self.change_log)
+        self.first = _standings(1000.0, (1, "Inter", 70), (2, "Milan", 66), (3, "Atalanta", 64))
+        self.second = _standings(2000.0, (1, "Inter", 73), (2, "Milan", 66), (3, "Atalanta", 65))
+
+    def _changes(self, since, standings):
+        version, payload = self.feed.changes(self.key, since, standings)
+        return version, json.loads(payload)
+
+    def test_should_serve_snapshot_and_seed_empty_change_log(self):
+        version, response = self._changes(0, self.first)
+
+        self.assertEqual(1000000, version)
+        self.assertTrue(response["snapshot"])
+        self.assertEqual(json.loads(self.first.as_json())["standings"], response["standings"])
+        self.assertEqual((1000000, True), self.change_log.get_change_versions(self.key, 1000000))
+
+    def test_should_serve_no_changes_to_client_with_latest_version(self):
+        self.change_log.record_change(self.key, self.first)
+
+        version, response = self._changes(1000000, self.first)
+
+        self.assertEqual({"version": 1000000, "since": 1000000, "snapshot": False, "changes": {}, "removed": []},
+                         response)
+
+    def test_should_serve_only_changed_standings_keyed_by_position(self):
+        self.change_log.record_change(self.key, self.first)
+        self.change_log.record_change(self.key, self.second)
+
+        version, response = self._changes(1000000, self.second)
+
+        self.assertEqual(2000000, version)
+        self.assertFalse(response["snapshot"])
+        self.assertEqual(["1", "3"], sorted(response["changes"]))
+        self.assertEqual(73, response["changes"]["1"]["points"])
+        self.assertEqual([], response["removed"])
+
+    def test_should_serve_positions_not_in_table_anymore(self):
+        self.change_log.record_change(self.key, self.first)
+        smaller = _standings(2000.0, (1, "Inter", 70), (2, "Milan", 66))
+        self.change_log.record_change(self.key, smaller)
+
+        _, response = self._changes(1000000, smaller)
+
+        self.assertEqual({}, response["changes"])
+        self.assertEqual([3], response["removed"])
+
+    def test_should_serve_latest_snapshot_to_client_with_version_not_in_log(self):
+        self.change_log.record_change(self.key, self.first)
+        self.change_log.record_change(self.key, self.second)
+
+        version, response = self._changes(123, self.first)
+
+        self.assertEqual(2000000, version)
+        self.assertTrue(response["snapshot"])
+        self.assertEqual(73, response["standings"]["1"]["points"])
+
+    def test_should_keep_responses_for_next_clients(self):
+        self.change_log.record_change(self.key, self.first)
+        self.change_log.record_change(self.key, self.second)
+        first_payload = self.feed.changes(self.key, 1000000, self.second)[1]
+        round_trips = self.redis.round_trips
+
+        self.assertEqual(first_payload, self.feed.changes(self.key, 1000000, self.second)[1])
+        # Only the versions are read again
+        self.assertEqual(1, self.redis.round_trips - round_trips)
+
+    def test_should_keep_at_most_max_encodings_responses(self):
+        feed = ChangeFeed(self.change_log, max_encodings=1)
+        self.change_log.record_change(self.key, self.first)
+        self.change_log.record_change(self.key, self.second)
+
+        feed.changes(self.key, 1000000, self.second)
+        feed.changes(self.key, 123, self.second)
+
+        self.assertEqual([(self.key, 2000000, None)], list(feed._encodings))
+
+    def test_should_always_serve_snapshots_without_change_log(self):
+        feed = ChangeFeed()
+
+        version, payload = feed.changes(self.key, 1000000, self.second)
+
+        self.assertEqual(2000000, version)
+        self.assertTrue(json.loads(payload)["snapshot"])
+
+
+class ChangesViewTestCases(TestCase):
+    path = "/standings/epl/2020/changes"
+
+    def setUp(self):
+        app, self.redis, self.mongodb, self.rapid_api, self.local_cache = stand_in_service(rapidapi_payload_bytes())
+        self.client = app.test_client()
+
+    def _get(self, since=None):
+        response = self.client.get(self.path, query_string={} if since is None else {"since": since})
+        return response, json.loads(response.data)
+
+    def _change_two_standings(self):
+        from backend.standings import views
+        payload = rapidapi_payload()
+        table = payload["response"][0]["league"]["standings"][0]
+        table[5]["points"] += 3
+        table[9]["all"]["win"] += 1
+        views.storage.store(Key("epl", "2020"), parse_standings(json.dumps(payload).encode(),
+                                                                fetched_at=time.time() + 60))
+
+    def test_should_serve_snapshot_to_client_without_version(self):
+        response, payload = self._get()
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(payload["snapshot"])
+        self.assertEqual(20, len(payload["standings"]))
+        self.assertEqual(str(payload["version"]), response.headers["X-Standings-Version"])
+        self.assertIn("max-age", response.headers["Cache-Control"])
+
+    def test_should_serve_no_changes_to_client_with_latest_version(self):
+        version = self._get()[1]["version"]
+
+        response, payload = self._get(version)
+
+        self.assertEqual({"version": version, "since": version, "snapshot": False, "changes": {}, "removed": []},
+                         payload)
+
+    def test_should_serve_only_standings_that_changed(self):
+        version = self._get()[1]["version"]
+        self._change_two_standings()
+
+        response, payload = self._get(version)
+
+        self.assertFalse(payload["snapshot"])
+        self.assertGreater(payload["version"], version)
+        self.assertEqual(["10", "6"], sorted(payload["changes"]))
+        self.assertEqual(str(payload["version"]), response.headers["X-Standings-Version"])
+
+    def test_should_serve_snapshot_to_client_with_unknown_version(self):
+        self._get()
+        self._change_two_standings()
+
+        response, payload = self._get(123)
+
+        self.assertTrue(payload["snapshot"])
+        self.assertEqual(str(payload["version"]), response.headers["X-Standings-Version"])
+
+    def test_should_refuse_version_that_is_not_a_number_and_invalid_season(self):
+        self.assertEqual(400, self.client.get(self.path, query_string={"since": "abc"}).status_code)
+        self.assertEqual(400, self.client.get("/standings/epl/1999/changes").status_code)
@@ -0,0 +1,41 @@
+from unittest import TestCase
+import datetime
+
+from backend.standings.domain.response.http_caching import CachePolicy
+from backend.standings.domain.response.http_caching import accepts_gzip
+from backend.standings.domain.response.http_caching import etag
+from backend.standings.domain.response.http_caching import http_date
+from backend.standings.domain.response.http_caching import is_not_modified
+
+
+class HttpCachingTestCases(TestCase):
+
+    def test_should_match_same_entity_tag(self):
+        entity_tag = etag("abc")
+
+        self.assertTrue(is_not_modified('W/"abc"', entity_tag))
+        self.assertTrue(is_not_modified('"abc"', entity_tag))
+        self.assertTrue(is_not_modified('W/"xyz", W/"abc"', entity_tag))
+        self.assertTrue(is_not_modified('*', entity_tag))
+
+    def test_should_not_match_other_or_missing_entity_tags(self):
+        entity_tag = etag("abc")
+
+        self.assertFalse(is_not_modified(None, entity_tag))
+        self.assertFalse(is_not_modified('W/"xyz"', entity_tag))
+
+    def test_should_accept_gzip_unless_its_quality_is_zero(self):
+        for accept_encoding in ("gzip", "deflate, gzip;q=0.5", "br;q=1.0, GZIP", "*", "identity, *;q=0.1"):
+            self.assertTrue(accepts_gzip(accept_encoding), accept_encoding)
+        for accept_encoding in (None, "", "gzip;q=0", "deflate, gzip; q=0.0", "br", "*;q=0", "gzip;q=0, *",
+                                "gzip;q=high"):
+            self.assertFalse(accepts_gzip(accept_encoding), accept_encoding)
+
+    def test_should_cache_finished_seasons_longer_than_live_ones(self):
+        policy = CachePolicy.from_config({"live": "public, max-age=30"})
+
+        self.assertEqual("public, max-age=30", policy.cache_control(datetime.date.today().year))
+        self.assertIn("max-age=86400", policy.cache_control(2010))
+
+    def test_should_format_http_dates(self):
+        self.assertEqual("Thu, 01 Jan 1970 00:00:00 GMT", http_date(0))
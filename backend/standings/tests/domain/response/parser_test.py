@@ -0,0 +1,68 @@
+from unittest import TestCase
+import gzip
+import json
+
+from backend.standings.domain.response.parser import NoStandingsException
+from backend.standings.domain.response.parser import PayloadException
+from backend.standings.domain.response.parser import parse_standings
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.response.standings import standing_builder
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload
+
+
+class ParserTests(TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ParserTests, self).__init__(*args, **kwargs)
+        self.payload = rapidapi_payload(teams=4)
+
+    def _body(self, payload=None):
+        return json.dumps(self.payload if payload is None else payload).encode()
+
+    def test_should_parse_the_standings_the_builder_builds(self):
+        standings = Standings()
+        for standing_response in self.payload['response'][0]['league']['standings'][0]:
+            standings.add(standing_builder(standing_response))
+
+        parsed = parse_standings(self._body(), fetched_at=100.0)
+
+        self.assertEqual(standings.as_json_bytes(), parsed.as_json_bytes())
+        self.assertEqual(standings.get_all(), parsed.get_all())
+        self.assertEqual(standings, parsed)
+        self.assertEqual(100.0, parsed.get_fetched_at())
+
+    def test_should_parse_gzip_compressed_bodies(self):
+        self.assertEqual(parse_standings(self._body()), parse_standings(gzip.compress(self._body())))
+
+    def test_should_parse_every_group(self):
+        parsed = parse_standings(self._body(rapidapi_payload(teams=4, groups=3)))
+
+        self.assertEqual(list(range(1, 13)), list(parsed.get_all().keys()))
+        self.assertEqual(["Group A", "Group B", "Group C"], sorted({standing.get_group()
+                                                                   for standing in parsed.get_all().values()}))
+        self.assertEqual(1, parsed.get_all()[5].get_rank())
+
+    def test_should_accept_standings_without_form(self):
+        self.payload['response'][0]['league']['standings'][0][0]['form'] = None
+
+        self.assertIsNone(parse_standings(self._body()).get_all()[1].get_form())
+
+    def test_should_raise_error_if_field_missing(self):
+        del self.payload['response'][0]['league']['standings'][0][2]['all']['goals']
+
+        self.assertRaises(PayloadException, parse_standings, self._body())
+
+    def test_should_raise_error_if_field_of_wrong_type(self):
+        self.payload['response'][0]['league']['standings'][0][1]['points'] = "44"
+
+        self.assertRaises(PayloadException, parse_standings, self._body())
+
+    def test_should_raise_error_if_no_standings_in_response(self):
+        self.assertRaises(NoStandingsException, parse_standings, self._body({"response": [], "errors": []}))
+        self.assertRaises(PayloadException, parse_standings, b"<html></html>")
+
+    def test_should_not_take_errors_or_truncated_body_for_no_standings(self):
+        errors = self._body({"response": [], "errors": {"requests": "You have reached the request limit"}})
+        for body in (errors, self._body()[:200]):
+            with self.assertRaises(PayloadException) as raised:
+                parse_standings(body)
+            self.assertNotIsInstance(raised.exception, NoStandingsException)
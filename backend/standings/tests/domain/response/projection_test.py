@@ -0,0 +1,98 @@
+from unittest import TestCase
+import json
+
+from backend.standings.domain.response.projection import Projection
+from backend.standings.domain.response.projection import ProjectionEncodings
+from backend.standings.domain.response.projection import ProjectionException
+from backend.standings.domain.response.projection import resolve_field
+from backend.standings.domain.response.standings import Standings
+
+
+def _row(rank, name, points, goals_for, goals_against, group="Serie A"):
+    return [rank, rank, name, "{}.png".format(name.lower()), "", points, group, "WWDLW", "all", 30, 20, 5, 5,
+            goals_for, goals_against]
+
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        self.standings = Standings.from_rows([_row(1, "Inter", 70, 60, 20), _row(2, "Milan", 66, 70, 30),
+                                              _row(3, "Atalanta", 66, 80, 35), _row(4, "Juventus", 60, 50, 25)])
+        self.table = self.standings.get_table()
+
+    def _served(self, projection):
+        return json.loads(projection.as_json_bytes(self.table))["standings"]
+
+    def test_should_resolve_fields_by_path_last_part_or_group(self):
+        self.assertEqual(["team.name"], resolve_field("team.name"))
+        self.assertEqual(["record.goal_diff"], resolve_field("goal_diff"))
+        self.assertEqual(["team.id_", "team.name", "team.logo", "team.homepage"], resolve_field("team"))
+        self.assertRaises(ProjectionException, resolve_field, "homepage.url")
+
+    def test_should_serve_fields_asked_for_nested_as_in_full_standings(self):
+        projection = Projection.from_args({"fields": "rank,team.name,points", "top": "2"})
+
+        self.assertEqual([{"rank": 1, "team": {"name": "Inter"}, "points": 70},
+                          {"rank": 2, "team": {"name": "Milan"}, "points": 66}], self._served(projection))
+
+    def test_should_serve_every_field_of_full_standings(self):
+        projection = Projection.from_args({"top": "1"})
+
+        full = json.loads(self.standings.as_json())["standings"]["1"]
+
+        self.assertEqual([full], self._served(projection))
+
+    def test_should_sort_by_any_field_keeping_table_order_for_ties(self):
+        by_goal_diff = Projection.from_args({"fields": "name", "sort": "-goal_diff"})
+        by_points = Projection.from_args({"fields": "name", "sort": "points"})
+
+        self.assertEqual(["Atalanta", "Inter", "Milan", "Juventus"],
+                         [standing["team"]["name"] for standing in self._served(by_goal_diff)])
+        self.assertEqual(["Juventus", "Milan", "Atalanta", "Inter"],
+                         [standing["team"]["name"] for standing in self._served(by_points)])
+
+    def test_should_serve_range_of_ranks(self):
+        projection = Projection.from_args({"fields": "rank", "ranks": "2-3"})
+
+        self.assertEqual([{"rank": 2}, {"rank": 3}], self._served(projection))
+        self.assertEqual([{"rank": 4}], self._served(Projection.from_args({"fields": "rank", "ranks": "4"})))
+
+    def test_should_keep_encodings_apart_from_the_standings(self):
+        encodings = ProjectionEncodings()
+        self.standings.get_digest()
+        size = self.standings.memory_size()
+
+        encoded = encodings.as_json_bytes(self.standings, Projection.from_args({"fields": "rank", "top": "2"}))
+
+        self.assertIs(encoded, encodings.as_json_bytes(self.standings,
+                                                       Projection.from_args({"fields": "rank", "top": "2"})))
+        self.assertEqual(size, self.standings.memory_size())
+        self.assertEqual([(self.standings.get_digest(), Projection.from_args({"fields": "rank", "top": "2"}).tag())],
+                         list(encodings._encodings))
+        self.assertNotEqual(Projection.from_args({"fields": "rank", "top": "2"}).tag(),
+                            Projection.from_args({"fields": "rank", "top": "3"}).tag())
+
+    def test_should_keep_encodings_of_standings_apart(self):
+        encodings = ProjectionEncodings()
+        other = Standings.from_rows([_row(1, "Milan", 70, 60, 20)])
+        projection = Projection.from_args({"fields": "name", "top": "1"})
+
+        self.assertEqual([{"team": {"name": "Inter"}}],
+                         json.loads(encodings.as_json_bytes(self.standings, projection))["standings"])
+        self.assertEqual([{"team": {"name": "Milan"}}],
+                         json.loads(encodings.as_json_bytes(other, projection))["standings"])
+
+    def test_should_drop_least_recently_used_encodings(self):
+        encodings = ProjectionEncodings(max_encodings=2)
+        for top in range(1, 4):
+            encodings.as_json_bytes(self.standings, Projection.from_args({"top": str(top)}))
+
+        self.assertEqual([Projection.from_args({"top": str(top)}).tag() for top in (2, 3)],
+                         [tag for _, tag in encodings._encodings])
+
+    def test_should_not_project_without_parameters(self):
+        self.assertIsNone(Projection.from_args({"pretty": "true"}))
+
+    def test_should_refuse_invalid_parameters(self):
+        for args in [{"fields": "bogus"}, {"fields": ","}, {"sort": "team"}, {"top": "0"}, {"top": "five"},
+                     {"ranks": "20-15"}, {"ranks": "-3"}]:
+            self.assertRaises(ProjectionException, Projection.from_args, args)
@@ -1,6 +1,8 @@
 from unittest import TestCase
 from unittest import mock
+import gzip
 import json
+import pickle
 
 from backend.standings.domain.response.standings import Record
 from backend.standings.domain.response.standings import Records
@@ -122,6 +124,26 @@ class StandingTests(TestCase):
         new_standing = Standing(rank=3, team=self.team, points=90, group="Serie A", form="WWWWD", records=self.records)
         self.assertNotEqual(self.standing, new_standing)
 
+    def test_standing_has_no_instance_dictionary(self):
+        self.assertFalse(hasattr(self.standing, '__dict__'))
+        self.assertFalse(hasattr(self.team, '__dict__'))
+        self.assertFalse(hasattr(self.standing.record, '__dict__'))
+
+    def test_json_keeps_the_order_of_the_fields(self):
+        self.assertEqual(["rank", "team", "points", "group", "form", "record"], list(json.loads(str(self.standing))))
+        self.assertEqual({"id_": 2, "name": "Inter", "logo": "https://media.api-sports.io/football/teams/505.png",
+                          "homepage": "https://www.inter.it/en"}, json.loads(str(self.standing))["team"])
+
+    def test_standing_survives_pickling(self):
+        self.assertEqual(self.standing, pickle.loads(pickle.dumps(self.standing)))
+
+    def test_standing_pickled_as_a_dictionary_is_loaded(self):
+        # Standings pickled before the fields were slots
+        team = Team.__new__(Team)
+        team.__setstate__({"id_": 2, "name": "Inter", "logo": "team.png", "homepage": ""})
+
+        self.assertEqual(Team(2, "Inter", "team.png"), team)
+
 
 class StandingsTests(TestCase):
     def __init__(self, *args, **kwargs):
@@ -137,4 +159,137 @@ class StandingsTests(TestCase):
         standings.add(mock_standing)
         self.assertFalse(standings.is_empty())
 
+    def test_json_only_holds_the_standings(self):
+        standings = Standings()
+        self.assertEqual({"standings": {}}, json.loads(standings.as_json()))
+        self.assertGreater(standings.get_fetched_at(), 0)
+
+    def test_json_is_encoded_again_once_standing_added(self):
+        standings = Standings()
+        empty_json = standings.as_json()
+
+        standings.add(StandingTests().standing)
+
+        self.assertIs(standings.as_json_bytes(), standings.as_json_bytes())
+        self.assertNotEqual(empty_json, standings.as_json())
+
+    def test_pretty_json_holds_the_same_standings(self):
+        standings = Standings()
+        standings.add(StandingTests().standing)
+
+        self.assertEqual(json.loads(standings.as_json()), json.loads(standings.as_json(pretty=True)))
+        self.assertNotIn("\n", standings.as_json())
+
+    def test_gzip_bytes_decompress_to_compact_json(self):
+        standings = Standings()
+        standings.add(StandingTests().standing)
+
+        self.assertEqual(standings.as_json_bytes(), gzip.decompress(standings.as_gzip_bytes()))
+
+    def test_digest_changes_with_content(self):
+        standings = Standings()
+        empty_digest = standings.get_digest()
+
+        standings.add(StandingTests().standing)
+
+        self.assertEqual(Standings().get_digest(), empty_digest)
+        self.assertNotEqual(empty_digest, standings.get_digest())
+
+    def test_standings_with_different_ranks_are_not_equal(self):
+        standing = StandingTests().standing
+        standings = Standings().add(standing)
+        more_standings = Standings().add(standing).add(Standing(rank=2, team=Team(3, 'Milan', 'milan.png'), points=79,
+                                                                group="Serie A", form="WDWWL",
+                                                                records=StandingTests().records))
+
+        self.assertNotEqual(standings, more_standings)
+        self.assertNotEqual(more_standings, standings)
 
+    def test_standings_fetched_at_different_times_are_equal(self):
+        standings = Standings().add(StandingTests().standing)
+        fetched_later = Standings().add(StandingTests().standing)
+        fetched_later.fetched_at = standings.get_fetched_at() + 60
+
+        self.assertEqual(standings, fetched_later)
+        self.assertEqual(standings.get_digest(), fetched_later.get_digest())
+
+    def test_standings_added_one_by_one_and_built_from_table_have_same_digest(self):
+        milan = Standing(rank=2, team=Team(3, 'Milan', 'milan.png'), points=79, group="Serie A", form="WDWWL",
+                         records=StandingTests().records)
+        inter = StandingTests().standing
+        added = Standings().add(milan).add(inter)
+
+        for rows in ([inter.as_row(), milan.as_row()], [milan.as_row(), inter.as_row()]):
+            self.assertEqual(added.get_digest(), Standings.from_rows(rows).get_digest())
+        self.assertEqual(added.get_digest(), Standings().add(inter).add(milan).get_digest())
+
+    def test_digest_is_not_worked_out_again(self):
+        standings = Standings().add(StandingTests().standing)
+
+        with mock.patch.object(Standing, 'as_row') as as_row:
+            standings.set_digest("0" * 32)
+            self.assertEqual(standings, standings)
+            as_row.assert_not_called()
+
+    def test_digest_does_not_depend_on_stored_json(self):
+        standings = Standings().add(StandingTests().standing)
+        digest = standings.get_digest()
+
+        standings.set_json_bytes(b'{"standings":{}}')
+
+        self.assertEqual(digest, standings.get_digest())
+
+    def test_standings_from_rows_build_standing_objects_when_asked_for_them(self):
+        standings = Standings().add(StandingTests().standing)
+
+        from_rows = Standings.from_rows(standings.get_rows(), fetched_at=100.0)
+
+        self.assertNotIn('standings', from_rows.__dict__)
+        self.assertEqual(standings.as_json_bytes(), from_rows.as_json_bytes())
+        self.assertEqual(standings.get_digest(), from_rows.get_digest())
+        self.assertEqual(standings.get_all(), from_rows.get_all())
+        self.assertEqual(100.0, from_rows.get_fetched_at())
+
+    def test_standings_from_rows_survive_pickling(self):
+        standings = Standings().add(StandingTests().standing)
+
+        unpickled = pickle.loads(pickle.dumps(Standings.from_rows(standings.get_rows())))
+
+        self.assertEqual(standings, unpickled)
+        self.assertEqual(standings.get_all(), unpickled.get_all())
+
+    def test_standing_added_to_standings_from_rows_is_kept(self):
+        standings = Standings.from_rows([])
+        self.assertTrue(standings.is_empty())
+
+        standings.add(StandingTests().standing)
+
+        self.assertFalse(standings.is_empty())
+        self.assertEqual([StandingTests().standing.as_row()], standings.get_rows())
+
+    def test_table_is_built_again_once_standing_added(self):
+        standings = Standings()
+        table = standings.get_table()
+        self.assertIs(table, standings.get_table())
+
+        standings.add(StandingTests().standing)
+
+        self.assertEqual(1, standings.get_table().size)
+        self.assertEqual([51], standings.get_table().columns["record.goal_diff"])
+
+    def test_memory_size_counts_everything_kept_with_standings(self):
+        standings = Standings.from_rows([StandingTests().standing.as_row()])
+        listener = mock.Mock()
+        standings.listen_to_growth(listener)
+        sizes = [standings.memory_size()]
+
+        for keep in (standings.as_json_bytes, standings.as_gzip_bytes, standings.get_all, standings.get_table,
+                     lambda: standings.get_table().order("points")):
+            keep()
+            sizes.append(standings.memory_size())
+
+        self.assertEqual(sorted(set(sizes)), sizes)
+        self.assertEqual(5, listener.call_count)
+        standings.as_json_bytes()
+        self.assertEqual(5, listener.call_count)
+        self.assertIsNone(pickle.loads(pickle.dumps(standings))._growth_listener)
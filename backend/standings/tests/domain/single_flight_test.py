@@ -0,0 +1,141 @@
+from unittest import TestCase
+from unittest import mock
+import threading
+import time
+
+from backend.standings.domain.single_flight import SingleFlight
+
+
+class SingleFlightTestCases(TestCase):
+
+    def test_concurrent_callers_share_a_single_fetch(self):
+        single_flight = SingleFlight()
+        fetches = []
+        release = threading.Event()
+
+        def fetch():
+            fetches.append(1)
+            release.wait(1)
+            return "standings"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(single_flight.do("epl_2020", fetch)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(fetches))
+        self.assertEqual(["standings"] * 10, results)
+
+    def test_fetch_error_is_raised_for_all_waiting_callers(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+
+        def fetch():
+            release.wait(1)
+            raise ValueError("upstream error")
+
+        errors = []
+
+        def call():
+            try:
+                single_flight.do("epl_2020", fetch)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(5, len(errors))
+
+    def test_fetches_again_once_previous_fetch_is_done(self):
+        single_flight = SingleFlight()
+        fetch = mock.Mock(return_value="standings")
+
+        single_flight.do("epl_2020", fetch)
+        single_flight.do("epl_2020", fetch)
+
+        self.assertEqual(2, fetch.call_count)
+
+    def test_lease_holder_fetches_and_releases_lease(self):
+        lease_provider = mock.Mock()
+        lease_provider.acquire_lease.return_value = True
+        single_flight = SingleFlight(lease_provider=lease_provider)
+
+        result = single_flight.do("epl_2020", lambda: "standings")
+
+        self.assertEqual("standings", result)
+        lease_provider.release_lease.assert_called_once()
+
+    def test_waits_for_other_worker_when_lease_is_held(self):
+        lease_provider = mock.Mock()
+        lease_provider.acquire_lease.return_value = False
+        lookup = mock.Mock(side_effect=[None, None, "standings"])
+        fetch = mock.Mock()
+        single_flight = SingleFlight(lease_provider=lease_provider, poll_interval_seconds=0.01)
+
+        result = single_flight.do("epl_2020", fetch, lookup=lookup)
+
+        self.assertEqual("standings", result)
+        fetch.assert_not_called()
+        lease_provider.release_lease.assert_not_called()
+
+    def test_serves_last_stored_value_when_waiting_for_other_worker_times_out(self):
+        lease_provider = mock.Mock()
+        lease_provider.acquire_lease.return_value = False
+        fetch = mock.Mock()
+        single_flight = SingleFlight(lease_provider=lease_provider, wait_seconds=0.05, poll_interval_seconds=0.01)
+
+        result = single_flight.do("epl_2020", fetch, lookup=lambda: None, fallback=lambda: "stale standings")
+
+        self.assertEqual("stale standings", result)
+        fetch.assert_not_called()
+
+    def test_fetches_only_with_lease_when_waiting_for_other_worker_times_out(self):
+        lease_provider = mock.Mock()
+        lease_provider.acquire_lease.side_effect = [False] * 10 + [True]
+        fetch = mock.Mock(return_value="standings")
+        single_flight = SingleFlight(lease_provider=lease_provider, wait_seconds=0.02, poll_interval_seconds=0.01)
+
+        result = single_flight.do("epl_2020", fetch, lookup=lambda: None, fallback=lambda: None)
+
+        self.assertEqual("standings", result)
+        self.assertEqual(11, lease_provider.acquire_lease.call_count)
+        fetch.assert_called_once()
+
+    def test_callers_that_time_out_waiting_in_process_do_not_fetch(self):
+        single_flight = SingleFlight(lease_seconds=0, wait_seconds=0.05)
+        fetches = []
+        release = threading.Event()
+
+        def fetch():
+            fetches.append(1)
+            release.wait(1)
+            return "standings"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight.do("epl_2020", fetch)))
+        leader.start()
+        time.sleep(0.02)
+        followers = [threading.Thread(target=lambda: results.append(single_flight.do("epl_2020", fetch)))
+                     for _ in range(8)]
+        stale_follower = threading.Thread(target=lambda: results.append(
+            single_flight.do("epl_2020", fetch, fallback=lambda: "stale standings")))
+        for thread in followers + [stale_follower]:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in [leader, stale_follower] + followers:
+            thread.join()
+
+        self.assertEqual(1, len(fetches))
+        self.assertEqual(["stale standings"] + ["standings"] * 9, sorted(results))
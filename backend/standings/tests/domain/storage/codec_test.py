@@ -0,0 +1,76 @@
+from unittest import TestCase
+import json
+import pickle
+import struct
+import zlib
+
+from backend.standings.domain.response.standings import MockStandingsSource
+from backend.standings.domain.storage.codec import CodecError
+from backend.standings.domain.storage.codec import CompactCodec
+from backend.standings.domain.storage.codec import MAGIC
+from backend.standings.domain.storage.storage import Key
+
+
+class CompactCodecTestCases(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(CompactCodecTestCases, self).__init__(*args, **kwargs)
+        self.standings = MockStandingsSource().get_standings(Key("epl", "2020"))
+
+    def _assert_same_standings(self, decoded):
+        self.assertEqual(self.standings, decoded)
+        self.assertEqual(self.standings.as_json(), decoded.as_json())
+        self.assertEqual(self.standings.get_fetched_at(), decoded.get_fetched_at())
+
+    def test_should_decode_what_it_encodes(self):
+        for codec in [CompactCodec(compress=True), CompactCodec(compress=False)]:
+            self._assert_same_standings(codec.decode(codec.encode(self.standings)))
+
+    def test_should_be_smaller_than_pickle(self):
+        self.assertLess(len(CompactCodec().encode(self.standings)), len(pickle.dumps(self.standings)))
+
+    def test_should_decode_pickled_standings(self):
+        self._assert_same_standings(CompactCodec().decode(pickle.dumps(self.standings)))
+
+    def test_should_refuse_pickled_standings_if_not_allowed(self):
+        codec = CompactCodec(allow_pickle=False)
+        self.assertRaises(CodecError, codec.decode, pickle.dumps(self.standings))
+
+    def test_should_refuse_unknown_versions(self):
+        encoded = CompactCodec().encode(self.standings)
+        self.assertRaises(CodecError, CompactCodec().decode, MAGIC + bytes([99]) + encoded[len(MAGIC) + 1:])
+
+    def test_should_keep_json_response_stored_alongside(self):
+        codec = CompactCodec()
+
+        decoded = codec.decode(codec.encode(self.standings))
+
+        self.assertIsNotNone(decoded._json_bytes)
+        self.assertEqual(self.standings.as_json_bytes(), decoded.as_json_bytes())
+
+    def test_should_keep_digest_stored_alongside(self):
+        codec = CompactCodec()
+
+        decoded = codec.decode(codec.encode(self.standings))
+
+        self.assertIsNotNone(decoded._digest)
+        self.assertEqual(self.standings.get_digest(), decoded.get_digest())
+
+    def test_should_decode_version_2_encodings(self):
+        rows = json.dumps([1.5, [[1, 2, "Inter", "logo.png", "", 88, "Serie A", "WWWWD", "all", 36, 27, 7, 2, 82, 31]]])
+        body = struct.pack(">I", 2) + b"{}" + rows.encode()
+        encoded = MAGIC + bytes([2, 1]) + zlib.compress(body)
+
+        decoded = CompactCodec().decode(encoded)
+
+        self.assertEqual(b"{}", decoded.as_json_bytes())
+        self.assertEqual(88, decoded.get_all()[1].get_points())
+
+    def test_should_decode_version_1_encodings(self):
+        rows = json.dumps([1.5, [[1, 2, "Inter", "logo.png", "", 88, "Serie A", "WWWWD", "all", 36, 27, 7, 2, 82, 31]]])
+        encoded = MAGIC + bytes([1, 1]) + zlib.compress(rows.encode())
+
+        decoded = CompactCodec().decode(encoded)
+
+        self.assertEqual(88, decoded.get_all()[1].get_points())
+        self.assertEqual(1.5, decoded.get_fetched_at())
@@ -0,0 +1,49 @@
+from unittest import TestCase
+import datetime
+
+from backend.standings.domain.storage.freshness import FreshnessPolicy
+from backend.standings.domain.storage.freshness import NEVER_EXPIRES
+from backend.standings.domain.storage.freshness import SeasonFreshnessPolicies
+from backend.standings.domain.storage.freshness import is_live_season
+from backend.standings.domain.storage.storage import Key
+
+
+class FreshnessPolicyTestCases(TestCase):
+
+    def test_should_be_stale_but_not_expired_between_deadlines(self):
+        policy = FreshnessPolicy(soft_ttl_seconds=300, hard_ttl_seconds=3600)
+
+        self.assertFalse(policy.is_stale(fetched_at=1000, now=1200))
+        self.assertTrue(policy.is_stale(fetched_at=1000, now=1400))
+        self.assertFalse(policy.is_expired(fetched_at=1000, now=1400))
+        self.assertTrue(policy.is_expired(fetched_at=1000, now=5000))
+
+    def test_should_never_be_stale_without_ttl(self):
+        self.assertFalse(NEVER_EXPIRES.is_stale(fetched_at=0))
+        self.assertFalse(NEVER_EXPIRES.is_expired(fetched_at=0))
+
+
+class SeasonFreshnessPoliciesTestCases(TestCase):
+
+    def test_should_tell_live_seasons_apart_from_finished_ones(self):
+        today = datetime.date(2021, 3, 1)
+
+        self.assertTrue(is_live_season("2021", today))
+        self.assertTrue(is_live_season("2020", today))
+        self.assertFalse(is_live_season("2019", today))
+
+    def test_should_never_expire_finished_seasons(self):
+        policies = SeasonFreshnessPolicies()
+
+        self.assertIs(NEVER_EXPIRES, policies(Key("epl", "2010")))
+
+    def test_should_use_league_policy_when_configured(self):
+        policies = SeasonFreshnessPolicies.from_config({
+            "live": {"softSeconds": 300, "hardSeconds": 86400},
+            "leagues": {"epl": {"live": {"softSeconds": 60}}}
+        })
+        current_season = datetime.date.today().year
+
+        self.assertEqual(60, policies(Key("epl", current_season)).soft_ttl_seconds)
+        self.assertEqual(300, policies(Key("seriea", current_season)).soft_ttl_seconds)
+        self.assertIs(NEVER_EXPIRES, policies(Key("epl", "2010")))
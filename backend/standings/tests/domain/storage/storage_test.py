@@ -1,14 +1,33 @@
 from unittest import TestCase
 from unittest import mock
+import threading
+import time
 
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from backend.standings.domain import metrics
+from backend.standings.domain.response.standings import MockStandingsSource
+from backend.standings.domain.response.standings import Standings
+from backend.standings.domain.storage.freshness import FreshnessPolicy
 from backend.standings.domain.storage.storage import Database
 from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import LocalCache
+from backend.standings.domain.storage.storage import MongoDB
+from backend.standings.domain.storage.storage import NOT_READ
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import RedisHealth
 from backend.standings.domain.storage.storage import Storage
+from backend.standings.domain.storage.storage import _WORKER_ID
 from backend.standings.domain.storage.storage import database_provider
+from backend.standings.domain.storage.storage import from_binary
+from backend.standings.domain.storage.storage import to_binary
+from backend.standings.tests.stand_ins import StandInMongoDB
+from backend.standings.tests.stand_ins import StandInRedis
 
 
-def _test_storage(type_, redis_cache=None, mongodb=None):
-    return Storage(database_provider(Database.is_in_memory(type_), redis_cache, mongodb))
+def _test_storage(type_, redis_cache=None, mongodb=None, freshness_policy=None, refresher=None):
+    return Storage(database_provider(Database.is_in_memory(type_), redis_cache, mongodb),
+                   freshness_policy=freshness_policy, refresher=refresher)
 
 
 class StorageTestCases(TestCase):
@@ -55,32 +74,34 @@ class StorageTestCases(TestCase):
     @mock.patch('backend.standings.domain.response.standings.Standings')
     def test_should_write_to_cache_and_database_if_entry_does_not_exist(self, redis_cache, mongodb, mock_standings):
         # given
-        redis_cache.get.return_value = None
-        mongodb.read.return_value = None
+        mongodb.write.return_value = None
 
         # when
         real_db = _test_storage("real_database", redis_cache, mongodb)
-        real_db.store(self.key, mock_standings)
+        changed = real_db.store(self.key, mock_standings)
 
         # then
-        redis_cache.put.assert_called_with(self.key, mock_standings)
-        mongodb.write.assert_called_with(self.key, mock_standings)
+        self.assertTrue(changed)
+        redis_cache.put.assert_called_with(self.key, mock_standings, publish_invalidation=False,
+                                           record_change=True)
+        mongodb.write.assert_called_with(self.key, mock_standings, return_previous_digest=True)
+        redis_cache.get.assert_not_called()
+        mongodb.read.assert_not_called()
 
     @mock.patch('backend.standings.domain.storage.storage.RedisCache')
     @mock.patch('backend.standings.domain.storage.storage.MongoDB')
     @mock.patch('backend.standings.domain.response.standings.Standings')
-    def test_should_write_only_to_cache_if_entry_only_exist_in_db(self, redis_cache, mongodb, mock_standings):
-        # given
-        redis_cache.get.return_value = None
-        mongodb.read.return_value = mock_standings
-
+    def test_should_write_through_unchanged_entry_known_to_the_caller(self, redis_cache, mongodb, mock_standings):
         # when
         real_db = _test_storage("real_database", redis_cache, mongodb)
-        real_db.store(self.key, mock_standings)
+        changed = real_db.store(self.key, mock_standings, previous=mock_standings)
 
         # then
-        redis_cache.put.assert_called_with(self.key, mock_standings)
-        mongodb.write.assert_not_called()
+        self.assertFalse(changed)
+        redis_cache.put.assert_called_with(self.key, mock_standings, publish_invalidation=False,
+                                           record_change=False)
+        mongodb.write.assert_called_with(self.key, mock_standings)
+        mongodb.read.assert_not_called()
 
     @mock.patch('backend.standings.domain.storage.storage.RedisCache')
     @mock.patch('backend.standings.domain.storage.storage.MongoDB')
@@ -129,3 +150,468 @@ class StorageTestCases(TestCase):
         # then
         self.assertFalse(in_cache)
         self.assertIsNone(standings)
+
+    @mock.patch('backend.standings.domain.storage.storage.RedisCache')
+    @mock.patch('backend.standings.domain.storage.storage.MongoDB')
+    @mock.patch('backend.standings.domain.response.standings.Standings')
+    def test_should_update_database_and_cache_if_entry_changed(self, redis_cache, mongodb, mock_standings):
+        # given
+        mongodb.write.return_value = "digest of the replaced standings"
+
+        # when
+        real_db = _test_storage("real_database", redis_cache, mongodb)
+        changed = real_db.store(self.key, mock_standings)
+
+        # then
+        self.assertTrue(changed)
+        mongodb.write.assert_called_with(self.key, mock_standings, return_previous_digest=True)
+        redis_cache.put.assert_called_with(self.key, mock_standings, publish_invalidation=False,
+                                           record_change=True)
+
+    def test_should_store_with_one_round_trip_per_tier(self):
+        redis, collection = StandInRedis(), mock.Mock()
+        collection.find_one_and_update.return_value = None
+        redis_cache = RedisCache(redis_client=redis)
+        storage = Storage(database_provider(False, redis_cache, MongoDB(collection=collection)),
+                          local_cache=LocalCache(), invalidation_publisher=redis_cache)
+        standings = MockStandingsSource().get_standings(self.key)
+
+        with metrics.counting_round_trips() as round_trips:
+            self.assertTrue(storage.store(self.key, standings))
+
+        self.assertEqual({metrics.MONGO: 1, metrics.REDIS: 1}, round_trips.per_tier)
+        self.assertEqual(["SET", "SET", "ZADD", "ZREMRANGEBYRANK", "EXPIRE", "PUBLISH", "PIPELINE"], redis.commands)
+        self.assertEqual(1, redis.round_trips)
+        collection.find_one.assert_not_called()
+        self.assertEqual(standings.get_digest(), collection.find_one_and_update.call_args[0][1]["$set"]["digest"])
+
+    def test_should_tell_whether_stored_standings_changed(self):
+        storage = _test_storage("real_database", RedisCache(redis_client=StandInRedis()), StandInMongoDB())
+        source = MockStandingsSource()
+        standings = source.get_standings(self.key)
+        fetched_again = from_binary(to_binary(standings))
+        fetched_again.fetched_at += 60
+
+        self.assertTrue(storage.store(self.key, standings))
+        self.assertFalse(storage.store(self.key, fetched_again))
+        self.assertTrue(storage.store(self.key, source.get_standings(Key("epl", "2021"))))
+        self.assertTrue(self.in_memory_storage.store(self.key, standings))
+        self.assertFalse(self.in_memory_storage.store(self.key, fetched_again))
+
+    def test_should_log_only_changed_standings_and_keep_latest_versions(self):
+        redis = StandInRedis()
+        storage = _test_storage("real_database", RedisCache(redis_client=redis, change_log_length=2),
+                                StandInMongoDB())
+        rows = MockStandingsSource().get_standings(self.key).get_rows()
+        versions = []
+        for minute, points in enumerate((70, 73, 76, 76), start=1):
+            rows[0][5] = points
+            storage.store(self.key, Standings.from_rows([list(row) for row in rows], fetched_at=60.0 * minute))
+            versions.append(60000 * minute)
+
+        change_log = storage.database.redis_cache
+        self.assertEqual((versions[2], True), change_log.get_change_versions(self.key, versions[1]))
+        self.assertEqual((versions[2], False), change_log.get_change_versions(self.key, versions[0]))
+        # The standings fetched last did not change, so they are not logged
+        self.assertEqual([str(version).encode() for version in versions[1:3]],
+                         redis._ranked("changes:{}".format(self.key)))
+
+
+class StaleWhileRevalidateTestCases(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(StaleWhileRevalidateTestCases, self).__init__(*args, **kwargs)
+        self.key = Key("epl", "2020")
+        self.policy = FreshnessPolicy(soft_ttl_seconds=300, hard_ttl_seconds=3600)
+
+    def _storage_with(self, fetched_at, refresher):
+        standings = mock.Mock()
+        standings.get_fetched_at.return_value = fetched_at
+        storage = _test_storage("in_memory", freshness_policy=lambda key: self.policy, refresher=refresher)
+        storage.database.store(self.key, standings)
+        return storage, standings
+
+    def test_should_serve_fresh_standings_without_refreshing(self):
+        refresher = mock.Mock()
+        storage, standings = self._storage_with(time.time(), refresher)
+
+        self.assertEqual((True, standings), storage.check_and_get(self.key))
+        refresher.assert_not_called()
+
+    def test_should_serve_stale_standings_and_refresh_once_in_background(self):
+        refreshed = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def refresher(key, stale):
+            calls.append(key)
+            refreshed.set()
+            release.wait(1)
+
+        storage, standings = self._storage_with(time.time() - 600, refresher)
+
+        self.assertEqual((True, standings), storage.check_and_get(self.key))
+        self.assertEqual((True, standings), storage.check_and_get(self.key))
+        self.assertTrue(refreshed.wait(1))
+        release.set()
+        storage._refresh_executor.shutdown(wait=True)
+
+        self.assertEqual([self.key], calls)
+
+    def test_should_not_serve_expired_standings(self):
+        storage, standings = self._storage_with(0, mock.Mock())
+
+        self.assertEqual((False, None), storage.check_and_get(self.key))
+        self.assertEqual(standings, storage.get_last_stored(self.key))
+
+
+class LocalCacheTestCases(TestCase):
+
+    @staticmethod
+    def _standings(size):
+        standings = mock.Mock()
+        standings.as_json_bytes.return_value = b"x" * size
+        standings.memory_size.return_value = size
+        return standings
+
+    def test_should_count_hits_and_misses(self):
+        local_cache = LocalCache()
+        key = Key("epl", "2020")
+        standings = self._standings(10)
+
+        self.assertIsNone(local_cache.get(key))
+        local_cache.put(key, standings)
+
+        self.assertEqual(standings, local_cache.get(key))
+        self.assertEqual(1, local_cache.stats()["hits"])
+        self.assertEqual(1, local_cache.stats()["misses"])
+
+    def test_should_evict_least_recently_used_when_over_budget(self):
+        local_cache = LocalCache(max_bytes=25)
+        epl, seriea, laliga = Key("epl", "2020"), Key("seriea", "2020"), Key("laliga1", "2020")
+
+        local_cache.put(epl, self._standings(10))
+        local_cache.put(seriea, self._standings(10))
+        local_cache.get(epl)
+        local_cache.put(laliga, self._standings(10))
+
+        self.assertIsNotNone(local_cache.get(epl))
+        self.assertIsNone(local_cache.get(seriea))
+        self.assertIsNotNone(local_cache.get(laliga))
+        self.assertEqual(20, local_cache.stats()["bytes"])
+        self.assertEqual(1, local_cache.stats()["evictions"])
+
+    def test_should_count_again_what_standings_keep_once_cached(self):
+        standings = Standings.from_rows([[rank, rank, "Team {}".format(rank), "logo.png", "", 90 - rank, "League",
+                                          "WWDLW", "all", 38, 20, 10, 8, 60, 30] for rank in range(1, 21)])
+        local_cache = LocalCache(max_bytes=100 * 1024)
+        epl, seriea = Key("epl", "2020"), Key("seriea", "2020")
+        local_cache.put(epl, standings)
+        counted = local_cache.stats()["bytes"]
+
+        standings.as_gzip_bytes()
+        standings.get_table().order("points")
+
+        self.assertEqual(standings.memory_size(), local_cache.stats()["bytes"])
+        self.assertGreater(local_cache.stats()["bytes"], counted + len(standings.as_gzip_bytes()))
+        # Fits next to the standings as they were put, not as they are now
+        local_cache.put(seriea, self._standings(local_cache.max_bytes - counted))
+        self.assertIsNone(local_cache.get(epl))
+        self.assertIsNotNone(local_cache.get(seriea))
+
+    def test_should_drop_entries_after_ttl(self):
+        local_cache = LocalCache(ttl_seconds=0)
+        key = Key("epl", "2020")
+
+        local_cache.put(key, self._standings(10))
+        time.sleep(0.01)
+
+        self.assertIsNone(local_cache.get(key))
+        self.assertEqual(0, local_cache.stats()["entries"])
+
+    def test_should_invalidate_key(self):
+        local_cache = LocalCache()
+        local_cache.put(Key("epl", "2020"), self._standings(10))
+
+        local_cache.invalidate(Key.parse("epl_2020"))
+
+        self.assertIsNone(local_cache.get(Key("epl", "2020")))
+
+    def test_storage_should_serve_hits_without_going_to_database(self):
+        database = mock.Mock()
+        standings = self._standings(10)
+        database.check_and_get.return_value = (True, standings)
+        publisher = mock.Mock()
+        storage = Storage(database, local_cache=LocalCache(), invalidation_publisher=publisher)
+        key = Key("epl", "2020")
+
+        storage.store(key, standings)
+
+        self.assertEqual((True, standings), storage.check_and_get(key))
+        database.check_and_get.assert_not_called()
+        database.store.assert_called_with(key, standings, previous=NOT_READ, invalidation_publisher=publisher)
+
+
+class RedisCacheAvailabilityTestCases(TestCase):
+
+    def test_should_not_ping_before_commands(self):
+        redis = StandInRedis()
+        redis_cache = RedisCache(redis_client=redis)
+        redis.commands = []
+
+        redis_cache.get(Key("epl", "2020"))
+
+        self.assertEqual(["GET"], redis.commands)
+
+    def test_should_bypass_redis_for_backoff_window_after_connection_error(self):
+        redis = mock.Mock()
+        redis.get.side_effect = RedisConnectionError("Connection refused")
+        redis_cache = RedisCache(redis_client=redis, health=RedisHealth(backoff_seconds=60))
+
+        self.assertIsNone(redis_cache.get(Key("epl", "2020")))
+        self.assertIsNone(redis_cache.get(Key("epl", "2020")))
+
+        self.assertEqual(1, redis.get.call_count)
+
+    def test_should_probe_redis_again_after_backoff_window(self):
+        redis = mock.Mock()
+        redis.get.side_effect = [RedisConnectionError("Connection refused"), None]
+        health = RedisHealth(backoff_seconds=0)
+        redis_cache = RedisCache(redis_client=redis, health=health)
+
+        redis_cache.get(Key("epl", "2020"))
+        self.assertTrue(health.is_available())
+        redis_cache.get(Key("epl", "2020"))
+
+        self.assertEqual(2, redis.get.call_count)
+        self.assertEqual(0, health._failures)
+
+
+class InvalidationTestCases(TestCase):
+
+    def setUp(self):
+        self.local_cache = LocalCache()
+        self.epl, self.seriea = Key("epl", "2020"), Key("seriea", "2020")
+        for key in (self.epl, self.seriea):
+            self.local_cache.put(key, LocalCacheTestCases._standings(10))
+        self.stop = threading.Event()
+
+    def tearDown(self):
+        self.stop.set()
+
+    @staticmethod
+    def _pubsub(*messages):
+        """ Returns a pub/sub that receives the messages, then nothing, or raises the ones that are errors """
+        pubsub = mock.Mock()
+        pending = list(messages)
+
+        def get_message(timeout=0):
+            if not pending:
+                time.sleep(0.01)
+                return None
+            message = pending.pop(0)
+            if isinstance(message, Exception):
+                raise message
+            return {"type": "message", "data": message.encode()}
+        pubsub.get_message.side_effect = get_message
+        return pubsub
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_should_invalidate_keys_published_by_other_workers(self):
+        redis = mock.Mock()
+        redis.pubsub.return_value = self._pubsub("other-worker:epl_2020", "{}:seriea_2020".format(_WORKER_ID))
+
+        RedisCache(redis_client=redis).subscribe_to_invalidations(self.local_cache, stop=self.stop)
+
+        self._wait_for(lambda: self.local_cache.get(self.epl) is None)
+        self.assertIsNotNone(self.local_cache.get(self.seriea))
+
+    def test_should_subscribe_once_redis_is_back_after_start_up_and_empty_local_cache(self):
+        redis, down = mock.Mock(), self._pubsub()
+        down.subscribe.side_effect = RedisConnectionError("Connection refused")
+        redis.pubsub.side_effect = [down, self._pubsub()]
+        health = RedisHealth(backoff_seconds=0.05)
+
+        RedisCache(redis_client=redis, health=health).subscribe_to_invalidations(self.local_cache, stop=self.stop)
+
+        self._wait_for(lambda: redis.pubsub.call_count == 2 and self.local_cache.stats()["entries"] == 0)
+        self.assertTrue(health.is_available())
+
+    def test_should_subscribe_again_when_listener_loses_connection(self):
+        redis = mock.Mock()
+        redis.pubsub.side_effect = [self._pubsub(RedisConnectionError("Connection reset")),
+                                    self._pubsub("other-worker:epl_2020")]
+
+        RedisCache(redis_client=redis, health=RedisHealth(backoff_seconds=0)).subscribe_to_invalidations(
+            self.local_cache, stop=self.stop)
+
+        self._wait_for(lambda: redis.pubsub.call_count == 2 and self.local_cache.stats()["entries"] == 0)
+
+    def test_should_stop_listening_when_told(self):
+        redis = mock.Mock()
+        redis.pubsub.return_value = self._pubsub()
+        listener = RedisCache(redis_client=redis).subscribe_to_invalidations(self.local_cache, stop=self.stop)
+
+        self.stop.set()
+        listener.join(timeout=2)
+
+        self.assertFalse(listener.is_alive())
+        redis.pubsub.return_value.close.assert_called_once()
+
+
+class WarmUpTestCases(TestCase):
+
+    def test_should_load_stored_keys_from_database_into_cache(self):
+        redis, mongodb = StandInRedis(), StandInMongoDB()
+        epl, seriea = Key("epl", "2020"), Key("seriea", "2020")
+        standings = Standings()
+        mongodb.write(epl, standings)
+        mongodb.round_trips = 0
+        local_cache = LocalCache()
+        storage = Storage(database_provider(False, RedisCache(redis_client=redis), mongodb), local_cache=local_cache)
+
+        loaded = storage.warm_up([epl, seriea])
+
+        self.assertEqual(1, loaded)
+        self.assertEqual(1, mongodb.round_trips)
+        self.assertIn(str(epl), redis.data)
+        self.assertIsNotNone(local_cache.get(epl))
+        self.assertIsNone(local_cache.get(seriea))
+
+    def test_should_not_flush_cache_on_creation(self):
+        redis = StandInRedis()
+        redis.data["epl_2020"] = b"standings"
+
+        RedisCache(redis_client=redis)
+
+        self.assertIn("epl_2020", redis.data)
+
+
+class MongoDBTestCases(TestCase):
+
+    def test_should_create_unique_key_index_once_on_creation(self):
+        collection = mock.Mock()
+
+        mongodb = MongoDB(collection=collection)
+        mongodb.write(Key("epl", "2020"), Standings())
+        mongodb.write(Key("epl", "2021"), Standings())
+
+        self.assertEqual(2, collection.create_index.call_count)
+        collection.create_index.assert_any_call("key", name=MongoDB.KEY_INDEX, unique=True)
+
+    def test_should_upsert_by_key(self):
+        collection = mock.Mock()
+        mongodb = MongoDB(collection=collection)
+
+        standings = Standings()
+
+        mongodb.write(Key("epl", "2020"), standings)
+
+        query, update = collection.update_one.call_args[0]
+        self.assertEqual({"key": "epl_2020"}, query)
+        self.assertEqual("epl", update["$set"]["league"])
+        self.assertEqual("2020", update["$set"]["season"])
+        self.assertEqual(standings, from_binary(update["$set"]["standings"]))
+        self.assertTrue(collection.update_one.call_args[1]["upsert"])
+        collection.insert_one.assert_not_called()
+
+    def test_should_return_digest_of_replaced_standings_from_upsert(self):
+        collection = mock.Mock()
+        collection.find_one_and_update.return_value = {"digest": "replaced"}
+        mongodb = MongoDB(collection=collection, bootstrap_indexes=False)
+
+        self.assertEqual("replaced", mongodb.write(Key("epl", "2020"), Standings(), return_previous_digest=True))
+        self.assertTrue(collection.find_one_and_update.call_args[1]["upsert"])
+        collection.update_one.assert_not_called()
+
+    def test_migration_should_drop_junk_indexes_and_keep_latest_document_per_key(self):
+        collection = mock.Mock()
+        collection.index_information.return_value = {"_id_": {}, "epl_2020_1": {}, MongoDB.KEY_INDEX: {}}
+        collection.aggregate.return_value = [{"_id": "epl_2020", "ids": [3, 2, 1], "count": 3}]
+        collection.delete_many.return_value.deleted_count = 2
+        collection.find.return_value = [{"_id": 3, "key": "epl_2020"}]
+        mongodb = MongoDB(collection=collection, bootstrap_indexes=False)
+
+        summary = mongodb.migrate()
+
+        collection.drop_index.assert_called_once_with("epl_2020_1")
+        collection.delete_many.assert_called_once_with({"_id": {"$in": [2, 1]}})
+        collection.update_one.assert_called_once_with({"_id": 3}, {"$set": {"league": "epl", "season": "2020"}})
+        self.assertEqual({"dropped_indexes": 1, "removed_duplicates": 2, "updated_documents": 1}, summary)
+
+
+class ManyKeysTestCases(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(ManyKeysTestCases, self).__init__(*args, **kwargs)
+        self.epl, self.seriea, self.laliga = Key("epl", "2020"), Key("seriea", "2020"), Key("laliga1", "2020")
+
+    def test_should_get_many_keys_with_one_round_trip_per_tier(self):
+        redis, mongodb = StandInRedis(), StandInMongoDB()
+        redis_cache = RedisCache(redis_client=redis)
+        redis_cache.put(self.epl, Standings())
+        mongodb.write(self.seriea, Standings())
+        redis.round_trips, mongodb.round_trips = 0, 0
+        storage = Storage(database_provider(False, redis_cache, mongodb))
+
+        found = storage.check_and_get_many([self.epl, self.seriea, self.laliga])
+
+        self.assertEqual({self.epl, self.seriea}, set(found))
+        self.assertEqual(["MGET", "SET", "PIPELINE"], redis.commands[-3:])
+        self.assertEqual(2, redis.round_trips)
+        self.assertEqual(1, mongodb.round_trips)
+        self.assertIn(str(self.seriea), redis.data)
+
+    def test_should_serve_local_hits_and_skip_expired_standings(self):
+        database = mock.Mock()
+        expired = mock.Mock()
+        expired.get_fetched_at.return_value = 0
+        expired.memory_size.return_value = 2
+        database.check_and_get_many.return_value = {self.seriea: expired}
+        local_cache = LocalCache()
+        fresh = Standings()
+        local_cache.put(self.epl, fresh)
+        storage = Storage(database, local_cache=local_cache,
+                          freshness_policy=lambda key: FreshnessPolicy(hard_ttl_seconds=60))
+
+        found = storage.check_and_get_many([self.epl, self.seriea])
+
+        self.assertEqual({self.epl: fresh}, found)
+        database.check_and_get_many.assert_called_once_with([self.seriea])
+
+    def test_should_store_many_keys(self):
+        storage = _test_storage("in_memory")
+        standings = {self.epl: Standings(), self.seriea: Standings()}
+
+        storage.store_many(standings)
+
+        self.assertEqual(standings, storage.check_and_get_many([self.epl, self.seriea, self.laliga]))
+
+    def test_should_publish_invalidations_of_many_keys_with_one_pipeline(self):
+        redis = StandInRedis()
+        redis_cache = RedisCache(redis_client=redis)
+        storage = Storage(database_provider(True), local_cache=LocalCache(), invalidation_publisher=redis_cache)
+
+        storage.store_many({self.epl: Standings(), self.seriea: Standings()})
+
+        self.assertEqual(1, redis.round_trips)
+        self.assertEqual(["PUBLISH", "PUBLISH", "PIPELINE"], redis.commands)
+
+    def test_should_store_many_keys_with_one_bulk_write_and_one_pipeline(self):
+        redis, collection = StandInRedis(), mock.Mock()
+        database = database_provider(False, RedisCache(redis_client=redis),
+                                     MongoDB(collection=collection, bootstrap_indexes=False))
+        standings = {self.epl: MockStandingsSource().get_standings(self.epl), self.seriea: Standings()}
+
+        database.store_many(standings)
+
+        operations = collection.bulk_write.call_args[0][0]
+        self.assertEqual([{"key": "epl_2020"}, {"key": "seriea_2020"}], [operation._filter for operation in operations])
+        self.assertTrue(all(operation._upsert for operation in operations))
+        self.assertFalse(collection.bulk_write.call_args[1]["ordered"])
+        self.assertEqual(["SET", "SET", "PIPELINE"], redis.commands)
@@ -0,0 +1,162 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from unittest import TestCase
+from unittest import mock
+import json
+import threading
+
+from backend.standings.domain.upstream.client import CircuitBreaker
+from backend.standings.domain.upstream.client import CircuitOpenException
+from backend.standings.domain.upstream.client import RapidApiClient
+from backend.standings.domain.upstream.client import RetryBudget
+from backend.standings.domain.upstream.client import UpstreamException
+from backend.standings.domain.upstream.quota import QuotaExceededException
+from backend.standings.domain.upstream.quota import RateLimitedException
+
+
+class _StubRapidApi(BaseHTTPRequestHandler):
+    """ Replies with the next status code in `status_codes`, repeating the last one """
+    status_codes = [200]
+    requests = []
+
+    def do_GET(self):
+        _StubRapidApi.requests.append((self.path, dict(self.headers)))
+        index = min(len(_StubRapidApi.requests), len(_StubRapidApi.status_codes)) - 1
+        status_code = _StubRapidApi.status_codes[index]
+        body = json.dumps({"response": []}).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RapidApiClientTestCases(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubRapidApi)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = "127.0.0.1:{}".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _StubRapidApi.status_codes = [200]
+        _StubRapidApi.requests = []
+
+    def _client(self, **kwargs):
+        return RapidApiClient(self.host, "v3", "secret", scheme="http", backoff_seconds=0.001, **kwargs)
+
+    def test_should_send_query_and_rapidapi_headers(self):
+        response = self._client().get_standings(39, 2020)
+
+        self.assertEqual(200, response.status_code)
+        path, headers = _StubRapidApi.requests[0]
+        self.assertEqual("/v3/standings?season=2020&league=39", path)
+        self.assertEqual("secret", headers["x-rapidapi-key"])
+
+    def test_should_retry_on_server_errors(self):
+        _StubRapidApi.status_codes = [503, 502, 200]
+
+        response = self._client(max_retries=2).get_standings(39, 2020)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, len(_StubRapidApi.requests))
+
+    def test_should_not_retry_on_client_errors(self):
+        _StubRapidApi.status_codes = [403]
+
+        self.assertRaises(UpstreamException, self._client().get_standings, 39, 2020)
+        self.assertEqual(1, len(_StubRapidApi.requests))
+
+    def test_should_stop_retrying_when_budget_is_spent(self):
+        _StubRapidApi.status_codes = [500]
+
+        client = self._client(max_retries=5, retry_budget=RetryBudget(min_tokens=1))
+
+        self.assertRaises(UpstreamException, client.get_standings, 39, 2020)
+        self.assertEqual(2, len(_StubRapidApi.requests))
+
+    def test_should_fail_fast_when_circuit_is_open(self):
+        _StubRapidApi.status_codes = [500]
+        client = self._client(max_retries=0, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+
+        self.assertRaises(UpstreamException, client.get_standings, 39, 2020)
+        self.assertRaises(UpstreamException, client.get_standings, 39, 2020)
+        self.assertRaises(CircuitOpenException, client.get_standings, 39, 2020)
+        self.assertEqual(2, len(_StubRapidApi.requests))
+
+    def test_should_account_every_attempt_with_quota(self):
+        _StubRapidApi.status_codes = [503, 200]
+        quota = mock.Mock()
+
+        self._client(max_retries=2, quota=quota).get_standings(39, 2020, critical=False)
+
+        self.assertEqual([mock.call(False), mock.call(False)], quota.acquire.call_args_list)
+        self.assertEqual([503, 200], [response.status_code for (response,), _ in quota.record_response.call_args_list])
+
+    def test_should_not_call_upstream_when_quota_refuses(self):
+        quota = mock.Mock()
+        quota.acquire.side_effect = QuotaExceededException("Quota is used up")
+
+        self.assertRaises(UpstreamException, self._client(quota=quota).get_standings, 39, 2020)
+        self.assertEqual(0, len(_StubRapidApi.requests))
+
+    def test_should_let_next_trial_through_when_quota_refuses_trial_call(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        breaker.record_failure()
+        quota = mock.Mock()
+        quota.acquire.side_effect = [RateLimitedException("Rate limited"), None]
+        client = self._client(circuit_breaker=breaker, quota=quota)
+
+        self.assertRaises(RateLimitedException, client.get_standings, 39, 2020)
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
+
+        self.assertEqual(200, client.get_standings(39, 2020).status_code)
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state())
+
+    def test_should_take_at_most_every_attempt_timing_out_after_waiting_for_quota(self):
+        quota = mock.Mock(max_wait_seconds=2.0)
+        client = RapidApiClient(self.host, "v3", "secret", connect_timeout=3.05, read_timeout=10, max_retries=2,
+                                backoff_seconds=0.2, quota=quota)
+
+        # 3 attempts of 3.05 + 10 + 2 seconds, and backoffs of at most 0.4 and 0.8 seconds
+        self.assertAlmostEqual(46.35, client.worst_case_seconds())
+        self.assertAlmostEqual(40.35, RapidApiClient(self.host, "v3", "secret").worst_case_seconds())
+
+    def test_should_time_out_on_unreachable_upstream(self):
+        client = RapidApiClient("127.0.0.1:1", "v3", "secret", scheme="http", connect_timeout=0.1, max_retries=0)
+
+        self.assertRaises(UpstreamException, client.get_standings, 39, 2020)
+
+
+class CircuitBreakerTestCases(TestCase):
+
+    def test_should_let_trial_call_through_after_reset_period(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state())
+
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state())
+
+    def test_should_reopen_if_trial_call_fails(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0)
+        for _ in range(3):
+            breaker.record_failure()
+        breaker.allow()
+
+        breaker.record_failure()
+
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
@@ -0,0 +1,142 @@
+from unittest import TestCase
+from unittest import mock
+import datetime
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.upstream.quota import LocalQuotaStore
+from backend.standings.domain.upstream.quota import QuotaExceededException
+from backend.standings.domain.upstream.quota import RateLimitedException
+from backend.standings.domain.upstream.quota import UpstreamQuota
+
+NOW = datetime.datetime(2021, 10, 16, 15, tzinfo=datetime.timezone.utc).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _response(status_code=200, headers=None):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.headers = headers if headers is not None else {}
+    return response
+
+
+class LocalQuotaStoreTestCases(TestCase):
+    def test_should_let_a_burst_through_then_make_callers_wait(self):
+        store = LocalQuotaStore()
+
+        waits = [store.take_token("bucket", 2, 0.5, NOW) for _ in range(3)]
+
+        self.assertEqual([0.0, 0.0, 2.0], waits)
+        self.assertEqual(0.0, store.take_token("bucket", 2, 0.5, NOW + 2))
+
+    def test_should_make_callers_wait_while_blocked(self):
+        store = LocalQuotaStore()
+        store.block_token_bucket("bucket", NOW + 30)
+
+        self.assertEqual(30, store.take_token("bucket", 2, 0.5, NOW))
+
+
+class UpstreamQuotaTestCases(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _quota(self, **kwargs):
+        return UpstreamQuota(requests_per_second=1, burst=2, max_wait_seconds=2, clock=self.clock,
+                             sleep=self.clock.sleep, **kwargs)
+
+    def test_should_wait_for_rate_limit_on_critical_calls(self):
+        quota = self._quota()
+
+        for _ in range(3):
+            quota.acquire(critical=True)
+
+        self.assertEqual(NOW + 1, self.clock.now)
+
+    def test_should_not_wait_for_rate_limit_on_non_critical_calls(self):
+        quota = self._quota()
+        quota.acquire(critical=False)
+        quota.acquire(critical=False)
+
+        self.assertRaises(RateLimitedException, quota.acquire, critical=False)
+        self.assertEqual(1, quota.stats()["throttled"])
+
+    def test_should_give_up_when_rate_limit_wait_is_too_long(self):
+        quota = self._quota()
+        quota.record_response(_response(status_code=429, headers={"retry-after": "60"}))
+
+        self.assertRaises(RateLimitedException, quota.acquire, critical=True)
+
+    def test_should_count_calls_per_day_and_month(self):
+        quota = self._quota()
+        quota.record_response(_response())
+        quota.record_response(_response())
+        self.clock.now += 24 * 60 * 60
+        quota.record_response(_response())
+
+        stats = quota.stats()
+        self.assertEqual(1, stats["calls_today"])
+        self.assertEqual(3, stats["calls_this_month"])
+
+    def test_should_refuse_all_calls_when_daily_limit_is_used_up(self):
+        quota = self._quota(daily_limit=2)
+        quota.record_response(_response())
+        quota.record_response(_response())
+
+        self.assertRaises(QuotaExceededException, quota.acquire, critical=True)
+        self.assertEqual(1, quota.stats()["refused"])
+
+    def test_should_keep_low_quota_for_critical_calls(self):
+        quota = self._quota(reserve=10)
+        quota.record_response(_response(headers={"x-ratelimit-requests-limit": "100",
+                                                 "x-ratelimit-requests-remaining": "5"}))
+
+        self.assertRaises(QuotaExceededException, quota.acquire, critical=False)
+        quota.acquire(critical=True)
+        stats = quota.stats()
+        self.assertEqual(5, stats["remaining"])
+        self.assertEqual(1, stats["deferred"])
+
+    def test_should_block_calls_when_upstream_rate_limit_is_used_up(self):
+        quota = self._quota()
+        quota.record_response(_response(headers={"x-ratelimit-remaining": "0"}))
+
+        self.assertRaises(RateLimitedException, quota.acquire, critical=False)
+        self.clock.now += 60
+        quota.acquire(critical=False)
+
+    def test_should_share_quota_through_store(self):
+        store = mock.Mock()
+        store.take_token.return_value = 0.0
+        store.get_quota_state.return_value = {"remaining": "50"}
+        store.get_counts.return_value = [7, 70]
+        quota = self._quota(store=store)
+
+        quota.acquire()
+        quota.record_response(_response())
+
+        store.take_token.assert_called_once_with("ratelimit:rapidapi", 2, 1, NOW)
+        store.count_calls.assert_called_once_with({"quota:rapidapi:calls:2021-10-16": 2 * 24 * 60 * 60,
+                                                   "quota:rapidapi:calls:2021-10": 32 * 24 * 60 * 60})
+        self.assertEqual(7, quota.stats()["calls_today"])
+
+    def test_should_fall_back_to_local_accounting_when_store_is_not_available(self):
+        redis_client = mock.Mock()
+        redis_client.eval.side_effect = RedisConnectionError("Connection refused")
+        quota = self._quota(store=RedisCache(redis_client=redis_client))
+
+        quota.acquire()
+        quota.acquire()
+
+        self.assertRaises(RateLimitedException, quota.acquire, critical=False)
+        redis_client.eval.assert_called_once()
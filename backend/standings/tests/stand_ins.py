@@ -0,0 +1,235 @@
+""" In-process stand-ins for Redis and MongoDB that count the round trips made to them, and for RapidAPI. They
+implement just enough of the client APIs used by the service, and are meant for tests and benchmarks """
+import fnmatch
+import json
+import os
+import shutil
+import tempfile
+
+from backend.standings.domain.response.changes import ChangeFeed
+from backend.standings.domain.single_flight import SingleFlight
+from backend.standings.domain.storage.storage import LocalCache
+from backend.standings.domain.storage.storage import RedisCache
+from backend.standings.domain.storage.storage import Storage
+from backend.standings.domain.storage.storage import database_provider
+
+STANDINGS_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config",
+                                "standings_config.json")
+
+
+class StandInRedis:
+    """ Stands in for :func:`redis.Redis`. Every command is counted as one round trip """
+
+    def __init__(self):
+        self.data = {}
+        self.sorted_sets = {}
+        self.round_trips = 0
+        self.commands = []
+        self.published = []
+
+    def _command(self, name):
+        self.round_trips += 1
+        self.commands.append(name)
+
+    def ping(self):
+        self._command("PING")
+        return True
+
+    def flushdb(self):
+        self._command("FLUSHDB")
+        self.data.clear()
+
+    def get(self, name):
+        self._command("GET")
+        return self.data.get(name)
+
+    def mget(self, names):
+        self._command("MGET")
+        return [self.data.get(name) for name in names]
+
+    def pipeline(self, transaction=True):
+        return _StandInPipeline(self)
+
+    def set(self, name, value, ex=None, nx=False):
+        self._command("SET")
+        if nx and name in self.data:
+            return None
+        self.data[name] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    def delete(self, *names):
+        self._command("DEL")
+        return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def keys(self, pattern="*"):
+        self._command("KEYS")
+        return [name for name in self.data if fnmatch.fnmatch(name, pattern)]
+
+    def eval(self, script, number_of_keys, *args):
+        # Only the lease release script is supported
+        self._command("EVAL")
+        name, token = args[0], args[1]
+        if self.data.get(name) == token.encode():
+            del self.data[name]
+            return 1
+        return 0
+
+    def expire(self, name, time):
+        self._command("EXPIRE")
+        return name in self.data or name in self.sorted_sets
+
+    def zadd(self, name, mapping):
+        self._command("ZADD")
+        members = self.sorted_sets.setdefault(name, {})
+        added = sum(1 for member in mapping if member.encode() not in members)
+        members.update({member.encode(): score for member, score in mapping.items()})
+        return added
+
+    def zremrangebyrank(self, name, start, end):
+        self._command("ZREMRANGEBYRANK")
+        ranked = self._ranked(name)
+        removed = ranked[max(0, _index(ranked, start)):_index(ranked, end) + 1]
+        for member in removed:
+            del self.sorted_sets[name][member]
+        return len(removed)
+
+    def zrevrange(self, name, start, end):
+        self._command("ZREVRANGE")
+        ranked = list(reversed(self._ranked(name)))
+        return ranked[max(0, _index(ranked, start)):_index(ranked, end) + 1]
+
+    def zscore(self, name, value):
+        self._command("ZSCORE")
+        return self.sorted_sets.get(name, {}).get(value.encode())
+
+    def _ranked(self, name):
+        members = self.sorted_sets.get(name, {})
+        return sorted(members, key=lambda member: (members[member], member))
+
+    def publish(self, channel, message):
+        self._command("PUBLISH")
+        self.published.append((channel, message))
+        return 0
+
+
+def _index(ranked, index):
+    # Negative indexes count from the last member, as in Redis, and ones before the first member leave the range empty
+    return max(-1, len(ranked) + index) if index < 0 else index
+
+
+class _StandInPipeline:
+    """ Queues commands and sends them to the stand-in in a single round trip on execute """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        round_trips = self.redis.round_trips
+        results = [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.queued]
+        self.redis.round_trips = round_trips + 1
+        self.redis.commands.append("PIPELINE")
+        self.queued = []
+        return results
+
+
+class StandInMongoDB:
+    """ Stands in for :func:`MongoDB`. Every read and write is counted as one round trip """
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def read(self, key):
+        self.round_trips += 1
+        return self.data.get(str(key))
+
+    def read_many(self, keys):
+        self.round_trips += 1
+        return {key: self.data[str(key)] for key in keys if str(key) in self.data}
+
+    def write(self, key, standings, return_previous_digest=False):
+        self.round_trips += 1
+        previous = self.data.get(str(key))
+        self.data[str(key)] = standings
+        if return_previous_digest and previous is not None:
+            return previous.get_digest()
+        return None
+
+    def write_many(self, standings_per_key):
+        self.round_trips += 1
+        self.data.update({str(key): standings for key, standings in standings_per_key.items()})
+
+
+class _StandInResponse:
+    """ Stands in for the response of RapidAPI """
+
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class StandInRapidApi:
+    """ Stands in for :func:`RapidApiClient`, answering every call with the same payload, or raising the error given
+    for a season """
+
+    def __init__(self, payload_bytes, errors=None):
+        self.payload_bytes = payload_bytes
+        self.errors = errors if errors is not None else {}
+        self.calls = []
+
+    def get_standings(self, league, season, critical=True):
+        self.calls.append((league, season))
+        if season in self.errors:
+            raise self.errors[season]
+        return _StandInResponse(self.payload_bytes)
+
+
+def stand_in_service(payload_bytes):
+    """ Sets up the service as it runs in production, with real database storage on the stand-ins and RapidAPI
+    replaced by :func:`StandInRapidApi`. The service reads its config from files next to the working directory, so it
+    is given config files of its own in a temporary directory the first time. Every call replaces the storage and the
+    upstream client of the service with new ones
+
+        :returns The Flask app, the stand-in Redis, MongoDB and RapidAPI, and the local cache
+    """
+    directory = tempfile.mkdtemp(prefix="standings-service-")
+    os.mkdir(os.path.join(directory, "standings"))
+    with open(os.path.join(directory, "app_config.yaml"), "w") as f:
+        json.dump({"rapidapi": {"host": "example.invalid", "version": "v3", "key": "stand-in"},
+                   "storage": {"real_database": False}, "mock_mode": False,
+                   "standings_config": STANDINGS_CONFIG}, f)
+    with open(os.path.join(directory, "log_config.yaml"), "w") as f:
+        json.dump({"version": 1, "disable_existing_loggers": False,
+                   "handlers": {"null": {"class": "logging.NullHandler"}},
+                   "root": {"level": "WARNING", "handlers": ["null"]}}, f)
+
+    working_directory = os.getcwd()
+    os.chdir(os.path.join(directory, "standings"))
+    try:
+        from backend.standings import main
+        from backend.standings import views
+    finally:
+        os.chdir(working_directory)
+        shutil.rmtree(directory)
+
+    redis, mongodb, rapid_api = StandInRedis(), StandInMongoDB(), StandInRapidApi(payload_bytes)
+    redis_cache = RedisCache(redis_client=redis)
+    local_cache = LocalCache()
+    views.storage = Storage(database_provider(False, redis_cache=redis_cache, mongo_db=mongodb),
+                            freshness_policy=views.storage.freshness_policy, refresher=lambda key, stale: None,
+                            local_cache=local_cache, invalidation_publisher=redis_cache)
+    views.single_flight = SingleFlight(lease_provider=redis_cache)
+    views.change_feed = ChangeFeed(redis_cache)
+    views.upstream_client = rapid_api
+    views.MOCK_MODE = False
+    return main.app, redis, mongodb, rapid_api, local_cache
@@ -0,0 +1,155 @@
+from unittest import TestCase
+import datetime
+import gzip
+import json
+
+from backend.standings.domain.response.http_caching import FINISHED_CACHE_CONTROL
+from backend.standings.domain.response.http_caching import LIVE_CACHE_CONTROL
+from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.upstream.client import UpstreamException
+from backend.standings.tests.benchmarks.payloads import rapidapi_payload_bytes
+from backend.standings.tests.stand_ins import stand_in_service
+
+
+class BatchViewTestCases(TestCase):
+    # The leagues are loaded once per process, by other tests maybe from the test config, which only has epl
+
+    def setUp(self):
+        app, self.redis, self.mongodb, self.rapid_api, self.local_cache = stand_in_service(rapidapi_payload_bytes())
+        self.client = app.test_client()
+        from backend.standings import views
+        self.views = views
+
+    def _get(self, keys):
+        response = self.client.get("/standings", query_string={"keys": keys})
+        return response.status_code, json.loads(response.data)
+
+    def test_should_serve_standings_of_every_key_in_order_asked(self):
+        status_code, payload = self._get("epl:2019, epl:2020")
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(["epl:2019", "epl:2020"], list(payload))
+        self.assertEqual(20, len(payload["epl:2020"]["standings"]))
+        self.assertEqual(2, len(self.rapid_api.calls))
+
+    def test_should_serve_each_key_once_in_order_first_asked(self):
+        response = self.client.get("/standings", query_string={"keys": "epl:2020,epl:2019, epl:2020,epl:2019"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, response.data.count(b'"epl:2020"'))
+        self.assertEqual(["epl:2020", "epl:2019"], list(json.loads(response.data)))
+        self.assertEqual(2, len(self.rapid_api.calls))
+
+    def test_should_serve_error_of_each_key_that_failed(self):
+        self.rapid_api.errors["2019"] = UpstreamException("Error reading from RapidApi. Status code: 503")
+
+        status_code, payload = self._get("epl:2020,nowhere:2020,epl:1999,epl:twenty,epl:2019")
+
+        self.assertEqual(200, status_code)
+        self.assertIn("standings", payload["epl:2020"])
+        for name in ("nowhere:2020", "epl:1999", "epl:twenty"):
+            self.assertEqual(400, payload[name]["error_code"], name)
+        self.assertEqual(500, payload["epl:2019"]["error_code"])
+
+    def test_should_refuse_requests_without_keys_or_with_too_many(self):
+        self.assertEqual(400, self.client.get("/standings").status_code)
+        self.assertEqual(400, self.client.get("/standings", query_string={"keys": " , "}).status_code)
+        too_many = ",".join("epl:{}".format(2000 + season) for season in range(self.views.MAX_BATCH_KEYS + 1))
+        self.assertEqual(400, self.client.get("/standings", query_string={"keys": too_many}).status_code)
+
+    def test_should_read_stored_keys_with_one_round_trip_per_tier(self):
+        keys = "epl:2019,epl:2020"
+        self._get(keys)
+        for key in (Key("epl", "2019"), Key("epl", "2020")):
+            self.local_cache.invalidate(key)
+        self.redis.round_trips, self.mongodb.round_trips = 0, 0
+
+        status_code, payload = self._get(keys)
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(2, len(payload))
+        self.assertEqual((1, 0), (self.redis.round_trips, self.mongodb.round_trips))
+        self.assertEqual("MGET", self.redis.commands[-1])
+        self.assertEqual(2, len(self.rapid_api.calls))
+
+    def test_should_read_keys_missing_from_cache_from_database_at_once(self):
+        keys = "epl:2019,epl:2020"
+        self._get(keys)
+        self.local_cache.invalidate(Key("epl", "2020"))
+        self.local_cache.invalidate(Key("epl", "2019"))
+        self.redis.data.clear()
+        self.redis.round_trips, self.mongodb.round_trips = 0, 0
+
+        status_code, payload = self._get(keys)
+
+        self.assertEqual(200, status_code)
+        # One MGET, one read of the database and one pipeline putting the standings back in the cache
+        self.assertEqual((2, 1), (self.redis.round_trips, self.mongodb.round_trips))
+        self.assertEqual(2, len(self.rapid_api.calls))
+
+
+class StandingsViewTestCases(TestCase):
+    # The leagues are loaded once per process, by other tests maybe from the test config, which only has epl
+
+    def setUp(self):
+        app, self.redis, self.mongodb, self.rapid_api, self.local_cache = stand_in_service(rapidapi_payload_bytes())
+        self.client = app.test_client()
+
+    def test_should_serve_not_modified_to_client_with_same_entity_tag(self):
+        response = self.client.get("/standings/epl/2020")
+        entity_tag = response.headers["ETag"]
+
+        not_modified = self.client.get("/standings/epl/2020", headers={"If-None-Match": entity_tag})
+        modified = self.client.get("/standings/epl/2020", headers={"If-None-Match": 'W/"other"'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(entity_tag.startswith('W/"'))
+        self.assertEqual((304, b""), (not_modified.status_code, not_modified.data))
+        self.assertEqual(entity_tag, not_modified.headers["ETag"])
+        self.assertEqual(200, modified.status_code)
+        self.assertEqual(response.data, modified.data)
+
+    def test_should_cache_finished_seasons_longer_than_live_ones(self):
+        finished = self.client.get("/standings/epl/2020")
+        live = self.client.get("/standings/epl/{}".format(datetime.date.today().year))
+
+        self.assertEqual(FINISHED_CACHE_CONTROL, finished.headers["Cache-Control"])
+        self.assertEqual(LIVE_CACHE_CONTROL, live.headers["Cache-Control"])
+        self.assertIn("Last-Modified", finished.headers)
+        self.assertEqual("Accept-Encoding", finished.headers["Vary"])
+
+    def test_should_serve_gzip_only_to_clients_that_accept_it(self):
+        plain = self.client.get("/standings/epl/2020")
+        compressed = self.client.get("/standings/epl/2020", headers={"Accept-Encoding": "deflate, gzip"})
+        refused = self.client.get("/standings/epl/2020", headers={"Accept-Encoding": "gzip;q=0"})
+        pretty = self.client.get("/standings/epl/2020?pretty=true", headers={"Accept-Encoding": "gzip"})
+
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual("gzip", compressed.headers["Content-Encoding"])
+        self.assertEqual(plain.data, gzip.decompress(compressed.data))
+        self.assertNotIn("Content-Encoding", refused.headers)
+        self.assertEqual(plain.data, refused.data)
+        self.assertNotIn("Content-Encoding", pretty.headers)
+        self.assertEqual(json.loads(plain.data), json.loads(pretty.data))
+        self.assertEqual(plain.headers["ETag"], compressed.headers["ETag"])
+
+    def test_should_serve_part_of_standings_with_entity_tag_of_its_own(self):
+        full = self.client.get("/standings/epl/2020")
+        part = self.client.get("/standings/epl/2020?fields=rank,team.name&sort=-points&top=3")
+
+        self.assertEqual(200, part.status_code)
+        self.assertEqual([{"rank": 1, "team": {"name": "Team 1"}}, {"rank": 2, "team": {"name": "Team 2"}},
+                          {"rank": 3, "team": {"name": "Team 3"}}], json.loads(part.data)["standings"])
+        self.assertNotEqual(full.headers["ETag"], part.headers["ETag"])
+        not_modified = self.client.get("/standings/epl/2020?fields=rank,team.name&sort=-points&top=3",
+                                       headers={"If-None-Match": part.headers["ETag"]})
+        self.assertEqual(304, not_modified.status_code)
+
+    def test_should_refuse_parts_of_standings_that_cannot_be_served(self):
+        for query_string in ({"fields": "rank,nowhere"}, {"fields": ","}, {"sort": "team"}, {"sort": "-nowhere"},
+                             {"top": "0"}, {"top": "many"}, {"ranks": "5-1"}, {"ranks": "a-b"}):
+            response = self.client.get("/standings/epl/2020", query_string=query_string)
+
+            self.assertEqual(400, response.status_code, query_string)
+            self.assertEqual(400, json.loads(response.data)["error_code"], query_string)
+        self.assertEqual(0, len(self.rapid_api.calls))
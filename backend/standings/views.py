@@ -1,26 +1,54 @@
-import requests
-import sys
 import datetime
+import functools
+import json
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest
+from flask import request
 from markupsafe import escape
 from werkzeug.utils import cached_property
 from werkzeug.utils import import_string
 
 from backend.standings.common import *
+from backend.standings.domain import metrics
 from backend.standings.domain.config import ConfigProvider
 from backend.standings.domain.leagues import LeagueException
 from backend.standings.domain.leagues import Leagues
+from backend.standings.domain.response.http_caching import CachePolicy
+from backend.standings.domain.response.http_caching import accepts_gzip
+from backend.standings.domain.response.http_caching import etag
+from backend.standings.domain.response.http_caching import http_date
+from backend.standings.domain.response.http_caching import is_not_modified
 from backend.standings.domain.response.http_exceptions import ERROR_CODES
+from backend.standings.domain.response.http_exceptions import error_payload
 from backend.standings.domain.response.http_exceptions import client_error_response
 from backend.standings.domain.response.http_exceptions import server_error_response
+from backend.standings.domain.response.changes import ChangeFeed
+from backend.standings.domain.response.parser import parse_standings
+from backend.standings.domain.response.projection import Projection
+from backend.standings.domain.response.projection import ProjectionEncodings
+from backend.standings.domain.response.projection import ProjectionException
 from backend.standings.domain.response.standings import MockStandingsSource
-from backend.standings.domain.response.standings import Standings
-from backend.standings.domain.response.standings import standing_builder
+from backend.standings.domain.single_flight import SingleFlight
 from backend.standings.domain.storage.storage import Database
 from backend.standings.domain.storage.storage import Key
+from backend.standings.domain.storage.storage import LocalCache
 from backend.standings.domain.storage.storage import MongoDB
+from backend.standings.domain.storage.storage import NOT_READ
 from backend.standings.domain.storage.storage import RedisCache
 from backend.standings.domain.storage.storage import Storage
 from backend.standings.domain.storage.storage import database_provider
+from backend.standings.domain.storage.codec import codec_provider
+from backend.standings.domain.storage.freshness import SeasonFreshnessPolicies
+from backend.standings.domain.storage.freshness import live_seasons
+from backend.standings.domain.upstream.client import CircuitBreaker
+from backend.standings.domain.upstream.client import RapidApiClient
+from backend.standings.domain.upstream.client import RetryBudget
+from backend.standings.domain.upstream.client import UpstreamException
+from backend.standings.domain.upstream.quota import UpstreamQuota
 
 configure_logger("../log_config.yaml")
 logger = logger_factory(__name__)
@@ -30,30 +58,98 @@ rapid_api_config = CONFIG['rapidapi']
 API_HOST = rapid_api_config['host']
 API_VERSION = rapid_api_config['version']
 API_KEY = rapid_api_config['key']
-BASE_PATH = "standings"
 
 storage_config = CONFIG['storage']
 storage_type = "real_database" if storage_config['real_database'] else "in_memory"
-not_container = sys.argv[1:][0] == 'not_container'
+not_container = sys.argv[1:2] == ['not_container']
+codec = codec_provider(storage_config.get('codec', {}))
+
+
+def get_redis_cache():
+    if storage_type == "in_memory":
+        return None
+    redis_config = storage_config['redis']
+    return RedisCache(host="localhost" if not_container else redis_config['host'],
+                      port=redis_config['port'], time_to_live_hours=redis_config['timeToLive'],
+                      max_connections=redis_config.get('maxConnections', 50), codec=codec,
+                      change_log_length=redis_config.get('changeLogLength', 20))
+
+
+def get_local_cache():
+    local_cache_config = storage_config.get('local_cache', {})
+    local_cache = LocalCache(max_bytes=local_cache_config.get('maxBytes', 16 * 1024 * 1024),
+                             ttl_seconds=local_cache_config.get('ttlSeconds', 30))
+    if redis_cache is not None:
+        redis_cache.subscribe_to_invalidations(local_cache)
+    return local_cache
 
 
 def get_storage():
+    freshness_policy = SeasonFreshnessPolicies.from_config(storage_config.get('freshness', {}))
     if storage_type == "in_memory":
-        return Storage(database_provider(Database.is_in_memory(storage_type)))
+        database = database_provider(Database.is_in_memory(storage_type))
     else:
-        redis_config = storage_config['redis']
-        redis_cache = RedisCache(host="localhost" if not_container else redis_config['host'],
-                                 port=redis_config['port'], time_to_live_hours=redis_config['timeToLive'])
         mongo_config = storage_config['mongo']
         mongo_db = MongoDB(host="localhost" if not_container else mongo_config['host'],
                            port=mongo_config['port'], username=mongo_config['username'],
-                           password=mongo_config['password'])
-        return Storage(database_provider(Database.is_in_memory(storage_type),
-                                         redis_cache=redis_cache, mongo_db=mongo_db))
+                           password=mongo_config['password'], codec=codec)
+        database = database_provider(Database.is_in_memory(storage_type), redis_cache=redis_cache, mongo_db=mongo_db)
+    return Storage(database, freshness_policy=freshness_policy,
+                   refresher=lambda key, stale: refresh(key, previous=stale), local_cache=get_local_cache(),
+                   invalidation_publisher=redis_cache)
 
 
+redis_cache = get_redis_cache()
 storage = get_storage()
 
+# The leagues are read from file once, lookups are made in memory. Changes to the file are picked up in the background
+leagues = Leagues.get_instance(ConfigProvider(CONFIG['standings_config']))
+leagues.watch(interval_seconds=CONFIG.get('leagues', {}).get('reloadIntervalSeconds', 10))
+
+
+def get_upstream_client():
+    return RapidApiClient(API_HOST, API_VERSION, API_KEY,
+                          connect_timeout=rapid_api_config.get('connectTimeoutSeconds', 3.05),
+                          read_timeout=rapid_api_config.get('readTimeoutSeconds', 10),
+                          max_retries=rapid_api_config.get('maxRetries', 2),
+                          pool_size=rapid_api_config.get('poolSize', 10),
+                          retry_budget=RetryBudget(ratio=rapid_api_config.get('retryBudgetRatio', 0.2)),
+                          circuit_breaker=CircuitBreaker(
+                              failure_threshold=rapid_api_config.get('circuitFailureThreshold', 5),
+                              reset_seconds=rapid_api_config.get('circuitResetSeconds', 30)),
+                          quota=upstream_quota)
+
+
+# Rate limits and counts the calls to RapidAPI, across workers through Redis
+upstream_quota = UpstreamQuota.from_config(rapid_api_config.get('quota', {}), store=redis_cache)
+# One pooled keep-alive session per worker
+upstream_client = get_upstream_client()
+
+# Coalesces concurrent fetches from RapidAPI for the same key, within this worker and across workers through Redis.
+# The lease lasts at least as long as the slowest fetch, so that no other worker fetches while it's still running
+single_flight_config = CONFIG.get('single_flight', {})
+single_flight = SingleFlight(lease_provider=redis_cache,
+                             lease_seconds=max(single_flight_config.get('leaseSeconds', 10),
+                                               math.ceil(upstream_client.worst_case_seconds())),
+                             wait_seconds=single_flight_config.get('waitSeconds', 5))
+
+cache_policy = CachePolicy.from_config(CONFIG.get('http', {}).get('cacheControl', {}))
+
+# Keeps the encodings of the parts of standings that are served, apart from the standings in the local cache
+projection_encodings = ProjectionEncodings(max_encodings=CONFIG.get('projections', {}).get('maxEncodings', 256))
+
+# Serves the changes to standings since the versions that clients have, from the change logs in Redis
+change_feed = ChangeFeed(redis_cache, max_encodings=CONFIG.get('changes', {}).get('maxEncodings', 256))
+
+batch_config = CONFIG.get('batch', {})
+MAX_BATCH_KEYS = batch_config.get('maxKeys', 20)
+# Fetches the standings missing from storage for a batch request concurrently
+batch_executor = ThreadPoolExecutor(max_workers=batch_config.get('upstreamConcurrency', 4),
+                                    thread_name_prefix="standings-batch")
+
+# Metrics of all the workers, with the quota that they share
+metrics_registry = metrics.metrics_registry(metrics.QuotaCollector(upstream_quota))
+
 # This is to enable testing without making a call to RapidAPI
 MOCK_MODE = CONFIG['mock_mode']
 if CONFIG['mock_mode']:
@@ -74,21 +170,38 @@ class LazyView(object):
         return self.view(*args, **kwargs)
 
 
+def _instrumented(endpoint):
+    """ Counts the requests to a view per status code, the requests it is serving and the round trips to storage made
+    per request """
+    def decorator(view):
+        @functools.wraps(view)
+        def instrumented_view(*args, **kwargs):
+            status_code = 500
+            try:
+                with metrics.REQUESTS_IN_FLIGHT.labels(endpoint=endpoint).track_inprogress(), \
+                        metrics.counting_round_trips() as round_trips:
+                    response = view(*args, **kwargs)
+                status_code = response.status_code
+                return response
+            finally:
+                metrics.HTTP_REQUESTS.labels(endpoint=endpoint, status_code=str(status_code)).inc()
+                metrics.REQUEST_ROUND_TRIPS.labels(endpoint=endpoint).observe(round_trips.count)
+        return instrumented_view
+    return decorator
+
+
+@_instrumented("standings")
 def get_league_standings(league, season):
     alias = league
 
-    try:
-        leagues = Leagues.get_instance(ConfigProvider(CONFIG['standings_config']))
-    except FileNotFoundError as e:
-        logger.error(e.__str__())
-        return server_error_response(ERROR_CODES.get('server_error'))
-
     try:
         _seasons_validator(season, alias)
         league = leagues.get_league(alias)
-    except LeagueException as e:
+        projection = Projection.from_args(request.args)
+    except (LeagueException, ProjectionException) as e:
         logger.error(e.__str__())
         return client_error_response(e.__str__(), ERROR_CODES.get('bad_request'))
+    metrics.LEAGUE_REQUESTS.labels(league=alias).inc()
 
     league = escape(league.get_league_id())
     season = escape(season)
@@ -96,40 +209,186 @@ def get_league_standings(league, season):
     key = Key(alias, season)
     in_cache, standings = storage.check_and_get(key)
     if in_cache:
-        logger.info("Retrieving '%s' season standings for '%s' league from database", season, alias)
-        return standings.as_json()
+        logger.info("Retrieving '%s' season standings for '%s' league from database", season, alias, extra=SAMPLED)
+        return respond_with_standings(standings, season, projection)
 
-    return get_from_server(alias, key, league, season)
+    return get_from_server(alias, key, league, season, projection)
 
 
-def get_from_server(alias, key, league, season):
+@_instrumented("standings_changes")
+def get_league_standings_changes(league, season):
+    """ Gets the standings that changed since a version the client has, e.g.
+    /standings/epl/2020/changes?since=<version>, or a snapshot of the standings if the client has no version, or one
+    too old to tell the changes since """
+    alias = league
+    try:
+        _seasons_validator(season, alias)
+        league = leagues.get_league(alias)
+        since = int(request.args.get('since', '0'))
+    except (LeagueException, ValueError) as e:
+        logger.error(e.__str__())
+        return client_error_response(e.__str__(), ERROR_CODES.get('bad_request'))
+    metrics.LEAGUE_REQUESTS.labels(league=alias).inc()
+
+    season = escape(season)
+    key = Key(alias, season)
+    in_cache, standings = storage.check_and_get(key)
+    if not in_cache:
+        standings = _get_from_server_or_storage(alias, key, escape(league.get_league_id()), season)
+        if standings is None:
+            return server_error_response(ERROR_CODES.get("server_error"))
+
+    version, payload = change_feed.changes(key, since, standings)
+    response = Response(payload, mimetype='application/json')
+    response.headers['X-Standings-Version'] = str(version)
+    response.headers['Cache-Control'] = cache_policy.cache_control(season)
+    return response
+
+
+@_instrumented("standings_batch")
+def get_many_league_standings():
+    """ Gets the standings of many leagues and seasons at once, e.g. /standings?keys=epl:2020,seriea:2020. The payload
+    holds the standings per requested key, or the error for that key """
+    keys_parameter = request.args.get('keys', '')
+    # Every key is served once, in the order it was first requested
+    requested = list(dict.fromkeys(name.strip() for name in keys_parameter.split(',') if name.strip() != ''))
+    if len(requested) == 0:
+        return client_error_response("Query parameter 'keys' is required, e.g. keys=epl:2020,seriea:2020",
+                                     ERROR_CODES.get('bad_request'))
+    if len(requested) > MAX_BATCH_KEYS:
+        return client_error_response("At most {} keys can be requested at once".format(MAX_BATCH_KEYS),
+                                     ERROR_CODES.get('bad_request'))
+
+    results = {}
+    to_get = {}
+    for name in requested:
+        alias, _, season = name.partition(':')
+        try:
+            _seasons_validator(season, alias)
+            league = leagues.get_league(alias)
+        except (LeagueException, ValueError) as e:
+            logger.error(e.__str__())
+            results[name] = error_payload(e.__str__(), ERROR_CODES.get('bad_request'))
+            continue
+        metrics.LEAGUE_REQUESTS.labels(league=alias).inc()
+        season = escape(season)
+        to_get[name] = (alias, Key(alias, season), escape(league.get_league_id()), season)
+
+    found = storage.check_and_get_many([key for _, key, _, _ in to_get.values()])
+    missing = {name: args for name, args in to_get.items() if args[1] not in found}
+    fetched = batch_executor.map(lambda args: _get_from_server_or_storage(*args), missing.values())
+    found.update({args[1]: standings for args, standings in zip(missing.values(), fetched) if standings is not None})
+
+    for name, (_, key, _, _) in to_get.items():
+        if key in found:
+            results[name] = found[key].as_json_bytes()
+        else:
+            results[name] = error_payload("Internal server error", ERROR_CODES.get('server_error'))
+
+    payload = b"{" + b",".join(json.dumps(name).encode() + b":" + results[name] for name in requested) + b"}"
+    return Response(payload, mimetype='application/json')
+
+
+def get_from_server(alias, key, league, season, projection=None):
+    standings = _get_from_server_or_storage(alias, key, league, season)
+    if standings is None:
+        return server_error_response(ERROR_CODES.get("server_error"))
+    return respond_with_standings(standings, season, projection)
+
+
+def _get_from_server_or_storage(alias, key, league, season):
+    """ Gets the standings from the source. If the source fails, the last stored standings are returned no matter
+    how old they are, or None if there are none """
+    try:
+        return single_flight.do(key, lambda: _fetch_and_store(alias, key, league, season),
+                                lookup=lambda: storage.check_and_get(key)[1],
+                                fallback=lambda: storage.get_last_stored(key))
+    except UpstreamException as e:
+        logger.error(e.__str__())
+        standings = storage.get_last_stored(key)
+        if standings is not None:
+            logger.info("Serving last stored '%s' season standings for '%s' league", season, alias)
+        return standings
+
+
+def respond_with_standings(standings, season, projection=None):
+    """ Serves the encoding of the standings that was made when they were fetched. The encoding is compact JSON,
+    gzip compressed if the client accepts it, unless pretty printed JSON is asked for with the 'pretty' query flag.
+    Clients that already have the standings, as told by their If-None-Match header, get a 304 without a body.
+
+    When only a part of the standings is asked for, with the :func:`Projection` query parameters, the part is served
+    from the table of the standings, as compact JSON kept by :func:`ProjectionEncodings` for the next requests for the
+    same part """
+    if projection is not None:
+        entity_tag = etag("{}-{}".format(standings.get_digest(), projection.tag()))
+    else:
+        entity_tag = etag(standings.get_digest())
+    pretty = request.args.get('pretty', 'false').lower() == 'true'
+    if is_not_modified(request.headers.get('If-None-Match'), entity_tag):
+        response = Response(status=304)
+    elif projection is not None:
+        if pretty:
+            body = projection.as_json(standings.get_table(), pretty=True)
+        else:
+            body = projection_encodings.as_json_bytes(standings, projection)
+        response = Response(body, mimetype='application/json')
+    elif pretty:
+        response = Response(standings.as_json(pretty=True), mimetype='application/json')
+    elif accepts_gzip(request.headers.get('Accept-Encoding')):
+        response = Response(standings.as_gzip_bytes(), mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(standings.as_json_bytes(), mimetype='application/json')
+    response.headers['ETag'] = entity_tag
+    response.headers['Last-Modified'] = http_date(standings.get_fetched_at())
+    response.headers['Cache-Control'] = cache_policy.cache_control(season)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def get_metrics():
+    """ Serves the metrics of all the workers in the Prometheus text format """
+    return Response(generate_latest(metrics_registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def live_keys():
+    """ Returns the keys of the seasons of every league that can still be played """
+    return [Key(alias, season) for alias in leagues.get_aliases() for season in live_seasons()]
+
+
+def warm_up():
+    """ Loads the standings of the live seasons of every league into the caches, before serving any request """
+    try:
+        storage.warm_up(live_keys())
+    except Exception as e:
+        logger.error("Could not warm up storage. Error message: %s", e.__str__())
+
+
+def refresh(key, previous=NOT_READ):
+    """ Fetches the standings for a key from the source and stores them, unless another worker is already doing so.
+    Stored standings can be served while they are refreshed, so the refresh gives way to requests when quota is low
+
+        :param previous Standings stored for the key that the caller already read, if any
+    """
+    league = escape(leagues.get_league(key.alias).get_league_id())
+    single_flight.do(key, lambda: _fetch_and_store(key.alias, key, league, key.season, critical=False,
+                                                   previous=previous),
+                     lookup=lambda: storage.get_last_stored(key))
+
+
+def _fetch_and_store(alias, key, league, season, critical=True, previous=NOT_READ):
     if MOCK_MODE:
         logger.info("Retrieving '%s' season standings for '%s' league from mock source", season, alias)
         standings = mock.get_standings(key)
     else:
-        url = "https://{}/{}/{}".format(API_HOST, API_VERSION, BASE_PATH)
-        logger.info("Retrieving '%s' season standings for '%s' league from '%s'", season, alias, url)
-        response = _get_response(league, season, url)
-        if response.status_code != 200:
-            logger.error("Error reading from RapidApi. Status code: %s", response.status_code)
-            return server_error_response(ERROR_CODES.get("server_error"))
-        standings = Standings()
-        standings_response = response.json()['response'][0]['league']['standings'][0]
-        for standing_response in standings_response:
-            standing = standing_builder(standing_response)
-            standings.add(standing)
-            logger.debug("Added standing: %s", standing)
-    storage.store(key, standings)
-    return standings.as_json()
-
-
-def _get_response(league, season, url):
-    querystring = {'season': season, 'league': league}
-    headers = {
-        'x-rapidapi-key': API_KEY,
-        'x-rapidapi-host': API_HOST
-    }
-    return requests.request("GET", url, headers=headers, params=querystring)
+        logger.info("Retrieving '%s' season standings for '%s' league from '%s'", season, alias, API_HOST)
+        response = upstream_client.get_standings(league, season, critical=critical)
+        with metrics.stage_timer(metrics.PARSE):
+            standings = parse_standings(response.content)
+    if not storage.store(key, standings, previous=previous):
+        logger.info("'%s' season standings for '%s' league have not changed since they were last fetched", season,
+                    alias)
+    return standings
 
 
 def _seasons_validator(season, alias):